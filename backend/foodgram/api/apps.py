@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class ApiConfig(AppConfig):
     name = 'api'
     verbose_name = 'api'
+
+    def ready(self):
+        from . import cache, checks, db, instrumentation  # noqa: F401
@@ -0,0 +1,33 @@
+"""Асинхронные точки входа для ASGI-развёртывания.
+
+ORM Django 3.2 синхронный, поэтому обработчик ViewSet выполняется в пуле
+потоков, а цикл событий не блокируется на время запросов к базе. Каждый
+вызов сам проверяет и закрывает соединения своего потока, а транзакции
+изменяющих запросов открывает AtomicWritesMixin.
+"""
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections, transaction
+
+from .db import close_unusable_connections
+
+
+def async_view(viewset, actions):
+    """Оборачивает действия actions ViewSet в асинхронное представление."""
+    view = viewset.as_view(actions)
+
+    def run(request, *args, **kwargs):
+        close_old_connections()
+        close_unusable_connections()
+        try:
+            return view(request, *args, **kwargs)
+        finally:
+            close_old_connections()
+
+    @wraps(view)
+    async def handler(request, *args, **kwargs):
+        return await sync_to_async(run, thread_sensitive=False)(
+            request, *args, **kwargs)
+
+    return transaction.non_atomic_requests(handler)
@@ -0,0 +1,196 @@
+"""Кеш ответов RecipeViewSet для анонимных пользователей.
+
+Ответ анонимному пользователю не зависит от него самого, поэтому готовые
+данные списка и карточки рецепта хранятся в кеше Django под ключом из
+нормализованных параметров запроса. Ключи включают номер поколения,
+который сигналы меняют при любом изменении рецептов и связанных с ними
+данных, так что старые записи просто перестают использоваться.
+"""
+import hashlib
+import json
+from time import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.utils.http import http_date, parse_http_date_safe
+from rest_framework import status
+from rest_framework.response import Response
+
+from recipes.models import Ingredient, IngredientAmount, Recipe, RecipeTag, Tag
+
+User = get_user_model()
+
+LOCAL_CACHE_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+GENERATION_KEY = 'recipes:responses:generation'
+HITS_KEY = 'recipes:responses:hits'
+MISSES_KEY = 'recipes:responses:misses'
+
+
+def is_shared_cache():
+    """Виден ли кеш по умолчанию другим процессам: воркерам и командам."""
+    return settings.CACHES['default']['BACKEND'] not in LOCAL_CACHE_BACKENDS
+
+
+def get_generation():
+    """Время последнего изменения данных, оно же номер поколения."""
+    return cache.get_or_set(GENERATION_KEY, time(), None)
+
+
+def bump_generation():
+    cache.set(GENERATION_KEY, time(), None)
+
+
+def invalidate_responses(sender, **kwargs):
+    if kwargs.get('update_fields') == frozenset({'last_login'}):
+        return
+    transaction.on_commit(bump_generation)
+
+
+for model in (Recipe, IngredientAmount, RecipeTag, Tag, Ingredient, User):
+    post_save.connect(invalidate_responses, sender=model)
+    post_delete.connect(invalidate_responses, sender=model)
+m2m_changed.connect(invalidate_responses, sender=Recipe.tags.through)
+
+
+def count(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, 0, None)
+        cache.incr(key)
+
+
+def get_stats():
+    hits = cache.get(HITS_KEY, 0)
+    misses = cache.get(MISSES_KEY, 0)
+    total = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_ratio': hits / total if total else 0.0,
+    }
+
+
+def reset_stats():
+    cache.delete_many([HITS_KEY, MISSES_KEY])
+
+
+def make_etag(data):
+    content = json.dumps(data, sort_keys=True, default=str)
+    return '"{}"'.format(hashlib.md5(content.encode()).hexdigest())
+
+
+def is_not_modified(request, etag, last_modified=None):
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+    if if_none_match:
+        return etag in [tag.strip() for tag in if_none_match.split(',')]
+    if last_modified is None:
+        return False
+    if_modified_since = parse_http_date_safe(
+        request.META.get('HTTP_IF_MODIFIED_SINCE'))
+    return bool(if_modified_since) and if_modified_since >= int(last_modified)
+
+
+def conditional_response(request, etag, handler, *args, **kwargs):
+    """Отвечает 304 по совпавшему ETag, не вызывая handler."""
+    if is_not_modified(request, etag):
+        response = Response(status=status.HTTP_304_NOT_MODIFIED)
+    else:
+        response = handler(request, *args, **kwargs)
+        if response.status_code != status.HTTP_200_OK:
+            return response
+    response['ETag'] = etag
+    return response
+
+
+class ConditionalGetMixin:
+    """Поддержка If-None-Match для list и retrieve.
+
+    get_etag возвращает дешёвый валидатор ответа, вычисленный без
+    сериализации, или None, если условный запрос не поддерживается.
+    """
+
+    def get_etag(self, request):
+        return None
+
+    def conditional(self, handler, request, *args, **kwargs):
+        etag = self.get_etag(request)
+        if etag is None:
+            return handler(request, *args, **kwargs)
+        return conditional_response(request, etag, handler, *args, **kwargs)
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional(super().retrieve, request, *args, **kwargs)
+
+
+class AnonymousResponseCacheMixin:
+    """Кеширует list и retrieve для анонимных пользователей.
+
+    Кешируются только запросы, все параметры которых перечислены
+    в response_cache_params; остальные обрабатываются как обычно.
+    """
+    response_cache_params = ()
+    response_cache_multiple_params = ()
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(
+            super().retrieve, request, *args, **kwargs)
+
+    def get_response_cache_key(self, request, generation):
+        if request.user.is_authenticated:
+            return None
+        if not set(request.query_params) <= set(self.response_cache_params):
+            return None
+        params = []
+        for name in sorted(request.query_params):
+            if name in self.response_cache_multiple_params:
+                values = sorted(set(request.query_params.getlist(name)))
+            else:
+                values = [request.query_params.get(name)]
+            params.append((name, values))
+        identity = json.dumps([
+            request.build_absolute_uri('/'), self.basename, self.action,
+            self.kwargs.get(self.lookup_url_kwarg or self.lookup_field),
+            request.accepted_renderer.format, params])
+        digest = hashlib.md5(identity.encode()).hexdigest()
+        return f'recipes:responses:{generation}:{digest}'
+
+    def cached_response(self, handler, request, *args, **kwargs):
+        generation = get_generation()
+        key = self.get_response_cache_key(request, generation)
+        if key is None:
+            return handler(request, *args, **kwargs)
+        entry = cache.get(key)
+        if entry is not None:
+            count(HITS_KEY)
+            data, etag = entry
+            cache_status = 'HIT'
+        else:
+            count(MISSES_KEY)
+            response = handler(request, *args, **kwargs)
+            if response.status_code != status.HTTP_200_OK:
+                return response
+            data, etag = response.data, make_etag(response.data)
+            cache.set(
+                key, (data, etag), settings.RECIPE_RESPONSE_CACHE_TIMEOUT)
+            cache_status = 'MISS'
+        if is_not_modified(request, etag, generation):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = Response(data)
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(generation)
+        response['X-Cache'] = cache_status
+        return response
@@ -0,0 +1,18 @@
+"""Проверки настроек, которые нужны нескольким процессам сразу."""
+from django.core.checks import Error, Tags, register
+
+from .cache import is_shared_cache
+from .db import get_replicas
+
+
+@register(Tags.caches, Tags.database)
+def check_replica_cache(app_configs, **kwargs):
+    """Признак «читать с основной базы» должен быть виден всем воркерам."""
+    if not get_replicas() or is_shared_cache():
+        return []
+    return [Error(
+        'С репликами (DB_REPLICA_HOSTS) нужен общий кеш.',
+        hint='Задайте CACHE_BACKEND, например '
+             'django.core.cache.backends.db.DatabaseCache: с кешем в памяти '
+             'процесса после записи другой воркер читает с реплики.',
+        id='api.E001')]
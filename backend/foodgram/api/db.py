@@ -0,0 +1,117 @@
+"""Управление соединениями с базой, транзакциями и репликами.
+
+Постоянные соединения (CONN_MAX_AGE) переживают запрос, поэтому перед
+новым запросом соединение с включённым CONN_HEALTH_CHECKS проверяется
+и закрывается, если сервер его уже оборвал. Django 3.2 этого не умеет,
+настройка названа так же, как в Django 4.1.
+
+Безопасные запросы к API читают с реплики, если она настроена. После
+успешной записи пользователь REPLICA_STICKY_SECONDS секунд читает с
+основной базы и видит свои изменения, даже если реплика отстаёт.
+"""
+import random
+
+from asgiref.local import Local
+from django.conf import settings
+from django.core.cache import cache
+from django.core.signals import request_started
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.dispatch import receiver
+from rest_framework.permissions import SAFE_METHODS
+
+STICKY_KEY = 'db:primary:{}'
+
+# Модели, которые читаются сразу после записи в другом запросе.
+# django_cache.cacheentry — таблица DatabaseCache: поколение кеша ответов,
+# версия каталога и сами ответы не должны отставать вместе с репликой.
+PRIMARY_MODELS = {'authtoken.token', 'django_cache.cacheentry'}
+
+routing = Local()
+
+
+@receiver(request_started)
+def close_unusable_connections(**kwargs):
+    """Закрывает постоянные соединения, не прошедшие проверку."""
+    for connection in connections.all():
+        if (connection.connection is not None
+                and connection.settings_dict.get('CONN_HEALTH_CHECKS')
+                and not connection.in_atomic_block
+                and not connection.is_usable()):
+            connection.close()
+
+
+class AtomicWritesMixin:
+    """Оборачивает в транзакцию только изменяющие запросы ViewSet.
+
+    Представление исключается из ATOMIC_REQUESTS, поэтому чтение
+    выполняется в режиме autocommit без BEGIN и COMMIT.
+    """
+
+    @classmethod
+    def as_view(cls, *args, **kwargs):
+        return transaction.non_atomic_requests(
+            super().as_view(*args, **kwargs))
+
+    def dispatch(self, request, *args, **kwargs):
+        if request.method in SAFE_METHODS:
+            return super().dispatch(request, *args, **kwargs)
+        with transaction.atomic():
+            return super().dispatch(request, *args, **kwargs)
+
+
+def get_replicas():
+    return [alias for alias in settings.DATABASES
+            if alias != DEFAULT_DB_ALIAS]
+
+
+def is_sticky(user):
+    return user.is_authenticated and bool(
+        cache.get(STICKY_KEY.format(user.id)))
+
+
+def stick_to_primary(user):
+    cache.set(
+        STICKY_KEY.format(user.id), True, settings.REPLICA_STICKY_SECONDS)
+
+
+class ReplicaRouter:
+    """Направляет чтение текущего запроса на выбранную для него реплику."""
+
+    def db_for_read(self, model, **hints):
+        # У модели DatabaseCache урезанный _meta без label_lower.
+        label = f'{model._meta.app_label}.{model._meta.model_name}'
+        if label in PRIMARY_MODELS:
+            return DEFAULT_DB_ALIAS
+        return getattr(routing, 'replica', None)
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+
+class ReplicaReadsMixin:
+    """Читает безопасные запросы ViewSet с реплики.
+
+    Реплика выбирается после аутентификации, когда уже известно,
+    не записывал ли пользователь что-то в последние секунды.
+    """
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        replicas = get_replicas()
+        if (replicas and request.method in SAFE_METHODS
+                and not is_sticky(request.user)):
+            routing.replica = random.choice(replicas)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        routing.replica = None
+        if (request.method not in SAFE_METHODS
+                and response.status_code < 400
+                and request.user.is_authenticated and get_replicas()):
+            stick_to_primary(request.user)
+        return super().finalize_response(request, response, *args, **kwargs)
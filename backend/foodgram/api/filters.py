@@ -1,21 +1,61 @@
+from django.db.models import Exists, OuterRef
 from django_filters.rest_framework import filters, FilterSet
 
-from recipes.models import Recipe, Tag
+from recipes.catalog import catalog
+from recipes.models import Recipe, RecipeTag
+from .search import search_recipes
+
+TAGS_MODE_ANY = 'any'
+TAGS_MODE_ALL = 'all'
+
+
+def tag_choices():
+    return [(tag.slug, tag.name) for tag in catalog.tags()]
+
+
+def filter_by_tags(queryset, tag_ids, match_all=False):
+    """Отбирает рецепты с любым (или со всеми) из тегов tag_ids.
+
+    Теги проверяются подзапросами EXISTS по RecipeTag, поэтому рецепт
+    не размножается по числу совпавших тегов и DISTINCT не нужен.
+    """
+    if not tag_ids:
+        return queryset
+    if not match_all:
+        return queryset.filter(Exists(RecipeTag.objects.filter(
+            recipe=OuterRef('pk'), tag_id__in=tag_ids)))
+    for tag_id in tag_ids:
+        queryset = queryset.filter(Exists(RecipeTag.objects.filter(
+            recipe=OuterRef('pk'), tag_id=tag_id)))
+    return queryset
 
 
 class RecipeFilter(FilterSet):
-    tags = filters.ModelMultipleChoiceFilter(
-        queryset=Tag.objects.all(), field_name='tags__slug',
-        to_field_name='slug')
+    tags = filters.MultipleChoiceFilter(
+        choices=tag_choices, method='get_tags')
+    tags_mode = filters.ChoiceFilter(
+        choices=((TAGS_MODE_ANY, 'Любой из тегов'),
+                 (TAGS_MODE_ALL, 'Все теги')),
+        method='get_tags_mode')
     is_favorited = filters.BooleanFilter(
         method='get_is_favorited')
     is_in_shopping_cart = filters.BooleanFilter(
         method='get_is_in_shopping_cart')
+    search = filters.CharFilter(method='get_search')
 
     class Meta:
         model = Recipe
         fields = ('tags', 'author',)
 
+    def get_tags(self, queryset, name, value):
+        tags = [catalog.get_tag_by_slug(slug) for slug in value]
+        tag_ids = sorted({tag.id for tag in tags if tag is not None})
+        match_all = self.form.cleaned_data.get('tags_mode') == TAGS_MODE_ALL
+        return filter_by_tags(queryset, tag_ids, match_all)
+
+    def get_tags_mode(self, queryset, name, value):
+        return queryset
+
     def get_is_favorited(self, queryset, name, value):
         user = self.request.user
         if value:
@@ -27,3 +67,6 @@ class RecipeFilter(FilterSet):
         if value:
             return queryset.filter(carts__user=user)
         return queryset
+
+    def get_search(self, queryset, name, value):
+        return search_recipes(queryset, value)
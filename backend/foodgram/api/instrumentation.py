@@ -0,0 +1,228 @@
+"""Учёт SQL-запросов и времени сериализации по представлениям.
+
+Включается настройкой SQL_INSTRUMENTATION. Каждое соединение с базой
+получает обёртку, которая считает запросы и время в базе для текущего
+запроса. Итоги по представлениям и медленные запросы (дольше
+SLOW_QUERY_THRESHOLD_MS) накапливаются в кеше Django, а медленные запросы
+ещё и пишутся в лог. Сводка по всем воркерам получается, только если кеш
+общий: у LocMemCache он свой в каждом процессе. Итоги по представлениям
+воркер копит у себя и сбрасывает в кеш раз в SQL_STATS_BATCH запросов
+или FLUSH_INTERVAL секунд. Отпечаток запроса — его SQL без параметров,
+со свёрнутыми списками IN и пробелами.
+"""
+import hashlib
+import logging
+import re
+from threading import Lock
+from time import monotonic, perf_counter
+
+from asgiref.local import Local
+from django.conf import settings
+from django.core.cache import cache
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+logger = logging.getLogger(__name__)
+
+VIEWS_KEY = 'instrumentation:views'
+QUERIES_KEY = 'instrumentation:queries'
+VIEW_FIELDS = ('requests', 'queries', 'db_us', 'serializer_us', 'total_us')
+QUERY_FIELDS = ('count', 'total_us')
+FLUSH_INTERVAL = 10
+
+IN_LIST = re.compile(r'IN \((?:%s, )*%s\)')
+SPACES = re.compile(r'\s+')
+
+state = Local()
+
+
+class PendingViews:
+    """Итоги по представлениям, ещё не сброшенные в общий кеш."""
+
+    def __init__(self):
+        self.lock = Lock()
+        self.clear()
+
+    def clear(self):
+        self.rows = {}
+        self.requests = 0
+        self.flushed = monotonic()
+
+    def add(self, name, values):
+        """Копит итоги и возвращает накопленное, когда пора сбросить."""
+        with self.lock:
+            row = self.rows.setdefault(name, [0] * len(VIEW_FIELDS))
+            for index, value in enumerate(values):
+                row[index] += value
+            self.requests += 1
+            if (self.requests < settings.SQL_STATS_BATCH
+                    and monotonic() - self.flushed < FLUSH_INTERVAL):
+                return None
+            try:
+                return self.rows
+            finally:
+                self.clear()
+
+
+pending_views = PendingViews()
+
+
+def start():
+    state.active = True
+    state.started = perf_counter()
+    state.queries = 0
+    state.db_time = 0.0
+    state.serializer_time = 0.0
+    state.serializer_depth = 0
+
+
+def finish():
+    """Завершает учёт запроса и возвращает его итоги."""
+    if not getattr(state, 'active', False):
+        return None
+    state.active = False
+    return {
+        'queries': state.queries,
+        'db': state.db_time,
+        'serializer': state.serializer_time,
+        'total': perf_counter() - state.started,
+    }
+
+
+def fingerprint(sql):
+    return SPACES.sub(' ', IN_LIST.sub('IN (...)', sql)).strip()
+
+
+def register(registry_key, name):
+    """Заносит имя в реестр, чтобы отчёт мог его найти.
+
+    Ключ на каждое имя ставится через add(), поэтому новый слот реестра
+    получает ровно один воркер и одновременные записи не теряют имён.
+    """
+    if not cache.add(f'{registry_key}:registered:{name}', True, None):
+        return
+    size_key = f'{registry_key}:size'
+    slot = 1 if cache.add(size_key, 1, None) else cache.incr(size_key)
+    cache.set(f'{registry_key}:slot:{slot}', name, None)
+
+
+def registered(registry_key):
+    size = cache.get(f'{registry_key}:size', 0)
+    slots = cache.get_many(
+        [f'{registry_key}:slot:{slot}' for slot in range(1, size + 1)])
+    return list(slots.values())
+
+
+def add(key, value):
+    """Прибавляет value к общему счётчику key."""
+    if not cache.add(key, value, None):
+        cache.incr(key, value)
+
+
+def record_view(name, stats):
+    rows = pending_views.add(name, (
+        1, stats['queries'], int(stats['db'] * 1e6),
+        int(stats['serializer'] * 1e6), int(stats['total'] * 1e6)))
+    for view, row in (rows or {}).items():
+        register(VIEWS_KEY, view)
+        for field, value in zip(VIEW_FIELDS, row):
+            add(f'{VIEWS_KEY}:{view}:{field}', value)
+
+
+def record_slow_query(sql, duration):
+    text = fingerprint(sql)
+    digest = hashlib.md5(text.encode()).hexdigest()[:12]
+    logger.warning('Медленный запрос %.1f мс [%s]: %s',
+                   duration * 1000, digest, text)
+    register(QUERIES_KEY, digest)
+    prefix = f'{QUERIES_KEY}:{digest}'
+    cache.add(f'{prefix}:sql', text, None)
+    add(f'{prefix}:count', 1)
+    add(f'{prefix}:total_us', int(duration * 1e6))
+
+
+def instrument_queries(execute, sql, params, many, context):
+    if not getattr(state, 'active', False):
+        return execute(sql, params, many, context)
+    started = perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        duration = perf_counter() - started
+        state.queries += 1
+        state.db_time += duration
+        if duration * 1000 >= settings.SLOW_QUERY_THRESHOLD_MS:
+            record_slow_query(sql, duration)
+
+
+@receiver(connection_created)
+def install_wrapper(sender, connection, **kwargs):
+    if (settings.SQL_INSTRUMENTATION
+            and instrument_queries not in connection.execute_wrappers):
+        connection.execute_wrappers.append(instrument_queries)
+
+
+def timed(serializer):
+    """Учитывает время to_representation сериализатора верхнего уровня."""
+    if not getattr(state, 'active', False):
+        return serializer
+    to_representation = serializer.to_representation
+
+    def timed_representation(*args, **kwargs):
+        state.serializer_depth += 1
+        started = perf_counter()
+        try:
+            return to_representation(*args, **kwargs)
+        finally:
+            state.serializer_depth -= 1
+            if not state.serializer_depth:
+                state.serializer_time += perf_counter() - started
+
+    serializer.to_representation = timed_representation
+    return serializer
+
+
+def get_report():
+    """Итоги по представлениям и медленным запросам из общего кеша."""
+    views = []
+    for name in registered(VIEWS_KEY):
+        values = cache.get_many(
+            [f'{VIEWS_KEY}:{name}:{field}' for field in VIEW_FIELDS])
+        row = {field: values.get(f'{VIEWS_KEY}:{name}:{field}', 0)
+               for field in VIEW_FIELDS}
+        if row['requests']:
+            views.append({'name': name, **row})
+    queries = []
+    for digest in registered(QUERIES_KEY):
+        prefix = f'{QUERIES_KEY}:{digest}'
+        values = cache.get_many([
+            f'{prefix}:{field}' for field in QUERY_FIELDS + ('sql',)])
+        row = {field: values.get(f'{prefix}:{field}', 0)
+               for field in QUERY_FIELDS}
+        if row['count']:
+            queries.append({
+                'fingerprint': digest,
+                'sql': values.get(f'{prefix}:sql', ''), **row})
+    return views, queries
+
+
+def reset_report():
+    keys = []
+    for registry_key, fields in ((VIEWS_KEY, VIEW_FIELDS),
+                                 (QUERIES_KEY, QUERY_FIELDS + ('sql',))):
+        size = cache.get(f'{registry_key}:size', 0)
+        keys.append(f'{registry_key}:size')
+        keys += [f'{registry_key}:slot:{slot}' for slot in range(1, size + 1)]
+        for name in registered(registry_key):
+            keys.append(f'{registry_key}:registered:{name}')
+            keys += [f'{registry_key}:{name}:{field}' for field in fields]
+    cache.delete_many(keys)
+    with pending_views.lock:
+        pending_views.clear()
+
+
+class SerializerTimingMixin:
+    """Учитывает время сериализаторов, полученных через get_serializer."""
+
+    def get_serializer(self, *args, **kwargs):
+        return timed(super().get_serializer(*args, **kwargs))
@@ -0,0 +1,71 @@
+from time import perf_counter
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.cache import bump_generation
+from recipes.synthetic import SyntheticData
+
+
+class Command(BaseCommand):
+    help = 'Создаёт синтетический корпус данных для нагрузочных тестов'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--users', type=int, default=1000,
+            help='Количество пользователей')
+        parser.add_argument(
+            '--recipes', type=int, default=10000,
+            help='Количество рецептов')
+        parser.add_argument(
+            '--favorites', type=float, default=20,
+            help='Среднее число рецептов в избранном у пользователя')
+        parser.add_argument(
+            '--carts', type=float, default=3,
+            help='Среднее число рецептов в списке покупок у пользователя')
+        parser.add_argument(
+            '--subscriptions', type=float, default=10,
+            help='Среднее число подписок у пользователя')
+        parser.add_argument(
+            '--ingredients', type=float, default=8,
+            help='Среднее число ингредиентов в рецепте')
+        parser.add_argument(
+            '--tags', type=int, default=2,
+            help='Наибольшее число тегов у рецепта')
+        parser.add_argument(
+            '--days', type=int, default=365,
+            help='За сколько дней распределить даты публикации')
+        parser.add_argument(
+            '--seed', type=int, default=0,
+            help='Зерно генератора; одно зерно даёт один и тот же корпус')
+        parser.add_argument(
+            '--chunk-size', type=int, default=10000,
+            help='Количество строк в одной вставке')
+        parser.add_argument(
+            '--password', default='synthetic',
+            help='Пароль всех созданных пользователей')
+
+    def handle(self, *args, **options):
+        if options['users'] < 1 or options['recipes'] < 1:
+            raise CommandError('Нужен хотя бы один пользователь и рецепт')
+
+        def progress(label, total):
+            if options['verbosity'] > 1:
+                self.stdout.write(f'{label}: {total}')
+
+        started = perf_counter()
+        created = SyntheticData(
+            users=options['users'], recipes=options['recipes'],
+            favorites=options['favorites'], carts=options['carts'],
+            subscriptions=options['subscriptions'],
+            ingredients=options['ingredients'], tags=options['tags'],
+            seed=options['seed'], chunk_size=options['chunk_size'],
+            days=options['days'], password=options['password'],
+            progress=progress).generate()
+        bump_generation()
+        elapsed = perf_counter() - started
+        total = sum(created.values())
+        for label, count in created.items():
+            self.stdout.write(f'{label}: {count}')
+        self.stdout.write(
+            f'Всего строк: {total}, {elapsed:.2f} с, '
+            f'{total / elapsed:.0f} строк/с')
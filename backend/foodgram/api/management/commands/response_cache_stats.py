@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from api.cache import get_stats, is_shared_cache, reset_stats
+
+
+class Command(BaseCommand):
+    help = 'Показывает статистику кеша ответов для анонимных запросов'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--reset', action='store_true', help='Обнулить счётчики')
+
+    def handle(self, *args, **options):
+        if not is_shared_cache():
+            raise CommandError(
+                'Счётчики хранятся в кеше backend, а кеш по умолчанию '
+                'локален для процесса: задайте общий CACHE_BACKEND.')
+        stats = get_stats()
+        self.stdout.write(
+            f'Попаданий: {stats["hits"]}, промахов: {stats["misses"]}, '
+            f'доля попаданий: {stats["hit_ratio"]:.1%}')
+        if options['reset']:
+            reset_stats()
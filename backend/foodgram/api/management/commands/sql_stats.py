@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from api.cache import is_shared_cache
+from api.instrumentation import get_report, reset_report
+
+ORDERINGS = ('db', 'queries', 'serializer', 'total', 'requests')
+
+
+class Command(BaseCommand):
+    help = 'Показывает представления и запросы, больше всего нагружающие базу'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--limit', type=int, default=10, help='Сколько строк показать')
+        parser.add_argument(
+            '--order-by', choices=ORDERINGS, default='db',
+            help='Поле сортировки представлений')
+        parser.add_argument(
+            '--reset', action='store_true', help='Обнулить статистику')
+
+    def handle(self, *args, **options):
+        if not is_shared_cache():
+            raise CommandError(
+                'Статистика хранится в кеше backend, а кеш по умолчанию '
+                'локален для процесса: задайте общий CACHE_BACKEND.')
+        views, queries = get_report()
+        field = {'db': 'db_us', 'serializer': 'serializer_us',
+                 'total': 'total_us'}.get(options['order_by'],
+                                          options['order_by'])
+        views.sort(key=lambda row: row[field], reverse=True)
+        self.stdout.write(
+            'Представление: запросов, SQL/запрос, БД мс/запрос, '
+            'сериализация мс/запрос, всего мс/запрос')
+        for row in views[:options['limit']]:
+            requests = row['requests']
+            self.stdout.write(
+                f'{row["name"]}: {requests}, '
+                f'{row["queries"] / requests:.1f}, '
+                f'{row["db_us"] / requests / 1000:.1f}, '
+                f'{row["serializer_us"] / requests / 1000:.1f}, '
+                f'{row["total_us"] / requests / 1000:.1f}')
+        queries.sort(key=lambda row: row['total_us'], reverse=True)
+        self.stdout.write('Медленные запросы: раз, всего мс, отпечаток')
+        for row in queries[:options['limit']]:
+            self.stdout.write(
+                f'[{row["fingerprint"]}] {row["count"]}, '
+                f'{row["total_us"] / 1000:.1f}, {row["sql"]}')
+        if options['reset']:
+            reset_report()
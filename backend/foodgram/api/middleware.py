@@ -0,0 +1,54 @@
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.utils.deprecation import MiddlewareMixin
+
+from recipes.catalog import get_request_stats, reset_request_state
+from . import instrumentation
+
+
+class CatalogCacheMiddleware(MiddlewareMixin):
+    """Учитывает обращения к кешу справочников в рамках запроса.
+
+    Сбрасывает признак проверки версии в начале запроса и сообщает
+    количество попаданий и промахов в заголовке X-Catalog-Cache.
+    """
+
+    def process_request(self, request):
+        reset_request_state()
+
+    def process_response(self, request, response):
+        hits, misses = get_request_stats()
+        if hits or misses:
+            response['X-Catalog-Cache'] = f'hits={hits}, misses={misses}'
+        return response
+
+
+class QueryInstrumentationMiddleware(MiddlewareMixin):
+    """Считает SQL-запросы, время в базе и в сериализаторах.
+
+    Итоги копятся по имени маршрута и методу, а при включённом
+    SERVER_TIMING ещё и отдаются в заголовке Server-Timing.
+    """
+
+    def __init__(self, get_response=None):
+        if not settings.SQL_INSTRUMENTATION:
+            raise MiddlewareNotUsed
+        super().__init__(get_response)
+
+    def process_request(self, request):
+        instrumentation.start()
+
+    def process_response(self, request, response):
+        stats = instrumentation.finish()
+        if stats is None:
+            return response
+        match = request.resolver_match
+        view = match.view_name if match is not None else 'unresolved'
+        instrumentation.record_view(f'{request.method}:{view}', stats)
+        if settings.SERVER_TIMING:
+            response['Server-Timing'] = (
+                f'db;dur={stats["db"] * 1000:.1f};'
+                f'desc="{stats["queries"]} queries", '
+                f'serializer;dur={stats["serializer"] * 1000:.1f}, '
+                f'total;dur={stats["total"] * 1000:.1f}')
+        return response
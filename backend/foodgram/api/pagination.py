@@ -0,0 +1,81 @@
+import base64
+import binascii
+from collections import OrderedDict
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class RecipePagination(PageNumberPagination):
+    """Постраничная выдача рецептов с необязательным режимом курсора.
+
+    По умолчанию работает как PageNumberPagination. Если в запросе есть
+    параметр cursor (для первой страницы пустой), рецепты выбираются по
+    ключу (pub_date, id) без OFFSET и без подсчёта общего количества.
+    """
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Неверный курсор.'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.cursor_mode = self.cursor_query_param in request.query_params
+        if not self.cursor_mode:
+            return super().paginate_queryset(queryset, request, view)
+        self.request = request
+        page_size = self.get_page_size(request)
+        queryset = self.after_cursor(
+            queryset, request.query_params[self.cursor_query_param])
+        page = list(queryset[:page_size + 1])
+        self.next_cursor = None
+        if len(page) > page_size:
+            page = page[:page_size]
+            self.next_cursor = self.encode_cursor(page[-1])
+        return page
+
+    def after_cursor(self, queryset, cursor):
+        """Рецепты после позиции cursor в порядке ленты."""
+        queryset = queryset.order_by('-pub_date', '-id')
+        if not cursor:
+            return queryset
+        pub_date, pk = self.decode_cursor(cursor)
+        # pub_date__lte повторяет условие, но задаёт Postgres границу
+        # диапазона по индексу (pub_date, id), по OR её не вывести.
+        return queryset.filter(
+            Q(pub_date__lt=pub_date) | Q(pub_date=pub_date, id__lt=pk),
+            pub_date__lte=pub_date)
+
+    def encode_cursor(self, recipe):
+        position = f'{recipe.pub_date.isoformat()}|{recipe.id}'
+        return base64.urlsafe_b64encode(position.encode()).decode()
+
+    def decode_cursor(self, cursor):
+        try:
+            position = base64.urlsafe_b64decode(cursor.encode()).decode()
+            pub_date, pk = position.split('|')
+            pub_date = parse_datetime(pub_date)
+            pk = int(pk)
+        except (binascii.Error, UnicodeDecodeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if pub_date is None:
+            raise NotFound(self.invalid_cursor_message)
+        return pub_date, pk
+
+    def get_next_link(self):
+        if not self.cursor_mode:
+            return super().get_next_link()
+        if self.next_cursor is None:
+            return None
+        return replace_query_param(
+            self.request.build_absolute_uri(), self.cursor_query_param,
+            self.next_cursor)
+
+    def get_paginated_response(self, data):
+        if not self.cursor_mode:
+            return super().get_paginated_response(data)
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('results', data),
+        ]))
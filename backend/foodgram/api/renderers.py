@@ -0,0 +1,123 @@
+import csv
+from io import BytesIO
+
+from django.conf import settings
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen.canvas import Canvas
+from rest_framework import negotiation, renderers
+from rest_framework.exceptions import NotAcceptable
+
+PDF_FONT = 'ShoppingList'
+PDF_FONT_SIZE = 12
+PDF_MARGIN = 50
+PDF_CHUNK = 64 * 1024
+
+
+class Echo:
+    """Буфер, который возвращает записанную строку вместо хранения."""
+    def write(self, value):
+        return value
+
+
+class ShoppingListRenderer(renderers.BaseRenderer):
+    """Базовый рендерер списка покупок, отдающий его построчно."""
+    charset = 'utf-8'
+    filename = 'shopping_list'
+
+    def stream(self, rows):
+        """Генератор строк для (название, единица, количество)."""
+        raise NotImplementedError
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, dict):
+            return str(data.get('detail', data)).encode(self.charset)
+        return ''.join(self.stream(data)).encode(self.charset)
+
+
+class TextShoppingListRenderer(ShoppingListRenderer):
+    media_type = 'text/plain'
+    format = 'txt'
+
+    def stream(self, rows):
+        for name, measurement_unit, total_amount in rows:
+            yield f'{name} ({measurement_unit}) - {total_amount}\n'
+
+
+class CSVShoppingListRenderer(ShoppingListRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+
+    def stream(self, rows):
+        writer = csv.writer(Echo())
+        yield writer.writerow(
+            ('Ингредиент', 'Единица измерения', 'Количество'))
+        for row in rows:
+            yield writer.writerow(row)
+
+
+class PDFShoppingListRenderer(ShoppingListRenderer):
+    """PDF со встроенным шрифтом SHOPPING_LIST_PDF_FONT.
+
+    Стандартные шрифты PDF не содержат кириллицы, поэтому в документ
+    встраивается подмножество TrueType-шрифта. PDF нельзя дописывать
+    по строкам: таблица ссылок пишется в конце, так что документ
+    собирается в памяти в сжатом виде и отдаётся кусками.
+    """
+    media_type = 'application/pdf'
+    format = 'pdf'
+    charset = None
+
+    def register_font(self):
+        if PDF_FONT not in pdfmetrics.getRegisteredFontNames():
+            pdfmetrics.registerFont(
+                TTFont(PDF_FONT, settings.SHOPPING_LIST_PDF_FONT))
+
+    def stream(self, rows):
+        # Ошибка шрифта должна случиться до начала ответа.
+        self.register_font()
+        return self.chunks(rows)
+
+    def chunks(self, rows):
+        buffer = BytesIO()
+        canvas = Canvas(buffer, pagesize=A4, pageCompression=1)
+        canvas.setTitle('Список покупок')
+        width, height = A4
+        line_height = PDF_FONT_SIZE * 1.5
+        y = height - PDF_MARGIN
+        canvas.setFont(PDF_FONT, PDF_FONT_SIZE)
+        for name, measurement_unit, total_amount in rows:
+            if y < PDF_MARGIN:
+                canvas.showPage()
+                canvas.setFont(PDF_FONT, PDF_FONT_SIZE)
+                y = height - PDF_MARGIN
+            canvas.drawString(
+                PDF_MARGIN, y, f'{name} ({measurement_unit}) - {total_amount}')
+            y -= line_height
+        canvas.save()
+        view = buffer.getbuffer()
+        for start in range(0, len(view), PDF_CHUNK):
+            yield bytes(view[start:start + PDF_CHUNK])
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, dict):
+            return str(data.get('detail', data)).encode()
+        return b''.join(self.stream(data))
+
+
+class ShoppingListNegotiation(negotiation.DefaultContentNegotiation):
+    """Без явного ?format неподходящий Accept получает текстовый список.
+
+    Так ведёт себя download_shopping_cart с самого начала: клиенты,
+    присылающие Accept: application/json, получают файл, а не 406.
+    """
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        try:
+            return super().select_renderer(request, renderers, format_suffix)
+        except NotAcceptable:
+            if format_suffix or request.query_params.get(
+                    self.settings.URL_FORMAT_OVERRIDE):
+                raise
+            return renderers[0], renderers[0].media_type
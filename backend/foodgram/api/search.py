@@ -0,0 +1,177 @@
+import re
+from bisect import bisect_left
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Case, IntegerField, Value, When
+
+from recipes.catalog import catalog
+from recipes.models import Ingredient, Recipe
+from .cache import get_generation
+
+SEARCH_CONFIG = 'russian'
+TOKEN = re.compile(r'\w+')
+
+
+class DatabaseIngredientSearch:
+    """Поиск ингредиентов средствами БД (pg_trgm индекс в PostgreSQL).
+
+    Совпадения по началу названия идут раньше совпадений по подстроке.
+    """
+
+    def search(self, name, limit):
+        return Ingredient.objects.filter(name__icontains=name).annotate(
+            rank=Case(
+                When(name__istartswith=name, then=Value(0)),
+                default=Value(1),
+                output_field=IntegerField())).order_by('rank', 'name')[:limit]
+
+
+class InMemoryIngredientSearch:
+    """Поиск ингредиентов по индексу, построенному из снимка справочника.
+
+    Используется для SQLite, где нет триграммных индексов, а UPPER/LIKE
+    не учитывают регистр кириллицы.
+    """
+
+    def __init__(self):
+        self._snapshot = None
+        self._index = None
+
+    def get_index(self):
+        snapshot = catalog.snapshot()
+        if snapshot is not self._snapshot:
+            rows = sorted(
+                ((ingredient.name.lower(), ingredient)
+                 for ingredient in snapshot.ingredients.values()),
+                key=lambda row: row[0])
+            self._index = ([row[0] for row in rows], rows)
+            self._snapshot = snapshot
+        return self._index
+
+    def search(self, name, limit):
+        keys, rows = self.get_index()
+        query = name.lower()
+        found = []
+        start = bisect_left(keys, query)
+        for position in range(start, len(keys)):
+            if len(found) >= limit or not keys[position].startswith(query):
+                break
+            found.append(rows[position])
+        for row in rows:
+            if len(found) >= limit:
+                break
+            if query in row[0] and not row[0].startswith(query):
+                found.append(row)
+        return [ingredient for _, ingredient in found]
+
+
+_in_memory_search = InMemoryIngredientSearch()
+
+
+def search_ingredients(name, limit=None):
+    """Ищет ингредиенты по названию, не более limit результатов."""
+    if limit is None:
+        limit = settings.INGREDIENT_SEARCH_LIMIT
+    if connection.vendor == 'postgresql':
+        return DatabaseIngredientSearch().search(name, limit)
+    return _in_memory_search.search(name, limit)
+
+
+def tokenize(text):
+    return TOKEN.findall(text.lower().replace('ё', 'е'))
+
+
+class DatabaseRecipeSearch:
+    """Полнотекстовый поиск рецептов по GIN-индексу документа в PostgreSQL.
+
+    Слова из названия рецепта весят больше, чем из описания и
+    ингредиентов.
+    """
+
+    def search(self, queryset, query):
+        from django.contrib.postgres.search import (
+            SearchQuery, SearchRank, SearchVector)
+
+        search_query = SearchQuery(query, config=SEARCH_CONFIG)
+        return queryset.alias(
+            document=SearchVector('search_document', config=SEARCH_CONFIG),
+        ).filter(document=search_query).annotate(
+            search_rank=SearchRank(
+                SearchVector('name', weight='A', config=SEARCH_CONFIG)
+                + SearchVector(
+                    'search_document', weight='B', config=SEARCH_CONFIG),
+                search_query),
+        ).order_by('-search_rank', '-pub_date', '-id')
+
+
+class InMemoryRecipeSearch:
+    """Поиск рецептов по инвертированному индексу в памяти процесса.
+
+    Используется для SQLite. Индекс перестраивается при смене поколения
+    кеша ответов. Слово запроса совпадает со словами документа, которые
+    с него начинаются, и нужны совпадения всех слов запроса.
+    """
+    name_weight = 3
+    limit = 1000
+
+    def __init__(self):
+        self._generation = None
+        self._index = None
+
+    def get_index(self):
+        generation = get_generation()
+        if generation != self._generation:
+            postings = defaultdict(Counter)
+            for recipe_id, name, document in Recipe.objects.values_list(
+                    'id', 'name', 'search_document').iterator():
+                for token in tokenize(document):
+                    postings[token][recipe_id] += 1
+                for token in tokenize(name):
+                    postings[token][recipe_id] += self.name_weight - 1
+            self._index = (sorted(postings), postings)
+            self._generation = generation
+        return self._index
+
+    def rank(self, query):
+        vocabulary, postings = self.get_index()
+        scores = None
+        for term in set(tokenize(query)):
+            term_scores = Counter()
+            for position in range(
+                    bisect_left(vocabulary, term), len(vocabulary)):
+                if not vocabulary[position].startswith(term):
+                    break
+                term_scores.update(postings[vocabulary[position]])
+            if scores is not None:
+                term_scores = Counter({
+                    recipe_id: score + scores[recipe_id]
+                    for recipe_id, score in term_scores.items()
+                    if recipe_id in scores})
+            scores = term_scores
+        if not scores:
+            return []
+        return sorted(scores, key=lambda recipe_id: (
+            -scores[recipe_id], -recipe_id))[:self.limit]
+
+    def search(self, queryset, query):
+        ranked = self.rank(query)
+        if not ranked:
+            return queryset.none()
+        return queryset.filter(id__in=ranked).order_by(Case(
+            *(When(id=recipe_id, then=Value(position))
+              for position, recipe_id in enumerate(ranked)),
+            output_field=IntegerField()))
+
+
+_in_memory_recipe_search = InMemoryRecipeSearch()
+
+
+def search_recipes(queryset, query):
+    """Отбирает рецепты по словам запроса, самые подходящие первыми."""
+    if not tokenize(query):
+        return queryset
+    if connection.vendor == 'postgresql':
+        return DatabaseRecipeSearch().search(queryset, query)
+    return _in_memory_recipe_search.search(queryset, query)
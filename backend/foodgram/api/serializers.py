@@ -1,12 +1,15 @@
-import base64
-
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.core.files.base import ContentFile
+from django.db.models import prefetch_related_objects
 from djoser.serializers import UserSerializer
 from rest_framework import serializers
 
+from recipes import image_jobs, images
+from recipes.documents import deferred_refresh, refresh_documents
+from recipes.catalog import catalog
 from recipes.models import (
-    Cart, Favorite, Ingredient, IngredientAmount, Recipe, RecipeTag, Tag)
+    Cart, Favorite, Ingredient, IngredientAmount, Recipe, RecipeTag,
+    ShoppingListLine, Tag)
 
 from users.models import Subscription
 
@@ -23,6 +26,10 @@ class CustomUserSerializer(UserSerializer):
                   'last_name', 'is_subscribed')
 
     def get_is_subscribed(self, obj):
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
+        if not self.context.get('request').user.is_authenticated:
+            return False
         user_id = obj.id if isinstance(obj, User) else obj.author.id
         request_user = self.context.get('request').user.id
         return Subscription.objects.filter(author=user_id,
@@ -58,14 +65,61 @@ class SubscriptionSerializer(serializers.ModelSerializer):
 
 
 class Base64ImageField(serializers.ImageField):
-    """Сериализатор для работы с картинками в Base64."""
+    """Сериализатор для работы с картинками в Base64.
+
+    Загрузка перекодируется во все варианты размеров, а в ответе
+    отдаётся адрес варианта variant в формате extension. Пока картинка
+    не обработана, отдаётся оригинал, а при original=False — None.
+    """
+    def __init__(self, variant=images.DEFAULT_VARIANT,
+                 extension=images.DEFAULT_EXTENSION, original=True, **kwargs):
+        self.variant = variant
+        self.extension = extension
+        self.original = original
+        super().__init__(**kwargs)
+
     def to_internal_value(self, data):
-        if isinstance(data, str) and data.startswith('data:image'):
-            format, imgstr = data.split(';base64,')
-            ext = format.split('/')[-1]
-            data = ContentFile(base64.b64decode(imgstr), name='temp.' + ext)
+        try:
+            if isinstance(data, str) and data.startswith('data:image'):
+                _, separator, imgstr = data.partition(';base64,')
+                if not separator:
+                    self.fail('invalid_image')
+                content = images.decode_base64(imgstr)
+            else:
+                content = images.read_file(super().to_internal_value(data))
+            if settings.RECIPE_IMAGE_ASYNC:
+                return images.store_upload(content)
+            return images.store_variants(content)
+        except images.ImageError as error:
+            raise serializers.ValidationError(str(error))
+
+    def to_representation(self, value):
+        if not value or not (
+                self.original or images.is_processed(value.name)):
+            return None
+        url = images.variant_url(value.name, self.variant, self.extension)
+        request = self.context.get('request', None)
+        if request is not None:
+            return request.build_absolute_uri(url)
+        return url
+
+
+class CatalogRelatedField(serializers.PrimaryKeyRelatedField):
+    """Поле первичного ключа, проверяемое по кешу справочников."""
+    def __init__(self, catalog_method, **kwargs):
+        self.catalog_method = catalog_method
+        super().__init__(**kwargs)
 
-        return super().to_internal_value(data)
+    def to_internal_value(self, data):
+        if isinstance(data, bool):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        try:
+            obj = getattr(catalog, self.catalog_method)(int(data))
+        except (TypeError, ValueError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        if obj is None:
+            self.fail('does_not_exist', pk_value=data)
+        return obj
 
 
 class TagSerializer(serializers.ModelSerializer):
@@ -97,7 +151,8 @@ class IngredientAmountSerializer(serializers.ModelSerializer):
 
 class IngredientAmountCreateSerializer(serializers.ModelSerializer):
     """Сериализатор для работы с созданием ИнгредиентКоличество."""
-    id = serializers.PrimaryKeyRelatedField(
+    id = CatalogRelatedField(
+        'get_ingredient',
         queryset=Ingredient.objects.all(),
         source='ingredient',
         write_only=True
@@ -119,44 +174,72 @@ class RecipeSerializer(serializers.ModelSerializer):
         source='ingredientamount',
     )
     image = Base64ImageField()
+    image_webp = Base64ImageField(
+        source='image', extension='webp', original=False, read_only=True)
 
     class Meta:
         model = Recipe
         fields = (
             'id', 'tags', 'author', 'ingredients',
             'name', 'text', 'cooking_time', 'is_favorited',
-            'is_in_shopping_cart', 'image')
-        read_only_fields = ('id', 'author')
+            'is_in_shopping_cart', 'image', 'image_webp', 'image_ready')
+        read_only_fields = ('id', 'author', 'image_ready')
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
+        view = self.context.get('view')
+        if view is not None and view.action == 'list':
+            self.fields['image'].variant = 'card'
+            self.fields['image_webp'].variant = 'card'
         if self.context['request'].method in ['POST', 'PATCH']:
             self.fields['ingredients'] = IngredientAmountCreateSerializer(
                 many=True, write_only=True,)
-            self.fields['tags'] = serializers.PrimaryKeyRelatedField(
+            self.fields['tags'] = CatalogRelatedField(
+                'get_tag',
                 many=True,
                 queryset=Tag.objects.all())
         if self.context['request'].method in ['GET', ]:
             self.fields['author'] = CustomUserSerializer()
 
     def get_is_favorited(self, obj):
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
         if self.context.get('request').user.is_authenticated:
             return Favorite.objects.filter(
                 recipe=obj, user=self.context['request'].user).exists()
         return False
 
     def get_is_in_shopping_cart(self, obj):
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
         if self.context.get('request').user.is_authenticated:
             return Cart.objects.filter(
                 recipe=obj, user=self.context['request'].user).exists()
         return False
 
+    def validate_ingredients(self, value):
+        """Объединяет повторы ингредиента, суммируя количество."""
+        merged = {}
+        for ingredient_data in value:
+            ingredient = ingredient_data['ingredient']
+            if ingredient.id in merged:
+                merged[ingredient.id]['amount'] += ingredient_data['amount']
+            else:
+                merged[ingredient.id] = dict(ingredient_data)
+        return list(merged.values())
+
+    def validate_tags(self, value):
+        return list({tag.id: tag for tag in value}.values())
+
     def create(self, validated_data):
         ingredients_data = validated_data.pop('ingredients')
         tags_data = validated_data.pop('tags')
+        validated_data['image_ready'] = images.is_processed(
+            validated_data['image'])
         recipe = Recipe.objects.create(**validated_data)
-        for tag in tags_data:
-            RecipeTag.objects.create(recipe=recipe, tag=tag)
+        image_jobs.enqueue(recipe)
+        RecipeTag.objects.bulk_create(
+            RecipeTag(recipe=recipe, tag=tag) for tag in tags_data)
         ingredient_amounts = [
             IngredientAmount(
                 recipe=recipe, ingredient=ingredient_data['ingredient'],
@@ -165,28 +248,85 @@ class RecipeSerializer(serializers.ModelSerializer):
             for ingredient_data in ingredients_data
         ]
         IngredientAmount.objects.bulk_create(ingredient_amounts)
+        refresh_documents([recipe.id])
         return recipe
 
     def update(self, instance, validated_data):
         ingredients_data = validated_data.pop('ingredients', None)
         tags_data = validated_data.pop('tags', None)
+        if 'image' in validated_data:
+            validated_data['image_ready'] = images.is_processed(
+                validated_data['image'])
         for key, value in validated_data.items():
             setattr(instance, key, value)
-        instance.save()
-        if tags_data is not None:
-            instance.tags.set(tags_data)
-        if ingredients_data is not None:
-            IngredientAmount.objects.filter(recipe=instance).delete()
-            ingredient_amounts = [
-                IngredientAmount(
-                    recipe=instance, ingredient=ingredient_data['ingredient'],
-                    amount=ingredient_data['amount'])
-                for ingredient_data in ingredients_data
-            ]
-            IngredientAmount.objects.bulk_create(ingredient_amounts)
+        with deferred_refresh() as recipe_ids:
+            instance.save()
+            if 'image' in validated_data:
+                image_jobs.enqueue(instance)
+            if tags_data is not None:
+                self.update_tags(instance, tags_data)
+            if ingredients_data is not None:
+                self.update_ingredients(instance, ingredients_data)
+                recipe_ids.add(instance.id)
         return instance
 
+    @staticmethod
+    def update_tags(instance, tags_data):
+        """Добавляет новые и удаляет исключённые теги рецепта."""
+        old_ids = set(RecipeTag.objects.filter(
+            recipe=instance).values_list('tag_id', flat=True))
+        new_ids = {tag.id for tag in tags_data}
+        RecipeTag.objects.bulk_create(
+            RecipeTag(recipe=instance, tag_id=tag_id)
+            for tag_id in new_ids - old_ids)
+        if old_ids - new_ids:
+            RecipeTag.objects.filter(
+                recipe=instance, tag_id__in=old_ids - new_ids).delete()
+
+    @staticmethod
+    def update_ingredients(instance, ingredients_data):
+        """Применяет к ингредиентам рецепта только изменения.
+
+        Неизменённые строки IngredientAmount сохраняют свои id.
+        """
+        new_amounts = {
+            ingredient_data['ingredient'].id: ingredient_data['amount']
+            for ingredient_data in ingredients_data}
+        old_amounts = {}
+        rows = {}
+        to_delete = []
+        for row in IngredientAmount.objects.filter(recipe=instance):
+            old_amounts[row.ingredient_id] = (
+                old_amounts.get(row.ingredient_id, 0) + row.amount)
+            if row.ingredient_id in rows or (
+                    row.ingredient_id not in new_amounts):
+                to_delete.append(row.pk)
+            else:
+                rows[row.ingredient_id] = row
+        to_update = []
+        for ingredient_id, row in rows.items():
+            if row.amount != new_amounts[ingredient_id]:
+                row.amount = new_amounts[ingredient_id]
+                to_update.append(row)
+        IngredientAmount.objects.bulk_create(
+            IngredientAmount(
+                recipe=instance, ingredient_id=ingredient_id, amount=amount)
+            for ingredient_id, amount in new_amounts.items()
+            if ingredient_id not in rows)
+        IngredientAmount.objects.bulk_update(to_update, ['amount'])
+        if to_delete:
+            IngredientAmount.objects.filter(pk__in=to_delete).delete()
+        ShoppingListLine.objects.apply_delta(
+            Cart.objects.filter(recipe=instance).values_list(
+                'user_id', flat=True),
+            {key: new_amounts.get(key, 0) - old_amounts.get(key, 0)
+             for key in old_amounts.keys() | new_amounts.keys()})
+
     def to_representation(self, instance):
+        prefetch_related_objects(
+            [instance], 'tags', 'ingredientamount__ingredient')
+        if hasattr(instance, 'author_is_subscribed'):
+            instance.author.is_subscribed = instance.author_is_subscribed
         ret = super().to_representation(instance)
         ret['ingredients'] = IngredientAmountSerializer(
             instance.ingredientamount.all(), many=True).data
@@ -195,9 +335,12 @@ class RecipeSerializer(serializers.ModelSerializer):
 
 class RecipeSubscSerializer(serializers.ModelSerializer):
     """Сокращённый сериализатор для рецептов в подписках и карте."""
-    image = Base64ImageField()
+    image = Base64ImageField(variant='thumb')
+    image_webp = Base64ImageField(
+        source='image', variant='thumb', extension='webp', original=False,
+        read_only=True)
 
     class Meta:
         model = Recipe
         fields = (
-            'id', 'name', 'cooking_time', 'image')
+            'id', 'name', 'cooking_time', 'image', 'image_webp')
@@ -0,0 +1,735 @@
+import json
+from base64 import b64encode
+from importlib import reload
+from io import BytesIO, StringIO
+from tempfile import TemporaryDirectory
+from threading import Barrier, Thread
+from types import SimpleNamespace
+from unittest import skipUnless
+from unittest.mock import patch
+
+from asgiref.sync import async_to_sync
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.cache.backends.db import DatabaseCache
+from django.core.handlers.asgi import ASGIHandler
+from django.core.management import CommandError, call_command
+from django.db import connection, connections
+from django.test import (
+    SimpleTestCase, TestCase, TransactionTestCase, override_settings)
+from django.test.utils import CaptureQueriesContext
+from django.urls import clear_url_caches, resolve
+from PIL import Image
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from api.checks import check_replica_cache
+from api.db import ReplicaRouter, get_replicas, routing
+from api.filters import filter_by_tags
+from api.instrumentation import (
+    VIEWS_KEY, get_report, record_view, register, registered, reset_report)
+from api.views import RecipeViewSet
+from recipes.catalog import catalog
+from recipes.models import (
+    Cart, Favorite, Ingredient, IngredientAmount, Recipe, RecipeTag,
+    ShoppingListLine, Tag)
+from users.models import Subscription
+
+User = get_user_model()
+
+
+def create_recipes(authors, tags, ingredients, count):
+    recipes = []
+    for index in range(count):
+        recipe = Recipe.objects.create(
+            author=authors[index % len(authors)], name=f'Рецепт {index}',
+            text='Описание', cooking_time=10, image='recipes/test.jpg')
+        RecipeTag.objects.bulk_create(
+            RecipeTag(recipe=recipe, tag=tag) for tag in tags)
+        IngredientAmount.objects.bulk_create(
+            IngredientAmount(recipe=recipe, ingredient=ingredient, amount=5)
+            for ingredient in ingredients)
+        recipes.append(recipe)
+    return recipes
+
+
+class FoodgramDataMixin:
+    """Пользователи, теги, ингредиенты и чистые кеши для тестов API."""
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.user = User.objects.create_user(
+            username='reader', email='reader@example.com', password='pass')
+        self.authors = [
+            User.objects.create_user(
+                username=f'author{index}', email=f'author{index}@example.com',
+                password='pass')
+            for index in range(3)]
+        self.tags = [
+            Tag.objects.create(name=f'Тег {index}', color=f'#00000{index}',
+                               slug=f'tag{index}')
+            for index in range(2)]
+        self.ingredients = [
+            Ingredient.objects.create(
+                name=f'Ингредиент {index}', measurement_unit='г')
+            for index in range(3)]
+        catalog.snapshot()
+        self.anonymous = APIClient()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+
+class FoodgramTestCase(FoodgramDataMixin, TestCase):
+    pass
+
+
+class IngredientSearchTest(FoodgramTestCase):
+    """Совпадения по началу названия идут раньше совпадений по подстроке."""
+
+    def setUp(self):
+        super().setUp()
+        for name in ('ванильный сахар', 'сахарная пудра', 'сахар',
+                     'тростниковый сахар'):
+            Ingredient.objects.create(name=name, measurement_unit='г')
+        catalog.snapshot()
+
+    def search(self, name):
+        response = self.anonymous.get('/api/ingredients/', {'name': name})
+        self.assertEqual(response.status_code, 200)
+        return [ingredient['name'] for ingredient in response.data]
+
+    def test_prefix_before_substring(self):
+        expected = [
+            'сахар', 'сахарная пудра', 'ванильный сахар',
+            'тростниковый сахар']
+        self.assertEqual(self.search('сах'), expected)
+        self.assertEqual(self.search('САХ'), expected)
+
+    @override_settings(INGREDIENT_SEARCH_LIMIT=3)
+    def test_limit_keeps_prefix_matches(self):
+        self.assertEqual(
+            self.search('сахар'),
+            ['сахар', 'сахарная пудра', 'ванильный сахар'])
+
+
+class RecipeListQueriesTest(FoodgramTestCase):
+    """Число запросов страницы рецептов не зависит от числа рецептов."""
+
+    def setUp(self):
+        super().setUp()
+        recipes = create_recipes(
+            self.authors, self.tags, self.ingredients, 12)
+        Favorite.objects.create(user=self.user, recipe=recipes[11])
+        Cart.objects.create(user=self.user, recipe=recipes[10])
+        Subscription.objects.create(user=self.user, author=self.authors[2])
+
+    def assert_page_queries(self, client):
+        # count, рецепты с авторами и флагами, теги, ингредиенты рецептов,
+        # сами ингредиенты
+        with self.assertNumQueries(5):
+            response = client.get('/api/recipes/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), 6)
+        return response
+
+    def test_anonymous_page(self):
+        self.assert_page_queries(self.anonymous)
+
+    def test_authenticated_page(self):
+        response = self.assert_page_queries(self.client)
+        flags = {
+            recipe['name']: (
+                recipe['is_favorited'], recipe['is_in_shopping_cart'],
+                recipe['author']['is_subscribed'])
+            for recipe in response.data['results']}
+        self.assertEqual(flags['Рецепт 11'], (True, False, True))
+        self.assertEqual(flags['Рецепт 10'], (False, True, False))
+        self.assertEqual(flags['Рецепт 8'], (False, False, True))
+
+
+class RecipeTagFilterTest(FoodgramTestCase):
+    """Фильтр по тегам в режимах any и all."""
+
+    def setUp(self):
+        super().setUp()
+        self.first = create_recipes(
+            self.authors, self.tags[:1], self.ingredients, 1)[0]
+        self.second = create_recipes(
+            self.authors, self.tags[1:], self.ingredients, 1)[0]
+        self.both = create_recipes(
+            self.authors, self.tags, self.ingredients, 1)[0]
+        create_recipes(self.authors, [], self.ingredients, 1)
+
+    def get_ids(self, **params):
+        response = self.anonymous.get('/api/recipes/', {
+            'tags': [tag.slug for tag in self.tags], **params})
+        self.assertEqual(response.status_code, 200)
+        return [recipe['id'] for recipe in response.data['results']]
+
+    def test_any_without_duplicates(self):
+        ids = self.get_ids()
+        self.assertEqual(len(ids), len(set(ids)))
+        self.assertEqual(
+            set(ids), {self.first.id, self.second.id, self.both.id})
+        self.assertEqual(self.get_ids(tags_mode='any'), ids)
+
+    def test_all(self):
+        self.assertEqual(self.get_ids(tags_mode='all'), [self.both.id])
+
+    def test_unknown_slug(self):
+        response = self.anonymous.get(
+            '/api/recipes/', {'tags': [self.tags[0].slug, 'missing']})
+        self.assertEqual(response.status_code, 400)
+
+
+class RecipeSearchTest(FoodgramTestCase):
+    """Поиск ранжирует по названию и видит новый состав рецепта."""
+
+    def setUp(self):
+        super().setUp()
+        self.in_text, self.in_name = create_recipes(
+            [self.user], self.tags, self.ingredients, 2)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(f'/api/recipes/{self.in_text.id}/', {
+                'text': 'Добавьте сливки'}, format='json')
+            self.client.patch(f'/api/recipes/{self.in_name.id}/', {
+                'name': 'Сливочный соус'}, format='json')
+
+    def search(self, query):
+        response = self.anonymous.get('/api/recipes/', {'search': query})
+        self.assertEqual(response.status_code, 200)
+        return [recipe['id'] for recipe in response.data['results']]
+
+    def test_name_ranks_first(self):
+        self.assertEqual(
+            self.search('слив'), [self.in_name.id, self.in_text.id])
+        self.assertEqual(self.search('сливочный соус'), [self.in_name.id])
+        self.assertEqual(self.search('нет такого'), [])
+
+    def test_ingredients_refresh_document_once(self):
+        ingredient = Ingredient.objects.create(
+            name='Шафран', measurement_unit='г')
+        catalog.snapshot()
+        url = f'/api/recipes/{self.in_text.id}/'
+        with self.captureOnCommitCallbacks(execute=True):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.patch(url, {
+                    'ingredients': [{'id': ingredient.id, 'amount': 1}],
+                    'name': 'Рецепт', 'text': 'Описание', 'cooking_time': 10,
+                    'tags': [self.tags[0].id]}, format='json')
+        self.assertEqual(response.status_code, 200)
+        refreshes = [
+            query for query in queries
+            if query['sql'].startswith('SELECT')
+            and '"recipes_recipe"."search_document"' in query['sql']]
+        self.assertEqual(len(refreshes), 1)
+        self.assertEqual(self.search('шафран'), [self.in_text.id])
+
+
+class RecipeCursorTest(FoodgramTestCase):
+    """Лента по курсору проходит все рецепты без повторов и пропусков."""
+
+    def test_walk_pages(self):
+        recipes = create_recipes(
+            self.authors, self.tags, self.ingredients, 11)
+        # Одинаковые даты проверяют сравнение по id внутри одной даты.
+        Recipe.objects.filter(pk__in=[
+            recipe.pk for recipe in recipes[3:8]]).update(
+            pub_date=recipes[3].pub_date)
+        expected = list(Recipe.objects.order_by(
+            '-pub_date', '-id').values_list('id', flat=True))
+        seen = []
+        url = '/api/recipes/?cursor=&limit=3'
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(list(response.data), ['next', 'results'])
+            seen += [recipe['id'] for recipe in response.data['results']]
+            url = response.data['next']
+        self.assertEqual(seen, expected)
+
+    def test_invalid_cursor(self):
+        response = self.client.get('/api/recipes/', {'cursor': 'broken'})
+        self.assertEqual(response.status_code, 404)
+
+
+class ShoppingCartTest(FoodgramTestCase):
+    """Повторное удаление не портит список покупок и счётчики рецепта."""
+
+    def setUp(self):
+        super().setUp()
+        self.recipes = create_recipes(
+            self.authors, self.tags, self.ingredients, 2)
+        for recipe in self.recipes:
+            response = self.client.post(
+                f'/api/recipes/{recipe.id}/shopping_cart/')
+            self.assertEqual(response.status_code, 201)
+
+    def test_repeated_delete_keeps_other_recipes(self):
+        url = f'/api/recipes/{self.recipes[0].id}/shopping_cart/'
+        self.assertEqual(self.client.delete(url).status_code, 204)
+        self.assertEqual(self.client.delete(url).status_code, 404)
+        self.recipes[0].refresh_from_db()
+        self.assertEqual(self.recipes[0].carts_count, 0)
+        self.assertEqual(ShoppingListLine.objects.inconsistencies(), {})
+        self.assertEqual(
+            set(ShoppingListLine.objects.filter(user=self.user).values_list(
+                'ingredient_id', 'total_amount')),
+            {(ingredient.id, 5) for ingredient in self.ingredients})
+
+    def test_repeated_favorite_delete(self):
+        url = f'/api/recipes/{self.recipes[0].id}/favorite/'
+        self.assertEqual(self.client.post(url).status_code, 201)
+        self.assertEqual(self.client.delete(url).status_code, 204)
+        self.assertEqual(self.client.delete(url).status_code, 404)
+        self.recipes[0].refresh_from_db()
+        self.assertEqual(self.recipes[0].favorites_count, 0)
+
+
+def reload_urls():
+    from api import urls as api_urls
+    from foodgram import urls as root_urls
+    reload(api_urls)
+    reload(root_urls)
+    clear_url_caches()
+
+
+def asgi_get(path, query='', headers=()):
+    """GET через ASGIHandler: статус и тело, собранные из сообщений send."""
+    messages = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    async def send(message):
+        messages.append(message)
+
+    async_to_sync(ASGIHandler())({
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1',
+        'method': 'GET', 'scheme': 'http', 'path': path,
+        'query_string': query.encode(), 'server': ('testserver', 80),
+        'headers': [(b'host', b'testserver'), *headers],
+    }, receive, send)
+    return messages[0]['status'], b''.join(
+        message.get('body', b'') for message in messages[1:])
+
+
+class RecipeOrderingCacheTest(FoodgramTestCase):
+    """Сортировка по счётчикам не отдаёт устаревший порядок из кеша."""
+
+    def test_favorites_order_follows_favorites(self):
+        recipes = create_recipes(
+            self.authors, self.tags, self.ingredients, 2)
+        params = {'ordering': '-favorites_count,-pub_date'}
+        response = self.anonymous.get('/api/recipes/', params)
+        self.assertEqual(response.data['results'][0]['id'], recipes[1].id)
+
+        self.client.post(f'/api/recipes/{recipes[0].id}/favorite/')
+        response = self.anonymous.get('/api/recipes/', params)
+        self.assertNotIn('X-Cache', response)
+        self.assertEqual(response.data['results'][0]['id'], recipes[0].id)
+
+    def test_date_order_is_cached(self):
+        self.anonymous.get('/api/recipes/', {'ordering': 'pub_date'})
+        response = self.anonymous.get('/api/recipes/', {'ordering': 'pub_date'})
+        self.assertEqual(response['X-Cache'], 'HIT')
+
+
+class AsyncUrlsTest(TestCase):
+    """Асинхронные маршруты не перекрывают действия ViewSet."""
+
+    def tearDown(self):
+        reload_urls()
+
+    @override_settings(ASYNC_VIEWS=True)
+    def test_download_shopping_cart_is_not_a_detail_route(self):
+        reload_urls()
+        match = resolve('/api/recipes/download_shopping_cart/')
+        self.assertEqual(match.url_name, 'recipes-download-shopping-cart')
+        self.assertEqual(resolve('/api/recipes/1/').kwargs, {'pk': 1})
+
+
+@override_settings(ASYNC_VIEWS=True)
+class AsyncViewsTest(FoodgramDataMixin, TransactionTestCase):
+    """Асинхронные представления через ASGIHandler.
+
+    Обработчик выполняется в другом потоке со своим соединением, поэтому
+    данные теста должны быть закоммичены.
+    """
+
+    def setUp(self):
+        super().setUp()
+        reload_urls()
+        self.addCleanup(reload_urls)
+        self.recipe = create_recipes(
+            self.authors, self.tags, self.ingredients, 1)[0]
+        token = Token.objects.create(user=self.user)
+        self.auth = (b'authorization', f'Token {token.key}'.encode())
+
+    def test_retrieve(self):
+        path = f'/api/recipes/{self.recipe.id}/'
+        for headers in ((), (self.auth,)):
+            status, body = asgi_get(path, headers=headers)
+            self.assertEqual(status, 200)
+            self.assertEqual(json.loads(body)['id'], self.recipe.id)
+
+    def test_shopping_list_export(self):
+        self.client.post(f'/api/recipes/{self.recipe.id}/shopping_cart/')
+        for format in ('txt', 'csv', 'pdf'):
+            status, body = asgi_get(
+                '/api/recipes/download_shopping_cart/', f'format={format}',
+                (self.auth,))
+            self.assertEqual(status, 200)
+            self.assertTrue(body)
+
+
+class RecipeETagTest(FoodgramTestCase):
+    """ETag рецепта меняется вместе с вложенным автором."""
+
+    def test_author_edit_changes_etag(self):
+        recipe = create_recipes(
+            self.authors, self.tags, self.ingredients, 1)[0]
+        url = f'/api/recipes/{recipe.id}/'
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(
+            self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        User.objects.filter(pk=recipe.author_id).update(first_name='Автор')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['author']['first_name'], 'Автор')
+
+
+class RecipeImageTest(FoodgramTestCase):
+    """image_webp появляется только после обработки картинки."""
+
+    def test_webp_waits_for_processing(self):
+        recipe = create_recipes(
+            self.authors, self.tags, self.ingredients, 1)[0]
+        digest = 'a' * 64
+        Recipe.objects.filter(pk=recipe.pk).update(
+            image=f'recipes/raw/{digest}.png', image_ready=False)
+        url = f'/api/recipes/{recipe.id}/'
+        response = self.anonymous.get(url)
+        self.assertFalse(response.data['image_ready'])
+        self.assertIsNone(response.data['image_webp'])
+        self.assertTrue(
+            response.data['image'].endswith(f'/recipes/raw/{digest}.png'))
+
+        Recipe.objects.filter(pk=recipe.pk).update(
+            image=f'recipes/aa/{digest}_full.jpg', image_ready=True)
+        cache.clear()
+        response = self.anonymous.get(url)
+        self.assertTrue(response.data['image_ready'])
+        self.assertTrue(response.data['image_webp'].endswith(
+            f'/recipes/aa/{digest}_full.webp'))
+
+
+class ResponseCacheStatsTest(FoodgramTestCase):
+    """Статистика кеша ответов читается только из общего кеша."""
+
+    def test_refuses_process_local_cache(self):
+        with self.assertRaises(CommandError):
+            call_command('response_cache_stats')
+
+    def test_reports_shared_counters(self):
+        with TemporaryDirectory() as location, override_settings(CACHES={
+                'default': {
+                    'BACKEND': 'django.core.cache.backends.filebased.'
+                               'FileBasedCache',
+                    'LOCATION': location}}):
+            self.anonymous.get('/api/recipes/')
+            self.anonymous.get('/api/recipes/')
+            out = StringIO()
+            call_command('response_cache_stats', stdout=out)
+        self.assertIn('Попаданий: 1, промахов: 1', out.getvalue())
+
+
+class SQLStatsTest(FoodgramTestCase):
+    """Сводка SQL читается только из общего кеша."""
+
+    def test_refuses_process_local_cache(self):
+        with self.assertRaises(CommandError):
+            call_command('sql_stats')
+
+    @override_settings(SQL_INSTRUMENTATION=True, SQL_STATS_BATCH=1)
+    def test_reports_shared_views(self):
+        with TemporaryDirectory() as location, override_settings(CACHES={
+                'default': {
+                    'BACKEND': 'django.core.cache.backends.filebased.'
+                               'FileBasedCache',
+                    'LOCATION': location}}):
+            self.client.get('/api/recipes/')
+            out = StringIO()
+            call_command('sql_stats', stdout=out)
+        self.assertIn('recipes-list: 1,', out.getvalue())
+
+
+class InstrumentationTest(SimpleTestCase):
+    """Реестр имён и пакетная запись итогов в общий кеш."""
+
+    stats = {'queries': 2, 'db': 0.001, 'serializer': 0.002, 'total': 0.005}
+
+    def setUp(self):
+        reset_report()
+        self.addCleanup(reset_report)
+
+    def test_concurrent_register_keeps_names(self):
+        names = [f'GET:view-{number}' for number in range(20)]
+        barrier = Barrier(len(names))
+
+        def register_name(name):
+            barrier.wait()
+            register(VIEWS_KEY, name)
+
+        threads = [Thread(target=register_name, args=(name,))
+                   for name in names]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        register(VIEWS_KEY, names[0])
+        self.assertEqual(sorted(registered(VIEWS_KEY)), sorted(names))
+
+    @override_settings(SQL_STATS_BATCH=3)
+    def test_record_view_flushes_in_batches(self):
+        record_view('GET:recipes-list', self.stats)
+        record_view('GET:tags-list', self.stats)
+        self.assertEqual(get_report(), ([], []))
+        record_view('GET:recipes-list', self.stats)
+        views, _ = get_report()
+        self.assertEqual(
+            {row['name']: (row['requests'], row['queries']) for row in views},
+            {'GET:recipes-list': (2, 4), 'GET:tags-list': (1, 2)})
+
+
+@skipUnless(get_replicas(), 'Запускается с foodgram.replica_test_settings')
+class ReplicaRoutingTest(FoodgramDataMixin, TransactionTestCase):
+    """Чтение идёт на реплику, пока пользователь ничего не записал."""
+    databases = '__all__'
+
+    def get_recipes(self):
+        with CaptureQueriesContext(connections['default']) as primary:
+            with CaptureQueriesContext(connections['replica1']) as replica:
+                response = self.client.get('/api/recipes/')
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(
+            [query for query in replica if 'django_cache' in query['sql']])
+        return (
+            len([query for query in primary
+                 if 'django_cache' not in query['sql']]),
+            len(replica))
+
+    def test_reads_stick_to_primary_after_write(self):
+        recipe = create_recipes(
+            self.authors, self.tags, self.ingredients, 1)[0]
+        primary, replica = self.get_recipes()
+        # С основной базы читается только таблица кеша.
+        self.assertEqual(primary, 0)
+        self.assertGreater(replica, 0)
+
+        response = self.client.post(f'/api/recipes/{recipe.id}/favorite/')
+        self.assertEqual(response.status_code, 201)
+        primary, replica = self.get_recipes()
+        self.assertGreater(primary, 0)
+        self.assertEqual(replica, 0)
+
+
+class ReplicaCacheCheckTest(TestCase):
+    """Реплики без общего кеша — ошибка конфигурации."""
+
+    @patch('api.checks.get_replicas', return_value=['replica1'])
+    def test_replicas_require_shared_cache(self, get_replicas):
+        self.assertEqual(
+            [error.id for error in check_replica_cache(None)], ['api.E001'])
+
+
+class ReplicaRouterTest(SimpleTestCase):
+    """Таблица DatabaseCache всегда читается с основной базы."""
+
+    def test_cache_table_reads_primary(self):
+        routing.replica = 'replica1'
+        self.addCleanup(setattr, routing, 'replica', None)
+        router = ReplicaRouter()
+        cache_model = DatabaseCache('django_cache', {}).cache_model_class
+        self.assertEqual(router.db_for_read(cache_model), 'default')
+        self.assertEqual(router.db_for_read(Recipe), 'replica1')
+
+
+class ShoppingListExportTest(FoodgramTestCase):
+    """Список покупок выгружается в txt, csv и pdf."""
+    url = '/api/recipes/download_shopping_cart/'
+
+    def setUp(self):
+        super().setUp()
+        recipe = create_recipes(
+            self.authors, self.tags, self.ingredients, 1)[0]
+        self.client.post(f'/api/recipes/{recipe.id}/shopping_cart/')
+
+    def download(self, *args, **kwargs):
+        response = self.client.get(*args, **kwargs)
+        self.assertEqual(response.status_code, 200)
+        return response, b''.join(response.streaming_content)
+
+    def test_any_accept_without_format_gets_text(self):
+        response, content = self.download(
+            self.url, HTTP_ACCEPT='application/json')
+        self.assertEqual(response['Content-Type'], 'text/plain; charset=utf-8')
+        self.assertIn('Ингредиент 0 (г) - 5\n', content.decode())
+
+    def test_csv(self):
+        response, content = self.download(self.url, {'format': 'csv'})
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        self.assertIn('Ингредиент 2,г,5', content.decode())
+
+    def test_pdf_embeds_font(self):
+        response, content = self.download(self.url, {'format': 'pdf'})
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertEqual(
+            response['Content-Disposition'],
+            'attachment; filename="shopping_list.pdf"')
+        self.assertTrue(content.startswith(b'%PDF'))
+        self.assertIn(b'/FontFile2', content)
+
+    def test_unknown_format(self):
+        response = self.client.get(self.url, {'format': 'json'})
+        self.assertEqual(response.status_code, 404)
+
+
+def image_data():
+    buffer = BytesIO()
+    Image.new('RGB', (2, 2), 'white').save(buffer, 'PNG')
+    return 'data:image/png;base64,' + b64encode(buffer.getvalue()).decode()
+
+
+class RecipeCreateQueriesTest(FoodgramTestCase):
+    """Число запросов создания рецепта не зависит от его состава."""
+
+    def setUp(self):
+        super().setUp()
+        media = TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        media_root = override_settings(MEDIA_ROOT=media.name)
+        media_root.enable()
+        self.addCleanup(media_root.disable)
+        self.ingredients += [
+            Ingredient.objects.create(
+                name=f'Ингредиент {index}', measurement_unit='г')
+            for index in range(3, 10)]
+        self.tags.append(Tag.objects.create(
+            name='Тег 2', color='#000002', slug='tag2'))
+        catalog.snapshot()
+        self.image = image_data()
+
+    def create(self, ingredients, tags):
+        return self.client.post('/api/recipes/', {
+            'ingredients': [
+                {'id': ingredient.id, 'amount': 5}
+                for ingredient in ingredients],
+            'tags': [tag.id for tag in tags], 'image': self.image,
+            'name': 'Рецепт', 'text': 'Описание', 'cooking_time': 10,
+        }, format='json')
+
+    def test_queries(self):
+        # SAVEPOINT и RELEASE транзакции записи; рецепт, задача обработки
+        # картинки, теги, ингредиенты; документ поиска: названия
+        # ингредиентов, рецепт, запись; ответ: теги, строки и сами
+        # ингредиенты, флаги избранного и списка покупок
+        for ingredients, tags in ((self.ingredients[:1], self.tags[:1]),
+                                  (self.ingredients, self.tags)):
+            with self.assertNumQueries(14):
+                response = self.create(ingredients, tags)
+            self.assertEqual(response.status_code, 201)
+            self.assertEqual(
+                len(response.data['ingredients']), len(ingredients))
+
+
+class RecipeUpdateTest(FoodgramTestCase):
+    """PATCH рецепта пишет в базу только изменившиеся строки."""
+
+    def setUp(self):
+        super().setUp()
+        self.recipe = create_recipes(
+            [self.user], self.tags, self.ingredients[:2], 1)[0]
+        self.url = f'/api/recipes/{self.recipe.id}/'
+
+    def ids(self, model, field):
+        return dict(model.objects.filter(recipe=self.recipe).values_list(
+            field, 'id'))
+
+    def test_unchanged_rows_keep_ids(self):
+        amounts = self.ids(IngredientAmount, 'ingredient_id')
+        tags = self.ids(RecipeTag, 'tag_id')
+        kept, changed = self.ingredients[0], self.ingredients[1]
+        added = self.ingredients[2]
+        with CaptureQueriesContext(connections['default']) as queries:
+            response = self.client.patch(self.url, {
+                'tags': [self.tags[0].id],
+                'ingredients': [
+                    {'id': kept.id, 'amount': 5},
+                    {'id': changed.id, 'amount': 7},
+                    {'id': added.id, 'amount': 1}],
+                'name': 'Рецепт 0', 'text': 'Описание', 'cooking_time': 10,
+            }, format='json')
+        self.assertEqual(response.status_code, 200)
+
+        new_amounts = self.ids(IngredientAmount, 'ingredient_id')
+        self.assertEqual(new_amounts[kept.id], amounts[kept.id])
+        self.assertEqual(new_amounts[changed.id], amounts[changed.id])
+        self.assertNotIn(added.id, amounts)
+        self.assertEqual(
+            IngredientAmount.objects.get(pk=amounts[changed.id]).amount, 7)
+        self.assertEqual(
+            self.ids(RecipeTag, 'tag_id'),
+            {self.tags[0].id: tags[self.tags[0].id]})
+
+        writes = sorted(
+            (table, query['sql'].split()[0]) for query in queries
+            for table in ('recipes_ingredientamount', 'recipes_recipetag')
+            if query['sql'].split()[0] in ('INSERT', 'UPDATE', 'DELETE')
+            and f'"{table}"' in query['sql'].split('WHERE')[0])
+        self.assertEqual(writes, [
+            ('recipes_ingredientamount', 'INSERT'),
+            ('recipes_ingredientamount', 'UPDATE'),
+            ('recipes_recipetag', 'DELETE')])
+
+
+@skipUnless(connection.vendor == 'postgresql', 'EXPLAIN проверяется в Postgres')
+class IndexUsageTest(FoodgramTestCase):
+    """Подзапросы EXISTS ленты рецептов идут по составным индексам."""
+
+    def setUp(self):
+        super().setUp()
+        recipes = create_recipes(
+            self.authors, self.tags, self.ingredients, 30)
+        for recipe in recipes[::3]:
+            Favorite.objects.create(user=self.user, recipe=recipe)
+            Cart.objects.create(user=self.user, recipe=recipe)
+        Subscription.objects.create(user=self.user, author=self.authors[0])
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+            # На маленьких таблицах последовательное чтение всегда
+            # дешевле, поэтому проверяем, что индекс вообще применим.
+            cursor.execute('SET LOCAL enable_seqscan = off')
+
+    def assert_uses_index(self, queryset, *indexes):
+        plan = queryset.explain()
+        self.assertTrue(
+            any(index in plan for index in indexes),
+            f'Ни один из индексов {indexes} не используется:\n{plan}')
+
+    def test_user_flags(self):
+        view = RecipeViewSet()
+        view.request = SimpleNamespace(user=self.user)
+        queryset = view.annotate_for_user(Recipe.objects.all())
+        self.assert_uses_index(queryset, 'unique_favorite')
+        self.assert_uses_index(queryset, 'unique_cart')
+        self.assert_uses_index(queryset, 'unique_subscription')
+
+    def test_tag_filter(self):
+        tag_ids = [tag.id for tag in self.tags]
+        for match_all in (False, True):
+            self.assert_uses_index(
+                filter_by_tags(Recipe.objects.all(), tag_ids, match_all),
+                'unique_recipe_tag', 'recipetag_tag_recipe_idx')
@@ -1,6 +1,8 @@
+from django.conf import settings
 from django.urls import include, path
 from rest_framework import routers
 
+from .async_views import async_view
 from .views import IngredientViewSet, RecipeViewSet, TagViewSet
 
 app_name = 'api'
@@ -10,6 +12,19 @@ router.register(r'tags', TagViewSet, basename='tags')
 router.register(r'ingredients', IngredientViewSet, basename='ingredients')
 router.register(r'recipes', RecipeViewSet, basename='recipes')
 
-urlpatterns = [
+urlpatterns = []
+
+if settings.ASYNC_VIEWS:
+    urlpatterns += [
+        path('tags/', async_view(TagViewSet, {'get': 'list'})),
+        path('ingredients/', async_view(IngredientViewSet, {'get': 'list'})),
+        path('recipes/', async_view(
+            RecipeViewSet, {'get': 'list', 'post': 'create'})),
+        path('recipes/<int:pk>/', async_view(RecipeViewSet, {
+            'get': 'retrieve', 'put': 'update',
+            'patch': 'partial_update', 'delete': 'destroy'})),
+    ]
+
+urlpatterns += [
     path('', include(router.urls)),
 ]
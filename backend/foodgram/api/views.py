@@ -1,8 +1,7 @@
 from django.contrib.auth import get_user_model
-from django.db.models import Sum
-from django.http import HttpResponse
+from django.db.models import Exists, F, OuterRef
+from django.http import Http404, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
-from django.template.loader import render_to_string
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import filters, status, viewsets
 from rest_framework.decorators import action
@@ -10,25 +9,53 @@ from rest_framework.permissions import (
     AllowAny, IsAuthenticated, IsAuthenticatedOrReadOnly)
 from rest_framework.response import Response
 
+from recipes.catalog import catalog
 from recipes.models import (
-    Cart, Favorite, Ingredient, IngredientAmount, Recipe, Tag)
+    Cart, Favorite, Ingredient, Recipe, ShoppingListLine, Tag)
+from users.models import Subscription
 from .serializers import (
     IngredientSerializer, RecipeSerializer, RecipeSubscSerializer,
     TagSerializer)
+from .cache import (
+    AnonymousResponseCacheMixin, ConditionalGetMixin, make_etag)
+from .db import AtomicWritesMixin, ReplicaReadsMixin
 from .filters import RecipeFilter
+from .instrumentation import SerializerTimingMixin, timed
+from .pagination import RecipePagination
+from .renderers import (
+    CSVShoppingListRenderer, PDFShoppingListRenderer, ShoppingListNegotiation,
+    TextShoppingListRenderer)
+from .search import search_ingredients
 
 User = get_user_model()
 
 
-class TagViewSet(viewsets.ModelViewSet):
+class CatalogConditionalGetMixin(ConditionalGetMixin):
+    """ETag справочников по хешу снимка каталога и адресу запроса."""
+
+    def get_etag(self, request):
+        return make_etag([
+            catalog.digest(), request.get_full_path(),
+            request.accepted_renderer.format])
+
+
+class TagViewSet(AtomicWritesMixin, ReplicaReadsMixin, SerializerTimingMixin,
+                 CatalogConditionalGetMixin, viewsets.ModelViewSet):
     """ViewSet для модели тегов."""
     permission_classes = (AllowAny,)
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     pagination_class = None
 
+    def get_queryset(self):
+        if self.action == 'list':
+            return catalog.tags()
+        return super().get_queryset()
+
 
-class IngredientViewSet(viewsets.ModelViewSet):
+class IngredientViewSet(AtomicWritesMixin, ReplicaReadsMixin,
+                        SerializerTimingMixin, CatalogConditionalGetMixin,
+                        viewsets.ModelViewSet):
     """ViewSet для модели ингредиентов."""
     permission_classes = (AllowAny,)
     serializer_class = IngredientSerializer
@@ -38,19 +65,72 @@ class IngredientViewSet(viewsets.ModelViewSet):
 
     def get_queryset(self):
         name = self.request.GET.get('name')
+        if self.action != 'list':
+            return super().get_queryset()
         if name:
-            return Ingredient.objects.filter(
-                name__icontains=name)
-        return super().queryset
+            return search_ingredients(name)
+        return catalog.ingredients()
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(AtomicWritesMixin, ReplicaReadsMixin, SerializerTimingMixin,
+                    ConditionalGetMixin, AnonymousResponseCacheMixin,
+                    viewsets.ModelViewSet):
     """ViewSet для модели рецептов."""
+    response_cache_params = (
+        'tags', 'tags_mode', 'author', 'page', 'limit', 'cursor', 'ordering',
+        'search')
+    response_cache_multiple_params = ('tags',)
     permission_classes = (IsAuthenticatedOrReadOnly,)
     queryset = Recipe.objects.all()
     serializer_class = RecipeSerializer
-    filter_backends = (DjangoFilterBackend,)
+    pagination_class = RecipePagination
+    filter_backends = (DjangoFilterBackend, filters.OrderingFilter)
     filterset_class = RecipeFilter
+    ordering_fields = ('pub_date', 'favorites_count', 'carts_count')
+    # Счётчики меняются через update() без сигналов, и поколение кеша
+    # ответов о них не знает, поэтому такие сортировки не кешируются.
+    uncached_ordering_fields = ('favorites_count', 'carts_count')
+
+    def get_queryset(self):
+        return self.annotate_for_user(
+            Recipe.objects.select_related('author').defer(
+                'search_document').prefetch_related(
+                'tags', 'ingredientamount__ingredient'))
+
+    def annotate_for_user(self, queryset):
+        user = self.request.user
+        if not user.is_authenticated:
+            return queryset
+        return queryset.annotate(
+            is_favorited=Exists(Favorite.objects.filter(
+                recipe=OuterRef('pk'), user=user)),
+            is_in_shopping_cart=Exists(Cart.objects.filter(
+                recipe=OuterRef('pk'), user=user)),
+            author_is_subscribed=Exists(Subscription.objects.filter(
+                author=OuterRef('author'), user=user)))
+
+    def get_response_cache_key(self, request, generation):
+        ordering = request.query_params.get('ordering', '')
+        if any(field.strip().lstrip('-') in self.uncached_ordering_fields
+               for field in ordering.split(',')):
+            return None
+        return super().get_response_cache_key(request, generation)
+
+    def get_etag(self, request):
+        # Маршрут ASYNC_VIEWS передаёт pk числом, роутер DRF — строкой.
+        pk = str(self.kwargs.get('pk', ''))
+        if (self.action != 'retrieve' or not pk.isdigit()
+                or not request.user.is_authenticated):
+            return None
+        state = self.annotate_for_user(Recipe.objects.filter(pk=pk)).values(
+            'pub_date', 'updated_at', 'is_favorited', 'is_in_shopping_cart',
+            'author_is_subscribed', 'author__username', 'author__email',
+            'author__first_name', 'author__last_name').first()
+        if state is None:
+            return None
+        return make_etag([
+            request.user.id, catalog.digest(),
+            request.accepted_renderer.format, state])
 
     @action(detail=True, methods=['post', 'delete'],
             permission_classes=[IsAuthenticated])
@@ -60,17 +140,23 @@ class RecipeViewSet(viewsets.ModelViewSet):
         user = request.user
 
         if request.method == 'POST':
-            favorite, created = Favorite.objects.get_or_create(
+            _, created = Favorite.objects.get_or_create(
                 recipe=recipe, user=user)
             if not created:
                 return Response({
                     'errors': 'Ошибка, данный рецепт уже в избранном'},
                     status=status.HTTP_400_BAD_REQUEST)
-            serializer = RecipeSubscSerializer(
-                favorite, context=context)
+            Recipe.objects.filter(pk=recipe.pk).update(
+                favorites_count=F('favorites_count') + 1)
+            serializer = timed(RecipeSubscSerializer(
+                recipe, context=context))
             return Response(serializer.data, status.HTTP_201_CREATED)
 
-        get_object_or_404(Favorite, recipe=recipe, user=user).delete()
+        deleted, _ = Favorite.objects.filter(recipe=recipe, user=user).delete()
+        if not deleted:
+            raise Http404
+        Recipe.objects.filter(pk=recipe.pk).update(
+            favorites_count=F('favorites_count') - 1)
         return Response(status=status.HTTP_204_NO_CONTENT)
 
     @action(detail=True, methods=['post', 'delete'],
@@ -81,33 +167,48 @@ class RecipeViewSet(viewsets.ModelViewSet):
         user = request.user
 
         if request.method == 'POST':
-            cart, created = Cart.objects.get_or_create(
+            _, created = Cart.objects.get_or_create(
                 recipe=recipe, user=user)
             if not created:
                 return Response({
                     'errors': 'Ошибка, данный рецепт уже в списке покупок'},
                     status=status.HTTP_400_BAD_REQUEST)
-            serializer = RecipeSubscSerializer(
-                cart, context=context)
+            ShoppingListLine.objects.add_recipe(user, recipe)
+            Recipe.objects.filter(pk=recipe.pk).update(
+                carts_count=F('carts_count') + 1)
+            serializer = timed(RecipeSubscSerializer(
+                recipe, context=context))
             return Response(serializer.data, status.HTTP_201_CREATED)
 
-        get_object_or_404(Cart, recipe=recipe, user=user).delete()
+        deleted, _ = Cart.objects.filter(recipe=recipe, user=user).delete()
+        if not deleted:
+            raise Http404
+        ShoppingListLine.objects.remove_recipe(user, recipe)
+        Recipe.objects.filter(pk=recipe.pk).update(
+            carts_count=F('carts_count') - 1)
         return Response(status=status.HTTP_204_NO_CONTENT)
 
-    @action(detail=False, permission_classes=[IsAuthenticated])
-    def download_shopping_cart(self, request, context={}, *args, **kwargs):
-        context['request'] = self.request
-        user = request.user
-        queryset = IngredientAmount.objects.filter(
-            recipe__carts__user=user).values(
-            'ingredient__name', 'ingredient__measurement_unit').annotate(
-                total_amount=Sum('amount'))
-        shopping_list = render_to_string(
-            'shopping_list.txt', {'shopping_list': queryset})
-        shopping_list = shopping_list.strip().replace('\n\n', '\n')
-        response = HttpResponse(shopping_list, content_type='text/plain')
-        response[
-            'Content-Disposition'] = 'attachment; filename="shopping_list.txt"'
+    @action(detail=False, permission_classes=[IsAuthenticated],
+            renderer_classes=[TextShoppingListRenderer,
+                              CSVShoppingListRenderer,
+                              PDFShoppingListRenderer],
+            content_negotiation_class=ShoppingListNegotiation)
+    def download_shopping_cart(self, request, *args, **kwargs):
+        renderer = request.accepted_renderer
+        # Под ASGI тело StreamingHttpResponse читается в цикле событий,
+        # где ORM недоступен, поэтому строки выбираются здесь. Список
+        # покупок — по строке на ингредиент, память потоком не экономится.
+        rows = list(ShoppingListLine.objects.filter(
+            user=request.user).values_list(
+            'ingredient__name', 'ingredient__measurement_unit',
+            'total_amount'))
+        content_type = renderer.media_type
+        if renderer.charset:
+            content_type = f'{content_type}; charset={renderer.charset}'
+        response = StreamingHttpResponse(
+            renderer.stream(rows), content_type=content_type)
+        response['Content-Disposition'] = (
+            f'attachment; filename="{renderer.filename}.{renderer.format}"')
         return response
 
     def perform_create(self, serializer):
@@ -115,3 +216,11 @@ class RecipeViewSet(viewsets.ModelViewSet):
 
     def perform_update(self, serializer):
         serializer.save(author=self.request.user)
+
+    def perform_destroy(self, instance):
+        amounts = ShoppingListLine.objects.recipe_amounts(instance)
+        ShoppingListLine.objects.apply_delta(
+            Cart.objects.filter(recipe=instance).values_list(
+                'user_id', flat=True),
+            {key: -value for key, value in amounts.items()})
+        instance.delete()
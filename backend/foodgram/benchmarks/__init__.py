@@ -0,0 +1,7 @@
+"""Замеры производительности на временной тестовой базе.
+
+Запускаются из backend/foodgram, например:
+```
+DB_ENGINE=django.db.backends.sqlite3 python -m benchmarks.shopping_list_export
+```
+"""
@@ -0,0 +1,77 @@
+"""Стоимость аутентификации одного запроса.
+
+Сравнивает TokenAuthentication DRF (запрос к базе на каждый вызов) с
+CachedTokenAuthentication при попадании в LRU воркера и при попадании
+только в общий кеш (CACHE_BACKEND, по умолчанию кеш в памяти процесса),
+а также с StatelessJWTAuthentication, которая проверяет подпись и читает
+список отозванных токенов из того же кеша. Печатаются запросы к базе и
+среднее время вызова authenticate():
+```
+DB_ENGINE=django.db.backends.sqlite3 python -m benchmarks.auth_overhead --repeat 5000
+```
+"""
+import argparse
+from time import perf_counter
+
+from .common import setup_django, test_database
+
+
+def auth_request(header):
+    from rest_framework.request import Request
+    from rest_framework.test import APIRequestFactory
+
+    return Request(APIRequestFactory().get(
+        '/api/users/me/', HTTP_AUTHORIZATION=header))
+
+
+def run(name, authentication, request, repeat, before=None):
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    authentication.authenticate(request)
+    elapsed = 0
+    with CaptureQueriesContext(connection) as queries:
+        for _ in range(repeat):
+            if before is not None:
+                before()
+            started = perf_counter()
+            authentication.authenticate(request)
+            elapsed += perf_counter() - started
+    print(f'{name:>16}: запросов {len(queries) / repeat:3.1f}, '
+          f'{elapsed / repeat * 1_000_000:7.1f} мкс')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--repeat', type=int, default=5000)
+    args = parser.parse_args()
+    setup_django()
+    from django.contrib.auth import get_user_model
+    from django.test.utils import override_settings
+    from rest_framework.authentication import TokenAuthentication
+    from rest_framework.authtoken.models import Token
+    from rest_framework_simplejwt.state import token_backend
+    from users.authentication import (
+        CachedTokenAuthentication, StatelessJWTAuthentication, issue_tokens,
+        token_cache)
+
+    if token_backend.signing_key is None:
+        # Без JWT_SIGNING_KEY и DJANGO_SECRET_KEY в окружении.
+        token_backend.signing_key = token_backend.verifying_key = 'benchmark'
+
+    with test_database(), override_settings(TOKEN_SHARED_CACHE=True):
+        user = get_user_model().objects.create_user(
+            username='reader', email='reader@example.com', password='pass')
+        request = auth_request(f'Token {Token.objects.create(user=user).key}')
+        cached = CachedTokenAuthentication()
+        run('Token DRF', TokenAuthentication(), request, args.repeat)
+        run('кеш воркера', cached, request, args.repeat)
+        run('общий кеш', cached, request, args.repeat,
+            before=token_cache.clear)
+        run('JWT', StatelessJWTAuthentication(),
+            auth_request(f'Bearer {issue_tokens(user)["access"]}'),
+            args.repeat)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,43 @@
+import os
+import tracemalloc
+from contextlib import contextmanager
+from time import perf_counter
+
+import django
+
+
+def setup_django():
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'foodgram.settings')
+    django.setup()
+
+
+@contextmanager
+def test_database():
+    """Создаёт тестовую базу, как manage.py test, и удаляет её после."""
+    from django.db import connection
+    from django.test.utils import (
+        setup_test_environment, teardown_test_environment)
+
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+
+
+@contextmanager
+def measure():
+    """Время и пик памяти Python-объектов внутри блока.
+
+    result['started'] позволяет отметить промежуточные моменты.
+    """
+    tracemalloc.start()
+    result = {'started': perf_counter()}
+    try:
+        yield result
+    finally:
+        result['seconds'] = perf_counter() - result['started']
+        result['peak_bytes'] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
@@ -0,0 +1,101 @@
+"""Цена соединения с базой на запрос.
+
+Прогоняет GET /api/recipes/ через WSGIHandler, как gunicorn, чтобы
+сигналы начала и конца запроса закрывали соединения по CONN_MAX_AGE, и
+сравнивает новое соединение на каждый запрос (CONN_MAX_AGE=0) с
+постоянным без проверки и с проверкой CONN_HEALTH_CHECKS. Печатаются
+открытые соединения и среднее время запроса. SQLite в памяти своё
+соединение не закрывает, поэтому тестовая SQLite создаётся в файле;
+установка соединения дорога на PostgreSQL:
+```
+DB_ENGINE=django.db.backends.sqlite3 python -m benchmarks.connection_overhead --repeat 500
+```
+"""
+import argparse
+import os
+from tempfile import TemporaryDirectory
+from time import perf_counter
+from wsgiref.util import setup_testing_defaults
+
+from .common import setup_django, test_database
+
+MODES = (
+    ('CONN_MAX_AGE=0', 0, False),
+    ('постоянное', 60, False),
+    ('с проверкой', 60, True),
+)
+
+
+def get(handler, environ):
+    def start_response(status, headers):
+        assert status.startswith('200'), status
+
+    response = handler(dict(environ), start_response)
+    try:
+        for _ in response:
+            pass
+    finally:
+        response.close()
+
+
+def run(name, handler, environ, repeat):
+    from django.db import connection
+    from django.db.backends.signals import connection_created
+
+    opened = []
+
+    def count(**kwargs):
+        opened.append(True)
+
+    get(handler, environ)
+    connection_created.connect(count)
+    try:
+        started = perf_counter()
+        for _ in range(repeat):
+            get(handler, environ)
+        elapsed = (perf_counter() - started) / repeat
+    finally:
+        connection_created.disconnect(count)
+    print(f'{name:>15}: соединений {len(opened):5}, '
+          f'{elapsed * 1000:6.2f} мс на запрос ({connection.vendor})')
+
+
+def compare(repeat):
+    from django.contrib.auth import get_user_model
+    from django.core.handlers.wsgi import WSGIHandler
+    from django.db import connection
+    from rest_framework.authtoken.models import Token
+
+    user = get_user_model().objects.create_user(
+        username='reader', email='reader@example.com', password='pass')
+    # С токеном ответ не берётся из кеша анонимных ответов.
+    environ = {
+        'PATH_INFO': '/api/recipes/', 'HTTP_HOST': 'testserver',
+        'HTTP_AUTHORIZATION': f'Token {Token.objects.create(user=user).key}'}
+    setup_testing_defaults(environ)
+    handler = WSGIHandler()
+    for name, max_age, health_checks in MODES:
+        connection.close()
+        connection.settings_dict['CONN_MAX_AGE'] = max_age
+        connection.settings_dict['CONN_HEALTH_CHECKS'] = health_checks
+        run(name, handler, environ, repeat)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--repeat', type=int, default=500)
+    args = parser.parse_args()
+    setup_django()
+    from django.db import connection
+
+    with TemporaryDirectory() as directory:
+        if connection.vendor == 'sqlite':
+            # Базу в памяти закрытие соединения уничтожило бы.
+            connection.settings_dict['TEST']['NAME'] = os.path.join(
+                directory, 'benchmark.sqlite3')
+        with test_database():
+            compare(args.repeat)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+"""Задержка автодополнения ингредиентов на data/ingredients.csv.
+
+Загружает справочник из data/ingredients.csv и для запросов разной
+длины печатает число найденных ингредиентов, медиану и 95-й перцентиль
+запроса GET /api/ingredients/?name=, а также время прежнего фильтра
+name__icontains без ранжирования и ограничения:
+```
+DB_ENGINE=django.db.backends.sqlite3 python -m benchmarks.ingredient_search --repeat 200
+```
+"""
+import argparse
+from statistics import median, quantiles
+from time import perf_counter
+
+from .common import setup_django, test_database
+
+QUERIES = ('с', 'са', 'сах', 'сахар', 'мол', 'ово', 'сливоч', 'Сливочное м')
+
+
+def timings(call, repeat):
+    call()
+    result = []
+    for _ in range(repeat):
+        started = perf_counter()
+        call()
+        result.append(perf_counter() - started)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+    setup_django()
+    from django.conf import settings
+    from rest_framework.test import APIClient
+    from recipes.importers import import_ingredients, read_ingredients
+    from recipes.models import Ingredient
+
+    with test_database():
+        import_ingredients(read_ingredients(
+            f'{settings.BASE_DIR}/data/ingredients.csv'))
+        print(f'Ингредиентов: {Ingredient.objects.count()}')
+        client = APIClient()
+        for query in QUERIES:
+            found = len(client.get(
+                '/api/ingredients/', {'name': query}).data)
+            api = timings(lambda: client.get(
+                '/api/ingredients/', {'name': query}), args.repeat)
+            old = timings(lambda: list(Ingredient.objects.filter(
+                name__icontains=query)), args.repeat)
+            print(f'{query!r:>14}: найдено {found:3}, API медиана '
+                  f'{median(api) * 1000:5.2f} мс, p95 '
+                  f'{quantiles(api, n=20)[-1] * 1000:5.2f} мс; '
+                  f'icontains {median(old) * 1000:5.2f} мс')
+
+
+if __name__ == '__main__':
+    main()
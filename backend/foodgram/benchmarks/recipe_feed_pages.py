@@ -0,0 +1,81 @@
+"""Время первой и глубокой страницы ленты рецептов.
+
+Сравнивает постраничную выдачу (page, OFFSET и COUNT) с курсором на
+первой странице и на странице --page для корпуса ровно на --page страниц
+по --limit рецептов. Запросы идут от авторизованного пользователя, чтобы
+не попадать в кеш анонимных ответов. С --explain печатается план запроса
+глубокой страницы по курсору:
+```
+DB_ENGINE=django.db.backends.sqlite3 python -m benchmarks.recipe_feed_pages --page 10000
+```
+"""
+import argparse
+from time import perf_counter
+
+from .common import setup_django, test_database
+
+
+def create_feed(recipes):
+    from recipes.synthetic import SyntheticData
+
+    SyntheticData(
+        users=100, recipes=recipes, favorites=0, carts=0, subscriptions=0,
+        ingredients=1, tags=1).generate()
+
+
+def deep_cursor(page, limit):
+    """Курсор, который вернула бы в next страница page - 1."""
+    from api.pagination import RecipePagination
+    from recipes.models import Recipe
+
+    last = Recipe.objects.order_by('-pub_date', '-id')[(page - 1) * limit - 1]
+    return RecipePagination().encode_cursor(last)
+
+
+def run(client, name, params, repeat):
+    response = client.get('/api/recipes/', params)
+    assert response.status_code == 200, response.status_code
+    started = perf_counter()
+    for _ in range(repeat):
+        client.get('/api/recipes/', params)
+    elapsed = (perf_counter() - started) / repeat
+    print(f'{name:>18}: {elapsed * 1000:7.2f} мс')
+
+
+def explain(limit, cursor):
+    from api.pagination import RecipePagination
+    from recipes.models import Recipe
+
+    queryset = RecipePagination().after_cursor(Recipe.objects.all(), cursor)
+    print(queryset[:limit + 1].explain())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--page', type=int, default=10000)
+    parser.add_argument('--limit', type=int, default=6)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--explain', action='store_true')
+    args = parser.parse_args()
+    setup_django()
+    from django.contrib.auth import get_user_model
+    from rest_framework.test import APIClient
+
+    with test_database():
+        create_feed(args.page * args.limit)
+        client = APIClient()
+        client.force_authenticate(get_user_model().objects.first())
+        cursor = deep_cursor(args.page, args.limit)
+        limit = {'limit': args.limit}
+        run(client, 'page=1', {'page': 1, **limit}, args.repeat)
+        run(client, f'page={args.page}', {'page': args.page, **limit},
+            args.repeat)
+        run(client, 'cursor, первая', {'cursor': '', **limit}, args.repeat)
+        run(client, f'cursor, {args.page}-я', {'cursor': cursor, **limit},
+            args.repeat)
+        if args.explain:
+            explain(args.limit, cursor)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+"""Поиск рецептов на большом корпусе: search_recipes против LIKE.
+
+На синтетическом корпусе из --recipes рецептов для нескольких запросов
+печатается число найденных рецептов и среднее время count и первой
+страницы: для search_recipes (полнотекстовый индекс в PostgreSQL,
+инвертированный индекс в памяти в остальных базах) и для icontains по
+названию, описанию и ингредиентам с DISTINCT. Построение индекса в памяти
+замеряется отдельно. В SQLite LIKE не учитывает регистр кириллицы и
+находит меньше, а индекс в памяти отдаёт не больше
+InMemoryRecipeSearch.limit рецептов:
+```
+DB_ENGINE=django.db.backends.sqlite3 python -m benchmarks.recipe_search --recipes 100000
+```
+"""
+import argparse
+from time import perf_counter
+
+from .common import setup_django, test_database
+
+PAGE_SIZE = 6
+QUERIES = ('суп', 'салат картофель', 'соль', 'огне минут', 'морк')
+
+
+def create_corpus(recipes):
+    from recipes.synthetic import SyntheticData
+
+    SyntheticData(
+        users=1000, recipes=recipes, favorites=0, carts=0,
+        subscriptions=0).generate()
+
+
+def like_search(queryset, query):
+    """Поиск подстрок без индекса, как до появления search_recipes."""
+    from django.db.models import Q
+
+    for word in query.split():
+        queryset = queryset.filter(
+            Q(name__icontains=word) | Q(text__icontains=word)
+            | Q(ingredients__name__icontains=word))
+    return queryset.distinct()
+
+
+def run(search, query, repeat):
+    from recipes.models import Recipe
+
+    started = perf_counter()
+    for _ in range(repeat):
+        queryset = search(Recipe.objects.all(), query)
+        found = queryset.count()
+        list(queryset[:PAGE_SIZE])
+    return found, (perf_counter() - started) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--recipes', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+    setup_django()
+    from django.db import connection
+    from api.search import _in_memory_recipe_search, search_recipes
+
+    with test_database():
+        create_corpus(args.recipes)
+        if connection.vendor != 'postgresql':
+            started = perf_counter()
+            _in_memory_recipe_search.get_index()
+            print(f'Индекс в памяти: {perf_counter() - started:.1f} с')
+        for query in QUERIES:
+            found, elapsed = run(search_recipes, query, args.repeat)
+            like_found, like_elapsed = run(like_search, query, args.repeat)
+            print(f'{query!r:>22}: поиск {found:6} за '
+                  f'{elapsed * 1000:7.1f} мс, LIKE {like_found:6} за '
+                  f'{like_elapsed * 1000:7.1f} мс')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+"""Фильтр ленты по тегам: JOIN с DISTINCT против подзапросов EXISTS.
+
+На синтетическом корпусе из --recipes рецептов (до --tags тегов у
+рецепта) выбираются --selected самых частых тегов. Результаты any и all
+сверяются с вычислением на множествах Python, затем печатается среднее
+время count и первой страницы для прежнего фильтра tags__slug и для
+filter_by_tags:
+```
+DB_ENGINE=django.db.backends.sqlite3 python -m benchmarks.recipe_tag_filter --recipes 20000
+```
+"""
+import argparse
+from collections import Counter, defaultdict
+from time import perf_counter
+
+from .common import setup_django, test_database
+
+PAGE_SIZE = 6
+
+
+def create_corpus(recipes, tags):
+    from recipes.synthetic import SyntheticData
+
+    SyntheticData(
+        users=100, recipes=recipes, favorites=0, carts=0, subscriptions=0,
+        ingredients=1, tags=tags).generate()
+
+
+def expected_ids(tag_ids):
+    """Рецепты с любым и со всеми тегами, посчитанные без SQL."""
+    from recipes.models import RecipeTag
+
+    recipe_tags = defaultdict(set)
+    for recipe_id, tag_id in RecipeTag.objects.values_list(
+            'recipe_id', 'tag_id'):
+        recipe_tags[recipe_id].add(tag_id)
+    selected = set(tag_ids)
+    return (
+        {recipe for recipe, tags in recipe_tags.items() if tags & selected},
+        {recipe for recipe, tags in recipe_tags.items() if selected <= tags})
+
+
+def run(name, queryset, repeat):
+    started = perf_counter()
+    for _ in range(repeat):
+        queryset.count()
+        list(queryset.order_by('-pub_date')[:PAGE_SIZE])
+    elapsed = (perf_counter() - started) / repeat
+    print(f'{name:>18}: {elapsed * 1000:7.2f} мс')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--recipes', type=int, default=20000)
+    parser.add_argument('--tags', type=int, default=4)
+    parser.add_argument('--selected', type=int, default=3)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+    setup_django()
+    from api.filters import filter_by_tags
+    from recipes.models import Recipe, RecipeTag, Tag
+
+    with test_database():
+        create_corpus(args.recipes, args.tags)
+        popular = Counter(RecipeTag.objects.values_list('tag_id', flat=True))
+        tag_ids = [tag_id for tag_id, _ in popular.most_common(args.selected)]
+        slugs = list(Tag.objects.filter(
+            id__in=tag_ids).values_list('slug', flat=True))
+        any_ids, all_ids = expected_ids(tag_ids)
+        joined = Recipe.objects.filter(tags__slug__in=slugs)
+        querysets = (
+            ('JOIN + DISTINCT', joined.distinct(), any_ids),
+            ('EXISTS, any', filter_by_tags(Recipe.objects.all(), tag_ids),
+             any_ids),
+            ('EXISTS, all', filter_by_tags(
+                Recipe.objects.all(), tag_ids, match_all=True), all_ids),
+        )
+        print(f'Теги {", ".join(slugs)}: any {len(any_ids)}, all '
+              f'{len(all_ids)}, строк JOIN до DISTINCT {joined.count()}')
+        for name, queryset, expected in querysets:
+            found = list(queryset.values_list('id', flat=True))
+            assert len(found) == len(set(found)), f'{name}: повторы'
+            assert set(found) == expected, f'{name}: не тот результат'
+        for name, queryset, _ in querysets:
+            run(name, queryset, args.repeat)
+
+
+if __name__ == '__main__':
+    main()
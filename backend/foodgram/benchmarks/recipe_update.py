@@ -0,0 +1,129 @@
+"""Объём записи в базу при небольших правках рецепта.
+
+Сравнивает прежнее обновление (удалить все IngredientAmount и создать
+заново, tags.set) с diff-обновлением RecipeSerializer для рецепта на
+--ingredients ингредиентов. Для каждой правки печатаются изменяющие
+запросы, затронутые строки (в Postgres каждая удалённая или изменённая
+строка — мёртвый кортеж) и среднее время:
+```
+DB_ENGINE=django.db.backends.sqlite3 python -m benchmarks.recipe_update --ingredients 20
+```
+"""
+import argparse
+from time import perf_counter
+
+from .common import setup_django, test_database
+
+WRITES = ('INSERT', 'UPDATE', 'DELETE')
+
+
+class WriteCounter:
+    """execute_wrapper, считающий изменяющие запросы и строки."""
+
+    def __init__(self):
+        self.statements = 0
+        self.rows = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            if sql.split()[0] in WRITES:
+                self.statements += 1
+                self.rows += max(context['cursor'].rowcount, 0)
+
+
+def replace_update(recipe, tags, ingredients):
+    """Обновление состава рецепта до diff-версии."""
+    from recipes.models import IngredientAmount
+
+    recipe.tags.set(tags)
+    IngredientAmount.objects.filter(recipe=recipe).delete()
+    IngredientAmount.objects.bulk_create(
+        IngredientAmount(
+            recipe=recipe, ingredient=item['ingredient'],
+            amount=item['amount'])
+        for item in ingredients)
+
+
+def diff_update(recipe, tags, ingredients):
+    from api.serializers import RecipeSerializer
+
+    RecipeSerializer.update_tags(recipe, tags)
+    RecipeSerializer.update_ingredients(recipe, ingredients)
+
+
+def create_recipe(size):
+    from django.contrib.auth import get_user_model
+    from recipes.models import Ingredient, IngredientAmount, Recipe, Tag
+
+    user = get_user_model().objects.create_user(
+        username='author', email='author@example.com', password='pass')
+    tags = [Tag.objects.create(name=f'Тег {index}', color=f'#00000{index}',
+                               slug=f'tag{index}') for index in range(3)]
+    Ingredient.objects.bulk_create(
+        Ingredient(name=f'Ингредиент {index}', measurement_unit='г')
+        for index in range(size + 1))
+    ingredients = list(Ingredient.objects.order_by('id'))
+    recipe = Recipe.objects.create(
+        author=user, name='Рецепт', text='Описание', cooking_time=10,
+        image='recipes/test.jpg')
+    recipe.tags.set(tags)
+    IngredientAmount.objects.bulk_create(
+        IngredientAmount(recipe=recipe, ingredient=ingredient, amount=10)
+        for ingredient in ingredients[:size])
+    return recipe, tags, ingredients
+
+
+def edits(tags, ingredients, size):
+    """Правки относительно исходного состава: название и новые данные."""
+    base = [{'ingredient': ingredient, 'amount': 10}
+            for ingredient in ingredients[:size]]
+    changed = [dict(item) for item in base]
+    changed[0]['amount'] = 20
+    return [
+        ('без изменений', tags, base),
+        ('одно количество', tags, changed),
+        ('плюс ингредиент', tags, base + [
+            {'ingredient': ingredients[size], 'amount': 5}]),
+        ('минус тег', tags[:-1], base),
+    ]
+
+
+def run(update, recipe, tags, ingredients, size, repeat):
+    from django.db import connection, transaction
+
+    for name, new_tags, new_ingredients in edits(tags, ingredients, size):
+        counter = WriteCounter()
+        elapsed = 0
+        for _ in range(repeat):
+            with transaction.atomic():
+                sid = transaction.savepoint()
+                with connection.execute_wrapper(counter):
+                    started = perf_counter()
+                    update(recipe, new_tags, new_ingredients)
+                    elapsed += perf_counter() - started
+                transaction.savepoint_rollback(sid)
+        print(f'  {name:>15}: запросов {counter.statements / repeat:4.1f}, '
+              f'строк {counter.rows / repeat:5.1f}, '
+              f'{elapsed / repeat * 1000:6.2f} мс')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--ingredients', type=int, default=20)
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+    setup_django()
+
+    with test_database():
+        recipe, tags, ingredients = create_recipe(args.ingredients)
+        for title, update in (('удалить и создать', replace_update),
+                              ('diff', diff_update)):
+            print(f'{title}:')
+            run(update, recipe, tags, ingredients, args.ingredients,
+                args.repeat)
+
+
+if __name__ == '__main__':
+    main()
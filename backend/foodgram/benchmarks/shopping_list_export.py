@@ -0,0 +1,97 @@
+"""Память и время до первого байта при выгрузке списка покупок.
+
+Сравнивает прежний путь (шаблон shopping_list.txt, строка целиком в
+памяти) с потоковой выгрузкой в txt, csv и pdf для корзины на --lines
+строк. Каждый способ сначала прогоняется вхолостую. Память считает
+tracemalloc, то есть без буферов C-расширений:
+```
+DB_ENGINE=django.db.backends.sqlite3 python -m benchmarks.shopping_list_export --lines 5000
+```
+"""
+import argparse
+from time import perf_counter
+
+from .common import measure, setup_django, test_database
+
+TEMPLATE = '''{% for item in shopping_list %}
+{{ item.ingredient__name }} ({{ item.ingredient__measurement_unit }}) - {{ item.total_amount }}
+{% endfor %}
+'''
+
+
+def create_cart(lines):
+    from django.contrib.auth import get_user_model
+    from recipes.models import (
+        Cart, Ingredient, IngredientAmount, Recipe, ShoppingListLine)
+
+    user = get_user_model().objects.create_user(
+        username='buyer', email='buyer@example.com', password='pass')
+    Ingredient.objects.bulk_create(
+        Ingredient(name=f'Ингредиент номер {index}', measurement_unit='г')
+        for index in range(lines))
+    recipe = Recipe.objects.create(
+        author=user, name='Рецепт', text='Описание', cooking_time=10,
+        image='recipes/test.jpg')
+    IngredientAmount.objects.bulk_create(
+        IngredientAmount(recipe=recipe, ingredient=ingredient, amount=100)
+        for ingredient in Ingredient.objects.all())
+    Cart.objects.create(user=user, recipe=recipe)
+    ShoppingListLine.objects.rebuild(users=[user])
+    return user
+
+
+def template_export(user):
+    """download_shopping_cart до перехода на потоковую выдачу."""
+    from django.db.models import Sum
+    from django.http import HttpResponse
+    from django.template import Context, Template
+    from recipes.models import IngredientAmount
+
+    queryset = IngredientAmount.objects.filter(
+        recipe__carts__user=user).values(
+        'ingredient__name', 'ingredient__measurement_unit').annotate(
+            total_amount=Sum('amount'))
+    shopping_list = Template(TEMPLATE).render(
+        Context({'shopping_list': queryset}))
+    shopping_list = shopping_list.strip().replace('\n\n', '\n')
+    response = HttpResponse(shopping_list, content_type='text/plain')
+    response[
+        'Content-Disposition'] = 'attachment; filename="shopping_list.txt"'
+    return response
+
+
+def run(name, export):
+    for _ in export():
+        pass
+    with measure() as result:
+        response = export()
+        chunks = iter(response)
+        size = len(next(chunks, b''))
+        result['first_byte'] = perf_counter() - result['started']
+        size += sum(len(chunk) for chunk in chunks)
+    print(f'{name:>9}: {size / 1024:8.0f} КБ, первый байт '
+          f'{result["first_byte"] * 1000:7.1f} мс, всего '
+          f'{result["seconds"] * 1000:7.1f} мс, пик памяти '
+          f'{result["peak_bytes"] / 1024 / 1024:6.1f} МБ')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--lines', type=int, default=5000)
+    args = parser.parse_args()
+    setup_django()
+    from rest_framework.test import APIClient
+
+    with test_database():
+        user = create_cart(args.lines)
+        client = APIClient()
+        client.force_authenticate(user)
+        url = '/api/recipes/download_shopping_cart/'
+        run('шаблон', lambda: template_export(user))
+        for export_format in ('txt', 'csv', 'pdf'):
+            run(export_format, lambda: client.get(
+                url, {'format': export_format}))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+"""Запросы в секунду и p99 синхронного и асинхронного развёртывания.
+
+По очереди поднимает gunicorn с синхронными воркерами (foodgram.wsgi) и
+с UvicornWorker (foodgram.asgi, ASYNC_VIEWS=True) на базе из окружения и
+нагружает каждый сервер потоками-клиентами с keep-alive при нескольких
+уровнях параллельности. Базу нужно заполнить заранее, например командой
+generate_data:
+```
+DB_ENGINE=django.db.backends.sqlite3 DB_NAME=/tmp/bench.sqlite3 python manage.py migrate
+DB_ENGINE=django.db.backends.sqlite3 DB_NAME=/tmp/bench.sqlite3 python manage.py generate_data --users 50 --recipes 60
+DB_ENGINE=django.db.backends.sqlite3 DB_NAME=/tmp/bench.sqlite3 python -m benchmarks.sync_vs_async
+```
+"""
+import argparse
+import os
+import subprocess
+import sys
+from http.client import HTTPConnection
+from threading import Thread
+from time import monotonic, perf_counter, sleep
+from urllib.parse import quote
+
+HOST = '127.0.0.1'
+DEPLOYMENTS = {
+    'sync': (['foodgram.wsgi:application'], {'ASYNC_VIEWS': 'False'}),
+    'async': (['foodgram.asgi:application', '--worker-class',
+               'uvicorn.workers.UvicornWorker'], {'ASYNC_VIEWS': 'True'}),
+}
+
+
+def start_server(deployment, port, workers):
+    args, env = DEPLOYMENTS[deployment]
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', *args, '--bind', f'{HOST}:{port}',
+         '--workers', str(workers), '--log-level', 'warning'],
+        env={**os.environ, **env})
+    deadline = monotonic() + 30
+    while monotonic() < deadline:
+        try:
+            connection = HTTPConnection(HOST, port, timeout=1)
+            connection.request('GET', '/api/tags/')
+            if connection.getresponse().status == 200:
+                return process
+        except OSError:
+            sleep(0.2)
+    process.terminate()
+    raise RuntimeError(f'Сервер {deployment} не поднялся за 30 секунд')
+
+
+def client(port, path, deadline, latencies, errors):
+    connection = HTTPConnection(HOST, port, timeout=30)
+    while monotonic() < deadline:
+        started = perf_counter()
+        try:
+            connection.request('GET', path)
+            response = connection.getresponse()
+            response.read()
+        except OSError:
+            errors.append(path)
+            connection.close()
+            connection = HTTPConnection(HOST, port, timeout=30)
+            continue
+        if response.status != 200:
+            errors.append(path)
+        latencies.append(perf_counter() - started)
+
+
+def load(port, path, concurrency, duration):
+    latencies, errors = [], []
+    deadline = monotonic() + duration
+    threads = [
+        Thread(target=client, args=(port, path, deadline, latencies, errors))
+        for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    latencies.sort()
+    p99 = latencies[int(len(latencies) * 0.99)] if latencies else 0
+    return len(latencies) / duration, p99, len(errors)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument(
+        '--paths', default='/api/recipes/,/api/ingredients/?name=мо',
+        help='Адреса через запятую')
+    parser.add_argument(
+        '--concurrency', default='1,8,32',
+        help='Уровни параллельности через запятую')
+    parser.add_argument('--duration', type=float, default=10,
+                        help='Секунд нагрузки на каждый замер')
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--port', type=int, default=8765)
+    args = parser.parse_args()
+    paths = args.paths.split(',')
+    levels = [int(level) for level in args.concurrency.split(',')]
+
+    for deployment in DEPLOYMENTS:
+        process = start_server(deployment, args.port, args.workers)
+        try:
+            for path in paths:
+                for concurrency in levels:
+                    rps, p99, errors = load(
+                        args.port, quote(path, safe='/?=&'), concurrency,
+                        args.duration)
+                    print(f'{path:30} {deployment:>5} x{concurrency:<3} '
+                          f'{rps:7.1f} rps, p99 {p99 * 1000:7.1f} мс, '
+                          f'ошибок {errors}')
+        finally:
+            process.terminate()
+            process.wait()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,22 @@
+"""Настройки для проверки чтения с реплики на двух локальных базах.
+
+Реплика в тестах зеркалит основную базу, но открывает своё соединение,
+поэтому по запросам в каждом соединении видно, куда ушло чтение.
+"""
+from .settings import *  # noqa: F401,F403
+from .settings import DATABASES
+
+DATABASES['replica1'] = {
+    **DATABASES['default'],
+    'ATOMIC_REQUESTS': False,
+    'TEST': {'MIRROR': 'default'},
+}
+
+# Признак «читать с основной базы» должен быть виден всем воркерам.
+# Кеш в базе, как в docker-compose: его таблица читается с основной.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'django_cache',
+    }
+}
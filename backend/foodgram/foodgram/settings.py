@@ -49,19 +49,44 @@ LOCAL_APPS = [
 
 INSTALLED_APPS = DJANGO_APPS + THIRD_PARTY_APPS + LOCAL_APPS
 
+AUTH_MODE = os.getenv('AUTH_MODE', default='token')
+AUTHENTICATION_CLASSES = {
+    'token': ('users.authentication.CachedTokenAuthentication',),
+    'jwt': ('users.authentication.StatelessJWTAuthentication',),
+    'both': (
+        'users.authentication.CachedTokenAuthentication',
+        'users.authentication.StatelessJWTAuthentication',
+    ),
+}
+
 REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.AllowAny',
     ],
-    'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework.authentication.TokenAuthentication',
-    ),
+    'DEFAULT_AUTHENTICATION_CLASSES': AUTHENTICATION_CLASSES[AUTH_MODE],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 6,
 }
 
+INGREDIENT_SEARCH_LIMIT = int(
+    os.getenv('INGREDIENT_SEARCH_LIMIT', default=50))
+
+CATALOG_CACHE_TTL = int(os.getenv('CATALOG_CACHE_TTL', default=60))
+
+TOKEN_CACHE_SIZE = int(os.getenv('TOKEN_CACHE_SIZE', default=1024))
+TOKEN_CACHE_TTL = int(os.getenv('TOKEN_CACHE_TTL', default=30))
+TOKEN_SHARED_CACHE = os.getenv(
+    'TOKEN_SHARED_CACHE', default='False').lower() in ('true', '1', 'yes')
+TOKEN_SHARED_CACHE_TTL = int(
+    os.getenv('TOKEN_SHARED_CACHE_TTL', default=300))
+
 SIMPLE_JWT = {
-    'ACCESS_TOKEN_LIFETIME': timedelta(days=5),
+    'ACCESS_TOKEN_LIFETIME': timedelta(
+        minutes=int(os.getenv('JWT_ACCESS_TOKEN_MINUTES', default=15))),
+    'REFRESH_TOKEN_LIFETIME': timedelta(
+        days=int(os.getenv('JWT_REFRESH_TOKEN_DAYS', default=7))),
+    'SIGNING_KEY': os.getenv(
+        'JWT_SIGNING_KEY', default=os.getenv('DJANGO_SECRET_KEY')),
     'AUTH_HEADER_TYPES': ('Bearer',),
 }
 
@@ -73,8 +98,18 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'api.middleware.CatalogCacheMiddleware',
+    'api.middleware.QueryInstrumentationMiddleware',
 ]
 
+SQL_INSTRUMENTATION = os.getenv(
+    'SQL_INSTRUMENTATION', default='False').lower() in ('true', '1', 'yes')
+SERVER_TIMING = os.getenv(
+    'SERVER_TIMING', default='False').lower() in ('true', '1', 'yes')
+SLOW_QUERY_THRESHOLD_MS = int(
+    os.getenv('SLOW_QUERY_THRESHOLD_MS', default=100))
+SQL_STATS_BATCH = int(os.getenv('SQL_STATS_BATCH', default=50))
+
 ROOT_URLCONF = 'foodgram.urls'
 
 TEMPLATES = [
@@ -94,6 +129,10 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'foodgram.wsgi.application'
+ASGI_APPLICATION = 'foodgram.asgi.application'
+
+ASYNC_VIEWS = os.getenv(
+    'ASYNC_VIEWS', default='False').lower() in ('true', '1', 'yes')
 
 
 # Database
@@ -108,10 +147,54 @@ DATABASES = {
         'PASSWORD': os.getenv('POSTGRES_PASSWORD', default='postgres'),
         'HOST': os.getenv('DB_HOST', default='127.0.0.1'),
         'PORT': os.getenv('DB_PORT', default='5432'),
-        'ATOMIC_REQUESTS': True
+        'ATOMIC_REQUESTS': True,
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', default=60)),
+        'CONN_HEALTH_CHECKS': os.getenv(
+            'DB_CONN_HEALTH_CHECKS', default='True').lower() in (
+                'true', '1', 'yes'),
+        # PgBouncer в режиме pool_mode=transaction не сохраняет
+        # серверные курсоры между транзакциями.
+        'DISABLE_SERVER_SIDE_CURSORS': os.getenv(
+            'DB_PGBOUNCER', default='False').lower() in ('true', '1', 'yes'),
     }
 }
 
+# Реплики только для чтения: DB_REPLICA_HOSTS=host1,host2:5433
+for index, replica in enumerate(filter(None, os.getenv(
+        'DB_REPLICA_HOSTS', default='').split(',')), start=1):
+    host, _, port = replica.strip().partition(':')
+    DATABASES[f'replica{index}'] = {
+        **DATABASES['default'],
+        'HOST': host,
+        'PORT': port or DATABASES['default']['PORT'],
+        'ATOMIC_REQUESTS': False,
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_ROUTERS = ['api.db.ReplicaRouter']
+
+REPLICA_STICKY_SECONDS = int(
+    os.getenv('DB_REPLICA_STICKY_SECONDS', default=10))
+
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', default=''),
+    }
+}
+
+# TrueType-шрифт с кириллицей для PDF-списка покупок.
+SHOPPING_LIST_PDF_FONT = os.getenv(
+    'SHOPPING_LIST_PDF_FONT',
+    default='/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf')
+
+RECIPE_RESPONSE_CACHE_TIMEOUT = int(
+    os.getenv('RECIPE_RESPONSE_CACHE_TIMEOUT', default=300))
+
+DEFAULT_AUTO_FIELD = 'django.db.models.AutoField'
+
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
 
@@ -158,6 +241,15 @@ MEDIA_URL = '/media/'
 MEDIA_ROOT = '/var/html/media/'
 # MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+RECIPE_IMAGE_MAX_BYTES = int(
+    os.getenv('RECIPE_IMAGE_MAX_BYTES', default=5 * 1024 * 1024))
+RECIPE_IMAGE_MAX_PIXELS = int(
+    os.getenv('RECIPE_IMAGE_MAX_PIXELS', default=40_000_000))
+RECIPE_IMAGE_ASYNC = os.getenv(
+    'RECIPE_IMAGE_ASYNC', default='True').lower() in ('true', '1', 'yes')
+IMAGE_JOB_MAX_ATTEMPTS = int(os.getenv('IMAGE_JOB_MAX_ATTEMPTS', default=5))
+IMAGE_JOB_RETRY_DELAY = int(os.getenv('IMAGE_JOB_RETRY_DELAY', default=30))
+
 DJOSER = {
     'LOGIN_FIELD': 'email',
     'HIDE_USERS': False,
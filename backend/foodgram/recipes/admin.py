@@ -1,7 +1,80 @@
 from django.contrib import admin
+from django.utils import timezone
 
+from .documents import refresh_documents
 from .models import (
-    Cart, Favorite, Ingredient, IngredientAmount, Recipe, RecipeTag, Tag)
+    Cart, Favorite, ImageJob, Ingredient, IngredientAmount, Recipe,
+    RecipeTag, ShoppingListLine, Tag, reconcile_recipe_counters)
+
+
+class ShoppingListAdminMixin:
+    """Пересчитывает списки покупок, затронутые правкой в админке.
+
+    Представления API меняют ShoppingListLine приращениями, а админка
+    просто пересобирает списки затронутых пользователей после сохранения
+    или удаления.
+    """
+
+    def shopping_list_users(self, queryset):
+        """id пользователей, чьи списки зависят от объектов queryset."""
+        raise NotImplementedError
+
+    def affected_users(self, obj):
+        return set(self.shopping_list_users(
+            self.model.objects.filter(pk=obj.pk)))
+
+    def rebuild_shopping_lists(self, users):
+        if users:
+            ShoppingListLine.objects.rebuild(users=list(users))
+
+    def save_model(self, request, obj, form, change):
+        obj._shopping_list_users = (
+            self.affected_users(obj) if change else set())
+        super().save_model(request, obj, form, change)
+
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        obj = form.instance
+        self.rebuild_shopping_lists(
+            obj._shopping_list_users | self.affected_users(obj))
+
+    def delete_model(self, request, obj):
+        users = self.affected_users(obj)
+        super().delete_model(request, obj)
+        self.rebuild_shopping_lists(users)
+
+    def delete_queryset(self, request, queryset):
+        users = set(self.shopping_list_users(queryset))
+        super().delete_queryset(request, queryset)
+        self.rebuild_shopping_lists(users)
+
+
+class RecipeCountersAdminMixin:
+    """Пересчитывает favorites_count и carts_count после правки связей."""
+
+    def counter_recipe_ids(self, queryset):
+        return set(queryset.values_list('recipe_id', flat=True))
+
+    def save_model(self, request, obj, form, change):
+        obj._counter_recipe_ids = (
+            self.counter_recipe_ids(self.model.objects.filter(pk=obj.pk))
+            if change else set())
+        super().save_model(request, obj, form, change)
+        reconcile_recipe_counters(obj._counter_recipe_ids | {obj.recipe_id})
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        reconcile_recipe_counters([obj.recipe_id])
+
+    def delete_queryset(self, request, queryset):
+        recipe_ids = self.counter_recipe_ids(queryset)
+        super().delete_queryset(request, queryset)
+        reconcile_recipe_counters(recipe_ids)
+
+
+def cart_users(recipes):
+    return Cart.objects.filter(recipe__in=recipes).values_list(
+        'user_id', flat=True)
 
 
 class TagInline(admin.TabularInline):
@@ -14,7 +87,7 @@ class IngredientInline(admin.TabularInline):
     min_num = 1
 
 
-class RecipeAdmin(admin.ModelAdmin):
+class RecipeAdmin(ShoppingListAdminMixin, admin.ModelAdmin):
     list_display = ('id', 'name', 'author', 'favorites')
     inlines = (
         TagInline,
@@ -23,9 +96,40 @@ class RecipeAdmin(admin.ModelAdmin):
     list_filter = ('author', 'name', 'tags')
 
     def favorites(self, obj):
-        return obj.favorites.count()
+        return obj.favorites_count
 
     favorites.short_description = 'В избранном'
+    favorites.admin_order_field = 'favorites_count'
+
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        refresh_documents([form.instance.id])
+
+    def shopping_list_users(self, queryset):
+        return cart_users(queryset)
+
+
+class IngredientAmountAdmin(ShoppingListAdminMixin, admin.ModelAdmin):
+
+    def shopping_list_users(self, queryset):
+        return cart_users(queryset.values('recipe_id'))
+
+    def delete_queryset(self, request, queryset):
+        # Массовое удаление не вызывает IngredientAmount.delete().
+        Recipe.objects.filter(ingredientamount__in=queryset).update(
+            updated_at=timezone.now())
+        super().delete_queryset(request, queryset)
+
+
+class FavoriteAdmin(RecipeCountersAdminMixin, admin.ModelAdmin):
+    pass
+
+
+class CartAdmin(RecipeCountersAdminMixin, ShoppingListAdminMixin,
+                admin.ModelAdmin):
+
+    def shopping_list_users(self, queryset):
+        return queryset.values_list('user_id', flat=True)
 
 
 class IngredientAdmin(admin.ModelAdmin):
@@ -33,10 +137,18 @@ class IngredientAdmin(admin.ModelAdmin):
     list_filter = ('name',)
 
 
+class ImageJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'recipe', 'status', 'attempts', 'next_attempt_at',
+                    'created')
+    list_filter = ('status',)
+
+
 admin.site.register(Ingredient, IngredientAdmin)
 admin.site.register(Tag)
 admin.site.register(Recipe, RecipeAdmin)
 admin.site.register(RecipeTag)
-admin.site.register(IngredientAmount)
-admin.site.register(Favorite)
-admin.site.register(Cart)
+admin.site.register(IngredientAmount, IngredientAmountAdmin)
+admin.site.register(Favorite, FavoriteAdmin)
+admin.site.register(Cart, CartAdmin)
+admin.site.register(ShoppingListLine)
+admin.site.register(ImageJob, ImageJobAdmin)
@@ -0,0 +1,118 @@
+"""Кеш справочников тегов и ингредиентов в памяти процесса.
+
+Каждый воркер держит снимок обеих таблиц, проиндексированный по id.
+Сигналы сохранения и удаления увеличивают общий номер версии в кеше
+Django, и воркеры перечитывают снимок при следующем обращении. Номер
+версии проверяется не чаще одного раза за запрос, а при отсутствии
+общего кеша снимок всё равно устаревает через CATALOG_CACHE_TTL секунд.
+"""
+import hashlib
+from time import monotonic
+
+from asgiref.local import Local
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Ingredient, Tag
+
+VERSION_KEY = 'recipes:catalog:version'
+
+state = Local()
+
+
+def reset_request_state():
+    """Начинает учёт нового запроса: сбрасывает счётчики и проверку."""
+    state.verified = False
+    state.hits = 0
+    state.misses = 0
+
+
+def get_request_stats():
+    return getattr(state, 'hits', 0), getattr(state, 'misses', 0)
+
+
+class CatalogSnapshot:
+    """Неизменяемый снимок справочников на момент версии version."""
+
+    def __init__(self, version):
+        self.version = version
+        self.loaded_at = monotonic()
+        self.tags = {tag.id: tag for tag in Tag.objects.all()}
+        self.tags_by_slug = {tag.slug: tag for tag in self.tags.values()}
+        self.ingredients = {
+            ingredient.id: ingredient
+            for ingredient in Ingredient.objects.all()}
+        self.digest = hashlib.md5(repr((
+            [(tag.id, tag.name, tag.color, tag.slug)
+             for tag in self.tags.values()],
+            [(ingredient.id, ingredient.name, ingredient.measurement_unit)
+             for ingredient in self.ingredients.values()],
+        )).encode()).hexdigest()
+
+
+class Catalog:
+    """Доступ к актуальному снимку справочников."""
+
+    def __init__(self):
+        self._snapshot = None
+
+    @staticmethod
+    def current_version():
+        return cache.get_or_set(VERSION_KEY, 1, None)
+
+    def snapshot(self):
+        snapshot = self._snapshot
+        expired = (
+            snapshot is None
+            or monotonic() - snapshot.loaded_at > settings.CATALOG_CACHE_TTL)
+        if not expired and getattr(state, 'verified', False):
+            state.hits = getattr(state, 'hits', 0) + 1
+            return snapshot
+        version = self.current_version()
+        state.verified = True
+        if not expired and snapshot.version == version:
+            state.hits = getattr(state, 'hits', 0) + 1
+            return snapshot
+        state.misses = getattr(state, 'misses', 0) + 1
+        snapshot = CatalogSnapshot(version)
+        self._snapshot = snapshot
+        return snapshot
+
+    def invalidate(self):
+        self._snapshot = None
+        try:
+            cache.incr(VERSION_KEY)
+        except ValueError:
+            cache.set(VERSION_KEY, 2, None)
+
+    def digest(self):
+        """Хеш содержимого снимка, пригодный для ETag."""
+        return self.snapshot().digest
+
+    def tags(self):
+        return list(self.snapshot().tags.values())
+
+    def get_tag(self, pk):
+        return self.snapshot().tags.get(pk)
+
+    def get_tag_by_slug(self, slug):
+        return self.snapshot().tags_by_slug.get(slug)
+
+    def ingredients(self):
+        return list(self.snapshot().ingredients.values())
+
+    def get_ingredient(self, pk):
+        return self.snapshot().ingredients.get(pk)
+
+
+catalog = Catalog()
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def invalidate_catalog(sender, **kwargs):
+    catalog.invalidate()
@@ -0,0 +1,87 @@
+"""Поисковые документы рецептов.
+
+Документ — название, описание и названия ингредиентов рецепта одной
+строкой в Recipe.search_document. Сохранение рецепта и переименование
+ингредиента пересобирают документ по сигналам. Состав ингредиентов
+меняется массовыми операциями без сигналов, поэтому после них
+refresh_documents вызывают сериализатор рецепта и админка. Внутри
+deferred_refresh сигналы только запоминают рецепты, а документы
+пересобираются один раз в конце блока.
+"""
+from collections import defaultdict
+from contextlib import contextmanager
+
+from asgiref.local import Local
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from .models import Ingredient, IngredientAmount, Recipe
+
+BATCH_SIZE = 500
+
+_deferred = Local()
+
+
+def build_document(name, text, ingredient_names):
+    return '\n'.join([name, text, *ingredient_names])
+
+
+def refresh_documents(recipe_ids):
+    """Пересобирает документы рецептов recipe_ids.
+
+    Возвращает количество изменившихся документов.
+    """
+    recipe_ids = list(recipe_ids)
+    ingredient_names = defaultdict(list)
+    for recipe_id, name in IngredientAmount.objects.filter(
+            recipe_id__in=recipe_ids).order_by('id').values_list(
+            'recipe_id', 'ingredient__name'):
+        ingredient_names[recipe_id].append(name)
+    recipes = list(Recipe.objects.filter(id__in=recipe_ids).only(
+        'id', 'name', 'text', 'search_document'))
+    changed = []
+    for recipe in recipes:
+        document = build_document(
+            recipe.name, recipe.text, ingredient_names[recipe.id])
+        if recipe.search_document != document:
+            recipe.search_document = document
+            changed.append(recipe)
+    Recipe.objects.bulk_update(
+        changed, ['search_document'], batch_size=BATCH_SIZE)
+    return len(changed)
+
+
+@contextmanager
+def deferred_refresh():
+    """Откладывает пересборку документов до конца блока.
+
+    Отдаёт множество, в которое можно добавить id рецептов, изменённых
+    без сигналов. При ошибке в блоке документы не пересобираются.
+    """
+    _deferred.recipe_ids = recipe_ids = set()
+    try:
+        yield recipe_ids
+    finally:
+        _deferred.recipe_ids = None
+    if recipe_ids:
+        refresh_documents(recipe_ids)
+
+
+@receiver(post_save, sender=Recipe)
+def refresh_recipe_document(sender, instance, created, update_fields=None,
+                            **kwargs):
+    if created:
+        return
+    if update_fields is None or {'name', 'text'} & set(update_fields):
+        recipe_ids = getattr(_deferred, 'recipe_ids', None)
+        if recipe_ids is None:
+            refresh_documents([instance.id])
+        else:
+            recipe_ids.add(instance.id)
+
+
+@receiver(post_save, sender=Ingredient)
+def refresh_ingredient_documents(sender, instance, created, **kwargs):
+    if not created:
+        refresh_documents(IngredientAmount.objects.filter(
+            ingredient=instance).values_list('recipe_id', flat=True))
@@ -0,0 +1,78 @@
+"""Очередь фоновой обработки картинок рецептов на таблице ImageJob."""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from . import images
+from .models import ImageJob, Recipe
+
+
+def enqueue(recipe):
+    """Ставит картинку рецепта в очередь, если она ещё не обработана."""
+    if images.is_processed(recipe.image.name):
+        return None
+    return ImageJob.objects.create(recipe=recipe, source=recipe.image.name)
+
+
+def claim_next():
+    """Забирает одну готовую к запуску задачу, пропуская занятые."""
+    return ImageJob.objects.select_for_update(skip_locked=True).filter(
+        status=ImageJob.PENDING,
+        next_attempt_at__lte=timezone.now()).order_by(
+        'next_attempt_at').first()
+
+
+def run_job(job):
+    try:
+        name = images.process_upload(job.source)
+    except Exception as error:
+        job.attempts += 1
+        job.error = f'{type(error).__name__}: {error}'
+        if job.attempts >= settings.IMAGE_JOB_MAX_ATTEMPTS:
+            job.status = ImageJob.FAILED
+        else:
+            job.next_attempt_at = timezone.now() + timedelta(
+                seconds=settings.IMAGE_JOB_RETRY_DELAY * 2 ** job.attempts)
+        job.save()
+        return False
+    recipe = Recipe.objects.filter(pk=job.recipe_id, image=job.source).first()
+    if recipe is not None:
+        recipe.image = name
+        recipe.image_ready = True
+        recipe.save(update_fields=['image', 'image_ready', 'updated_at'])
+    job.status = ImageJob.DONE
+    job.attempts += 1
+    job.error = ''
+    job.save()
+    return True
+
+
+def run_pending(limit=None):
+    """Выполняет готовые задачи по одной, каждую в своей транзакции.
+
+    Возвращает количество обработанных задач.
+    """
+    processed = 0
+    while limit is None or processed < limit:
+        with transaction.atomic():
+            job = claim_next()
+            if job is None:
+                break
+            run_job(job)
+        processed += 1
+    return processed
+
+
+def backlog():
+    """Размер очереди и возраст самой старой задачи в секундах."""
+    pending = ImageJob.objects.filter(status=ImageJob.PENDING)
+    oldest = pending.order_by('created').values_list(
+        'created', flat=True).first()
+    age = (timezone.now() - oldest).total_seconds() if oldest else 0
+    return {
+        'pending': pending.count(),
+        'failed': ImageJob.objects.filter(status=ImageJob.FAILED).count(),
+        'oldest_age': age,
+    }
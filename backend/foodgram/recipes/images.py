@@ -0,0 +1,177 @@
+"""Обработка картинок рецептов.
+
+Загруженная картинка декодируется с ограничением по размеру и
+сохраняется как есть (store_upload). Затем фоновый обработчик
+(recipes.image_jobs) перекодирует её Pillow в несколько размеров
+(thumb, card, full) в JPEG и WebP под именами из хеша содержимого.
+Одинаковые загрузки дают одни и те же файлы, а сами файлы никогда не
+меняются, поэтому их можно кешировать без ограничения срока.
+"""
+import base64
+import binascii
+import hashlib
+import io
+import re
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+VARIANTS = {
+    'thumb': 160,
+    'card': 480,
+    'full': 1280,
+}
+FORMATS = {
+    'jpg': ('JPEG', {'quality': 85, 'optimize': True, 'progressive': True}),
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+}
+DEFAULT_VARIANT = 'full'
+DEFAULT_EXTENSION = 'jpg'
+UPLOAD_DIR = 'recipes'
+NAME_PATTERN = re.compile(
+    rf'^{UPLOAD_DIR}/[0-9a-f]{{2}}/(?P<digest>[0-9a-f]{{64}})_'
+    r'(?P<variant>\w+)\.(?P<extension>\w+)$')
+RAW_PATTERN = re.compile(
+    rf'^{UPLOAD_DIR}/raw/(?P<digest>[0-9a-f]{{64}})\.(?P<extension>\w+)$')
+BASE64_CHUNK = 64 * 1024
+
+
+class ImageError(ValueError):
+    """Картинку нельзя принять."""
+
+
+def decode_base64(data, max_bytes=None):
+    """Декодирует base64 по частям, прерываясь при превышении max_bytes."""
+    if max_bytes is None:
+        max_bytes = settings.RECIPE_IMAGE_MAX_BYTES
+    if len(data) * 3 // 4 > max_bytes + 3:
+        raise ImageError('Картинка слишком большая.')
+    buffer = io.BytesIO()
+    for start in range(0, len(data), BASE64_CHUNK):
+        try:
+            buffer.write(base64.b64decode(
+                data[start:start + BASE64_CHUNK], validate=True))
+        except (binascii.Error, ValueError):
+            raise ImageError('Некорректные данные base64.')
+        if buffer.tell() > max_bytes:
+            raise ImageError('Картинка слишком большая.')
+    return buffer.getvalue()
+
+
+def read_file(file, max_bytes=None):
+    if max_bytes is None:
+        max_bytes = settings.RECIPE_IMAGE_MAX_BYTES
+    content = file.read(max_bytes + 1)
+    if len(content) > max_bytes:
+        raise ImageError('Картинка слишком большая.')
+    return content
+
+
+def variant_name(digest, variant, extension):
+    return f'{UPLOAD_DIR}/{digest[:2]}/{digest}_{variant}.{extension}'
+
+
+def open_image(content):
+    try:
+        image = Image.open(io.BytesIO(content))
+        if image.width * image.height > settings.RECIPE_IMAGE_MAX_PIXELS:
+            raise ImageError('Слишком большое разрешение картинки.')
+        image.load()
+    except (OSError, SyntaxError, Image.DecompressionBombError):
+        raise ImageError('Загрузите корректное изображение.')
+    image = ImageOps.exif_transpose(image)
+    if image.mode in ('RGBA', 'LA', 'P'):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, 'white')
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+    return image.convert('RGB')
+
+
+def inspect_image(content):
+    """Быстрая проверка по заголовку, без декодирования пикселей."""
+    try:
+        image = Image.open(io.BytesIO(content))
+    except (OSError, SyntaxError, Image.DecompressionBombError):
+        raise ImageError('Загрузите корректное изображение.')
+    if image.width * image.height > settings.RECIPE_IMAGE_MAX_PIXELS:
+        raise ImageError('Слишком большое разрешение картинки.')
+    return image.format.lower()
+
+
+def render_variants(image):
+    """Байты всех вариантов картинки: {(variant, extension): bytes}."""
+    rendered = {}
+    for variant, size in VARIANTS.items():
+        resized = image.copy()
+        resized.thumbnail((size, size), Image.LANCZOS)
+        for extension, (pil_format, options) in FORMATS.items():
+            output = io.BytesIO()
+            resized.save(output, pil_format, **options)
+            rendered[variant, extension] = output.getvalue()
+    return rendered
+
+
+def store_variants(content, storage=default_storage):
+    """Сохраняет все варианты картинки и возвращает имя основного файла."""
+    digest = hashlib.sha256(content).hexdigest()
+    main_name = variant_name(digest, DEFAULT_VARIANT, DEFAULT_EXTENSION)
+    names = {
+        (variant, extension): variant_name(digest, variant, extension)
+        for variant in VARIANTS for extension in FORMATS}
+    if variants_exist(digest, storage):
+        return main_name
+    for key, data in render_variants(open_image(content)).items():
+        if not storage.exists(names[key]):
+            storage.save(names[key], ContentFile(data))
+    return main_name
+
+
+def is_processed(name):
+    return NAME_PATTERN.match(name or '') is not None
+
+
+def variants_exist(digest, storage=default_storage):
+    return all(
+        storage.exists(variant_name(digest, variant, extension))
+        for variant in VARIANTS for extension in FORMATS)
+
+
+def store_upload(content, storage=default_storage):
+    """Сохраняет загрузку как есть, не тратя время на перекодирование.
+
+    Возвращает имя основного варианта, если такая картинка уже
+    обработана, иначе имя исходного файла для фоновой обработки.
+    """
+    digest = hashlib.sha256(content).hexdigest()
+    if variants_exist(digest, storage):
+        return variant_name(digest, DEFAULT_VARIANT, DEFAULT_EXTENSION)
+    name = f'{UPLOAD_DIR}/raw/{digest}.{inspect_image(content)}'
+    if not storage.exists(name):
+        storage.save(name, ContentFile(content))
+    return name
+
+
+def process_upload(name, storage=default_storage):
+    """Строит варианты для исходного файла и возвращает имя основного."""
+    match = RAW_PATTERN.match(name)
+    if match is None:
+        raise ImageError(f'Неизвестный исходный файл: {name}')
+    digest = match['digest']
+    if not variants_exist(digest, storage):
+        with storage.open(name) as file:
+            store_variants(file.read(), storage)
+    return variant_name(digest, DEFAULT_VARIANT, DEFAULT_EXTENSION)
+
+
+def variant_url(name, variant=DEFAULT_VARIANT, extension=DEFAULT_EXTENSION,
+                storage=default_storage):
+    """Адрес нужного варианта; для старых картинок — адрес оригинала."""
+    if not name:
+        return None
+    match = NAME_PATTERN.match(name)
+    if match is None:
+        return storage.url(name)
+    return storage.url(variant_name(match['digest'], variant, extension))
@@ -0,0 +1,121 @@
+"""Потоковый импорт ингредиентов из CSV и JSON."""
+import csv
+import json
+import os
+
+from django.db import transaction
+
+from .catalog import catalog
+from .models import Ingredient
+
+NAME_LENGTH = Ingredient._meta.get_field('name').max_length
+UNIT_LENGTH = Ingredient._meta.get_field('measurement_unit').max_length
+SEPARATORS = '[, \t\r\n'
+
+
+def read_csv(path):
+    """Строки файла вида «название,единица измерения»."""
+    with open(path, encoding='utf-8', newline='') as file:
+        for row in csv.reader(file):
+            if len(row) >= 2:
+                yield row[0], row[1]
+
+
+def read_json(path, chunk_size=64 * 1024):
+    """Элементы JSON-массива объектов, разобранные по мере чтения файла."""
+    decoder = json.JSONDecoder()
+    buffer = ''
+    with open(path, encoding='utf-8') as file:
+        for chunk in iter(lambda: file.read(chunk_size), ''):
+            buffer += chunk
+            position = 0
+            while True:
+                while (position < len(buffer)
+                       and buffer[position] in SEPARATORS):
+                    position += 1
+                if position >= len(buffer) or buffer[position] == ']':
+                    break
+                try:
+                    item, position_end = decoder.raw_decode(buffer, position)
+                except json.JSONDecodeError:
+                    break
+                position = position_end
+                yield item.get('name'), item.get('measurement_unit')
+            buffer = buffer[position:]
+    if buffer.strip(' \t\r\n]'):
+        raise ValueError(f'Некорректный JSON в конце файла: {buffer[:50]!r}')
+
+
+READERS = {
+    '.csv': read_csv,
+    '.json': read_json,
+}
+
+
+def read_ingredients(path):
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in READERS:
+        raise ValueError(f'Неподдерживаемый формат файла: {extension}')
+    return READERS[extension](path)
+
+
+def chunks(rows, size):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+class ImportResult:
+    def __init__(self):
+        self.total = 0
+        self.skipped = 0
+        self.created = 0
+
+
+def import_ingredients(rows, chunk_size=1000, dry_run=False, progress=None):
+    """Загружает пары (название, единица) пачками, пропуская дубликаты.
+
+    Повторный импорт того же файла ничего не меняет. В режиме dry_run
+    данные только проверяются и подсчитываются.
+    """
+    result = ImportResult()
+    existing = set()
+    if dry_run:
+        existing = set(Ingredient.objects.values_list(
+            'name', 'measurement_unit'))
+    with transaction.atomic():
+        count_before = Ingredient.objects.count()
+        for chunk in chunks(rows, chunk_size):
+            ingredients = []
+            for name, measurement_unit in chunk:
+                result.total += 1
+                name = (name or '').strip()
+                measurement_unit = (measurement_unit or '').strip()
+                if (not name or not measurement_unit
+                        or len(name) > NAME_LENGTH
+                        or len(measurement_unit) > UNIT_LENGTH):
+                    result.skipped += 1
+                    continue
+                ingredients.append(Ingredient(
+                    name=name, measurement_unit=measurement_unit))
+            if dry_run:
+                for ingredient in ingredients:
+                    key = (ingredient.name, ingredient.measurement_unit)
+                    if key not in existing:
+                        existing.add(key)
+                        result.created += 1
+            else:
+                Ingredient.objects.bulk_create(
+                    ingredients, ignore_conflicts=True)
+            if progress is not None:
+                progress(result)
+        if not dry_run:
+            result.created = Ingredient.objects.count() - count_before
+    if result.created and not dry_run:
+        catalog.invalidate()
+    return result
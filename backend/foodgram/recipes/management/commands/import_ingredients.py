@@ -0,0 +1,43 @@
+from time import perf_counter
+
+from django.core.management.base import BaseCommand, CommandError
+
+from foodgram import settings
+from recipes.importers import import_ingredients, read_ingredients
+
+
+class Command(BaseCommand):
+    help = 'Загружает ингредиенты из CSV или JSON файла'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', nargs='?',
+            default=f'{settings.BASE_DIR}/data/ingredients.json',
+            help='Путь к файлу .csv или .json')
+        parser.add_argument(
+            '--chunk-size', type=int, default=1000,
+            help='Количество строк в одной вставке')
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Проверить файл, ничего не записывая в базу')
+
+    def handle(self, *args, **options):
+        def progress(result):
+            if options['verbosity'] > 1:
+                self.stdout.write(f'Обработано строк: {result.total}')
+
+        started = perf_counter()
+        try:
+            result = import_ingredients(
+                read_ingredients(options['path']),
+                chunk_size=options['chunk_size'],
+                dry_run=options['dry_run'], progress=progress)
+        except (OSError, ValueError) as error:
+            raise CommandError(error)
+        elapsed = perf_counter() - started
+        rate = result.total / elapsed if elapsed else 0
+        label = 'будет добавлено' if options['dry_run'] else 'добавлено'
+        self.stdout.write(
+            f'Строк: {result.total}, {label}: {result.created}, '
+            f'пропущено некорректных: {result.skipped}. '
+            f'{elapsed:.2f} с, {rate:.0f} строк/с')
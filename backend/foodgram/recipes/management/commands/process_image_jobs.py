@@ -0,0 +1,50 @@
+from time import sleep
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.cache import is_shared_cache
+from recipes.image_jobs import backlog, run_pending
+
+
+class Command(BaseCommand):
+    help = 'Обрабатывает очередь картинок рецептов'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Обработать текущую очередь и завершиться')
+        parser.add_argument(
+            '--batch-size', type=int, default=20,
+            help='Сколько задач обрабатывать между проверками очереди')
+        parser.add_argument(
+            '--sleep', type=float, default=1.0,
+            help='Пауза в секундах, когда очередь пуста')
+        parser.add_argument(
+            '--stats', action='store_true',
+            help='Только показать размер очереди')
+
+    def report(self):
+        stats = backlog()
+        self.stdout.write(
+            f'В очереди: {stats["pending"]}, с ошибкой: {stats["failed"]}, '
+            f'самая старая ждёт {stats["oldest_age"]:.0f} с')
+
+    def handle(self, *args, **options):
+        if options['stats']:
+            self.report()
+            return
+        # Сохранение рецепта сбрасывает кеш ответов, а его должен видеть
+        # backend, работающий в другом процессе.
+        if not is_shared_cache():
+            raise CommandError(
+                'Воркеру нужен общий с backend кеш: задайте CACHE_BACKEND, '
+                'например django.core.cache.backends.db.DatabaseCache.')
+        while True:
+            processed = run_pending(options['batch_size'])
+            if processed and options['verbosity'] > 1:
+                self.stdout.write(f'Обработано задач: {processed}')
+                self.report()
+            if options['once'] and processed < options['batch_size']:
+                break
+            if not processed:
+                sleep(options['sleep'])
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from recipes.documents import BATCH_SIZE, refresh_documents
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает поисковые документы всех рецептов'
+
+    def handle(self, *args, **options):
+        recipe_ids = list(Recipe.objects.values_list('id', flat=True))
+        fixed = sum(
+            refresh_documents(recipe_ids[start:start + BATCH_SIZE])
+            for start in range(0, len(recipe_ids), BATCH_SIZE))
+        self.stdout.write(f'Исправлено рецептов: {fixed}')
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes.models import ShoppingListLine
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает материализованные списки покупок'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check', action='store_true',
+            help='Только сравнить списки с корзинами, ничего не меняя')
+
+    def handle(self, *args, **options):
+        if options['check']:
+            mismatches = ShoppingListLine.objects.inconsistencies()
+            for (user_id, ingredient_id), (stored, live) in sorted(
+                    mismatches.items()):
+                self.stdout.write(
+                    f'user={user_id} ingredient={ingredient_id}: '
+                    f'сохранено {stored}, по корзинам {live}')
+            if mismatches:
+                raise CommandError(
+                    f'Найдено расхождений: {len(mismatches)}')
+            self.stdout.write('Списки покупок согласованы')
+            return
+        ShoppingListLine.objects.rebuild()
+        self.stdout.write('Списки покупок пересчитаны')
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from recipes.models import reconcile_recipe_counters
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает счётчики избранного и списков покупок у рецептов'
+
+    def handle(self, *args, **options):
+        fixed = reconcile_recipe_counters()
+        self.stdout.write(f'Исправлено рецептов: {fixed}')
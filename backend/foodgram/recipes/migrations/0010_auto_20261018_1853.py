@@ -0,0 +1,51 @@
+# Generated by Django 2.2.16 on 2026-10-18 18:53
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_shopping_lists(apps, schema_editor):
+    IngredientAmount = apps.get_model('recipes', 'IngredientAmount')  # noqa: N806
+    ShoppingListLine = apps.get_model('recipes', 'ShoppingListLine')  # noqa: N806
+    totals = IngredientAmount.objects.filter(
+        recipe__carts__isnull=False).values(
+        'recipe__carts__user', 'ingredient').annotate(
+        total_amount=models.Sum('amount')).order_by()
+    ShoppingListLine.objects.bulk_create(
+        ShoppingListLine(
+            user_id=row['recipe__carts__user'],
+            ingredient_id=row['ingredient'],
+            total_amount=row['total_amount'])
+        for row in totals)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('recipes', '0009_auto_20230325_2316'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShoppingListLine',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_amount', models.PositiveIntegerField(verbose_name='Общее количество')),
+                ('ingredient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shopping_list', to='recipes.Ingredient', verbose_name='Ингредиент')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shopping_list', to=settings.AUTH_USER_MODEL, verbose_name='Владелец списка покупок')),
+            ],
+            options={
+                'verbose_name': 'Строка списка покупок',
+                'verbose_name_plural': 'Строки списков покупок',
+                'ordering': ['ingredient__name'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='shoppinglistline',
+            constraint=models.UniqueConstraint(fields=('user', 'ingredient'), name='unique_shopping_list_line'),
+        ),
+        migrations.RunPython(
+            fill_shopping_lists, migrations.RunPython.noop),
+    ]
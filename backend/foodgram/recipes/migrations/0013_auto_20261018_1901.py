@@ -0,0 +1,45 @@
+# Generated by Django 2.2.16 on 2026-10-18 19:01
+
+from django.db import migrations, models
+
+
+def merge_duplicate_ingredients(apps, schema_editor):
+    Ingredient = apps.get_model('recipes', 'Ingredient')  # noqa: N806
+    IngredientAmount = apps.get_model('recipes', 'IngredientAmount')  # noqa: N806
+    ShoppingListLine = apps.get_model('recipes', 'ShoppingListLine')  # noqa: N806
+    duplicates = Ingredient.objects.values(
+        'name', 'measurement_unit').annotate(
+        keep_id=models.Min('id'), total=models.Count('id')).filter(
+        total__gt=1).order_by()
+    for group in duplicates:
+        keep_id = group['keep_id']
+        duplicate_ids = list(Ingredient.objects.filter(
+            name=group['name'],
+            measurement_unit=group['measurement_unit']).exclude(
+            id=keep_id).values_list('id', flat=True))
+        IngredientAmount.objects.filter(
+            ingredient_id__in=duplicate_ids).update(ingredient_id=keep_id)
+        for line in ShoppingListLine.objects.filter(
+                ingredient_id__in=duplicate_ids):
+            kept = ShoppingListLine.objects.filter(
+                user_id=line.user_id, ingredient_id=keep_id).first()
+            if kept is None:
+                line.ingredient_id = keep_id
+                line.save()
+            else:
+                kept.total_amount += line.total_amount
+                kept.save()
+                line.delete()
+        Ingredient.objects.filter(id__in=duplicate_ids).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0012_recipe_updated_at'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            merge_duplicate_ingredients, migrations.RunPython.noop),
+    ]
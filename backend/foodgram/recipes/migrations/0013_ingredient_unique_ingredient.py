@@ -0,0 +1,23 @@
+# Generated by Django 2.2.16 on 2026-10-18 19:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    """Ограничение добавляется отдельно от слияния дубликатов.
+
+    Удаление дубликатов оставляет в транзакции отложенные проверки
+    внешних ключей, и Postgres не даёт изменить таблицу, пока они не
+    выполнены при COMMIT.
+    """
+
+    dependencies = [
+        ('recipes', '0013_auto_20261018_1901'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='ingredient',
+            constraint=models.UniqueConstraint(fields=('name', 'measurement_unit'), name='unique_ingredient'),
+        ),
+    ]
@@ -0,0 +1,94 @@
+# Generated by Django 2.2.16 on 2026-10-18 19:02
+
+from django.db import migrations, models
+
+
+def duplicate_groups(model, fields, **extra):
+    return model.objects.values(*fields).annotate(
+        keep_id=models.Min('id'), total=models.Count('id'), **extra).filter(
+        total__gt=1).order_by()
+
+
+def remove_duplicates(apps, schema_editor):
+    Cart = apps.get_model('recipes', 'Cart')  # noqa: N806
+    Favorite = apps.get_model('recipes', 'Favorite')  # noqa: N806
+    IngredientAmount = apps.get_model('recipes', 'IngredientAmount')  # noqa: N806
+    RecipeTag = apps.get_model('recipes', 'RecipeTag')  # noqa: N806
+    ShoppingListLine = apps.get_model('recipes', 'ShoppingListLine')  # noqa: N806
+    for group in duplicate_groups(
+            IngredientAmount, ('recipe', 'ingredient'),
+            amount_sum=models.Sum('amount')):
+        IngredientAmount.objects.filter(id=group['keep_id']).update(
+            amount=group['amount_sum'])
+        IngredientAmount.objects.filter(
+            recipe=group['recipe'], ingredient=group['ingredient']).exclude(
+            id=group['keep_id']).delete()
+    removed_carts = 0
+    for model, fields in ((Favorite, ('user', 'recipe')),
+                          (Cart, ('user', 'recipe')),
+                          (RecipeTag, ('recipe', 'tag'))):
+        for group in duplicate_groups(model, fields):
+            removed = model.objects.filter(
+                **{field: group[field] for field in fields}).exclude(
+                id=group['keep_id']).delete()[0]
+            if model is Cart:
+                removed_carts += removed
+    if removed_carts:
+        ShoppingListLine.objects.all().delete()
+        totals = IngredientAmount.objects.filter(
+            recipe__carts__isnull=False).values(
+            'recipe__carts__user', 'ingredient').annotate(
+            total_amount=models.Sum('amount')).order_by()
+        ShoppingListLine.objects.bulk_create(
+            ShoppingListLine(
+                user_id=row['recipe__carts__user'],
+                ingredient_id=row['ingredient'],
+                total_amount=row['total_amount'])
+            for row in totals)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0014_auto_20261018_1901'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicates, migrations.RunPython.noop),
+        migrations.AlterModelOptions(
+            name='cart',
+            options={'verbose_name': 'Список покупок', 'verbose_name_plural': 'Списки покупок'},
+        ),
+        migrations.AlterModelOptions(
+            name='favorite',
+            options={'verbose_name': 'Избранное', 'verbose_name_plural': 'Избранное'},
+        ),
+        migrations.AlterModelOptions(
+            name='ingredientamount',
+            options={'verbose_name': 'ИнгредиентКоличество', 'verbose_name_plural': 'ИнгредиентКоличество'},
+        ),
+        migrations.AlterModelOptions(
+            name='recipetag',
+            options={'verbose_name': 'РецептТег', 'verbose_name_plural': 'РецептТег'},
+        ),
+        migrations.AddIndex(
+            model_name='recipetag',
+            index=models.Index(fields=['tag', 'recipe'], name='recipetag_tag_recipe_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='cart',
+            constraint=models.UniqueConstraint(fields=('user', 'recipe'), name='unique_cart'),
+        ),
+        migrations.AddConstraint(
+            model_name='favorite',
+            constraint=models.UniqueConstraint(fields=('user', 'recipe'), name='unique_favorite'),
+        ),
+        migrations.AddConstraint(
+            model_name='ingredientamount',
+            constraint=models.UniqueConstraint(fields=('recipe', 'ingredient'), name='unique_recipe_ingredient'),
+        ),
+        migrations.AddConstraint(
+            model_name='recipetag',
+            constraint=models.UniqueConstraint(fields=('recipe', 'tag'), name='unique_recipe_tag'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 2.2.16 on 2026-10-18 19:03
+
+from django.db import migrations, models
+
+
+def fill_counters(apps, schema_editor):
+    Recipe = apps.get_model('recipes', 'Recipe')  # noqa: N806
+    for field, related in (('favorites_count', 'favorites'),
+                           ('carts_count', 'carts')):
+        for pk, total in Recipe.objects.annotate(
+                total=models.Count(related)).filter(
+                total__gt=0).values_list('pk', 'total'):
+            Recipe.objects.filter(pk=pk).update(**{field: total})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0015_auto_20261018_1902'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='carts_count',
+            field=models.PositiveIntegerField(db_index=True, default=0, verbose_name='В списках покупок'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='favorites_count',
+            field=models.PositiveIntegerField(db_index=True, default=0, verbose_name='В избранном'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 3.2.25 on 2026-10-18 19:19
+
+from collections import defaultdict
+
+from django.db import migrations, models
+
+
+def fill_search_documents(apps, schema_editor):
+    Recipe = apps.get_model('recipes', 'Recipe')  # noqa: N806
+    IngredientAmount = apps.get_model('recipes', 'IngredientAmount')  # noqa: N806
+    ingredient_names = defaultdict(list)
+    for recipe_id, name in IngredientAmount.objects.order_by(
+            'id').values_list('recipe_id', 'ingredient__name').iterator():
+        ingredient_names[recipe_id].append(name)
+    recipes = []
+    for recipe in Recipe.objects.only('id', 'name', 'text').iterator():
+        recipe.search_document = '\n'.join(
+            [recipe.name, recipe.text, *ingredient_names[recipe.id]])
+        recipes.append(recipe)
+    Recipe.objects.bulk_update(recipes, ['search_document'], batch_size=500)
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        'CREATE INDEX IF NOT EXISTS recipes_recipe_search_document_gin '
+        'ON recipes_recipe USING gin (to_tsvector('
+        "'russian'::regconfig, COALESCE(search_document, '')))")
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        'DROP INDEX IF EXISTS recipes_recipe_search_document_gin')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0017_auto_20261018_1906'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='search_document',
+            field=models.TextField(blank=True, default='', editable=False, verbose_name='Поисковый документ'),
+        ),
+        migrations.RunPython(fill_search_documents, migrations.RunPython.noop),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -1,6 +1,11 @@
 from django.contrib.auth import get_user_model
 from django.core.validators import MaxValueValidator, MinValueValidator
-from django.db import models
+from django.db import IntegrityError, models, transaction
+from django.db.models.signals import post_delete, pre_delete
+from django.dispatch import receiver
+from django.utils import timezone
+from django.db.models import Sum
+from django.db.models.functions import Coalesce
 
 User = get_user_model()
 
@@ -15,6 +20,11 @@ class Ingredient(models.Model):
         verbose_name = 'Ингредиент'
         verbose_name_plural = 'Ингредиенты'
         ordering = ['name']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['name', 'measurement_unit'],
+                name='unique_ingredient'),
+        ]
 
     def __str__(self):
         return self.name
@@ -57,13 +67,27 @@ class Recipe(models.Model):
                  validators=[MinValueValidator(1), MaxValueValidator(4320)])
     pub_date = models.DateTimeField(
         'Дата добавления', auto_now_add=True, db_index=True)
+    updated_at = models.DateTimeField(
+        'Дата изменения', auto_now=True)
+    image_ready = models.BooleanField(
+        'Картинка обработана', default=True)
+    favorites_count = models.PositiveIntegerField(
+        'В избранном', default=0, db_index=True)
+    carts_count = models.PositiveIntegerField(
+        'В списках покупок', default=0, db_index=True)
     image = models.ImageField(
         upload_to='recipes/', verbose_name='Картинка')
+    search_document = models.TextField(
+        'Поисковый документ', blank=True, default='', editable=False)
 
     class Meta:
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
         ordering = ['-pub_date']
+        indexes = [
+            models.Index(
+                fields=['pub_date', 'id'], name='recipe_pub_date_id_idx'),
+        ]
 
     def __str__(self):
         return self.name
@@ -85,7 +109,14 @@ class RecipeTag(models.Model):
     class Meta:
         verbose_name = 'РецептТег'
         verbose_name_plural = 'РецептТег'
-        ordering = ['-recipe']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['recipe', 'tag'], name='unique_recipe_tag'),
+        ]
+        indexes = [
+            models.Index(
+                fields=['tag', 'recipe'], name='recipetag_tag_recipe_idx'),
+        ]
 
     def __str__(self):
         return f'Рецепт {self.recipe}, тег {self.tag}'
@@ -110,11 +141,34 @@ class IngredientAmount(models.Model):
     class Meta:
         verbose_name = 'ИнгредиентКоличество'
         verbose_name_plural = 'ИнгредиентКоличество'
-        ordering = ['-recipe']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['recipe', 'ingredient'],
+                name='unique_recipe_ingredient'),
+        ]
 
     def __str__(self):
         return f'Рецепт {self.recipe}, ингредиент {self.ingredient}'
 
+    def touch_recipes(self):
+        """Обновляет updated_at рецептов строки, чтобы сменились их ETag.
+
+        Вместе с новым рецептом отмечается и прежний, если строку
+        перенесли в другой рецепт.
+        """
+        recipes = models.Q(id=self.recipe_id)
+        if self.pk is not None:
+            recipes |= models.Q(ingredientamount=self.pk)
+        Recipe.objects.filter(recipes).update(updated_at=timezone.now())
+
+    def save(self, *args, **kwargs):
+        self.touch_recipes()
+        super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        self.touch_recipes()
+        return super().delete(*args, **kwargs)
+
 
 class Favorite(models.Model):
     """Модель избранное."""
@@ -130,7 +184,10 @@ class Favorite(models.Model):
     class Meta:
         verbose_name = 'Избранное'
         verbose_name_plural = 'Избранное'
-        ordering = ['-recipe']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'recipe'], name='unique_favorite'),
+        ]
 
     def __str__(self):
         return f'Рецепт {self.recipe}, в избранном у {self.user}'
@@ -150,7 +207,236 @@ class Cart(models.Model):
     class Meta:
         verbose_name = 'Список покупок'
         verbose_name_plural = 'Списки покупок'
-        ordering = ['-recipe']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'recipe'], name='unique_cart'),
+        ]
 
     def __str__(self):
         return f'Рецепт {self.recipe}, в списке покупок у {self.user}'
+
+
+class ShoppingListLineManager(models.Manager):
+    """Менеджер поддержки материализованного списка покупок."""
+
+    @staticmethod
+    def recipe_amounts(recipe):
+        """Суммарное количество каждого ингредиента в рецепте."""
+        amounts = {}
+        for ingredient_id, amount in IngredientAmount.objects.filter(
+                recipe=recipe).values_list('ingredient_id', 'amount'):
+            amounts[ingredient_id] = amounts.get(ingredient_id, 0) + amount
+        return amounts
+
+    def locked_lines(self, user_ids, ingredient_ids):
+        return {
+            (line.user_id, line.ingredient_id): line
+            for line in self.select_for_update().filter(
+                user_id__in=user_ids, ingredient_id__in=ingredient_ids)
+        }
+
+    def apply_delta(self, user_ids, amounts, attempts=3):
+        """Прибавляет amounts {ingredient_id: delta} к спискам users.
+
+        Строку, которую между чтением и вставкой создал параллельный
+        запрос, выдаёт IntegrityError: тогда проход откатывается до точки
+        сохранения и повторяется, и строка уже обновляется.
+        """
+        user_ids = list(user_ids)
+        amounts = {key: value for key, value in amounts.items() if value}
+        if not user_ids or not amounts:
+            return
+        for attempt in range(1, attempts + 1):
+            try:
+                with transaction.atomic():
+                    self.apply_delta_once(user_ids, amounts)
+                return
+            except IntegrityError:
+                if attempt == attempts:
+                    raise
+
+    def apply_delta_once(self, user_ids, amounts):
+        lines = self.locked_lines(user_ids, amounts)
+        to_create, to_update, to_delete = [], [], []
+        for user_id in user_ids:
+            for ingredient_id, delta in amounts.items():
+                line = lines.get((user_id, ingredient_id))
+                if line is None:
+                    if delta > 0:
+                        to_create.append(self.model(
+                            user_id=user_id, ingredient_id=ingredient_id,
+                            total_amount=delta))
+                    continue
+                line.total_amount += delta
+                if line.total_amount > 0:
+                    to_update.append(line)
+                else:
+                    to_delete.append(line.pk)
+        self.bulk_create(to_create)
+        self.bulk_update(to_update, ['total_amount'])
+        self.filter(pk__in=to_delete).delete()
+
+    def add_recipe(self, user, recipe):
+        self.apply_delta([user.id], self.recipe_amounts(recipe))
+
+    def remove_recipe(self, user, recipe):
+        amounts = self.recipe_amounts(recipe)
+        self.apply_delta(
+            [user.id], {key: -value for key, value in amounts.items()})
+
+    def live_totals(self, users=None):
+        """Агрегат списка покупок, посчитанный по корзинам."""
+        lookup = {'recipe__carts__isnull': False}
+        if users is not None:
+            lookup = {'recipe__carts__user__in': users}
+        return {
+            (row['recipe__carts__user'], row['ingredient']):
+                row['total_amount']
+            for row in IngredientAmount.objects.filter(**lookup).values(
+                'recipe__carts__user', 'ingredient').annotate(
+                total_amount=Sum('amount')).order_by()
+        }
+
+    def stored_totals(self, users=None):
+        queryset = self.all()
+        if users is not None:
+            queryset = queryset.filter(user__in=users)
+        return {
+            (user_id, ingredient_id): total_amount
+            for user_id, ingredient_id, total_amount in queryset.values_list(
+                'user_id', 'ingredient_id', 'total_amount').order_by()
+        }
+
+    def rebuild(self, users=None):
+        """Пересчитывает списки покупок с нуля."""
+        with transaction.atomic():
+            queryset = self.all()
+            if users is not None:
+                queryset = queryset.filter(user__in=users)
+            queryset.delete()
+            self.bulk_create(
+                self.model(user_id=user_id, ingredient_id=ingredient_id,
+                           total_amount=total_amount)
+                for (user_id, ingredient_id), total_amount
+                in self.live_totals(users).items())
+
+    def inconsistencies(self, users=None):
+        """Расхождения {(user_id, ingredient_id): (stored, live)}."""
+        stored = self.stored_totals(users)
+        live = self.live_totals(users)
+        return {
+            key: (stored.get(key), live.get(key))
+            for key in stored.keys() | live.keys()
+            if stored.get(key) != live.get(key)
+        }
+
+
+class ShoppingListLine(models.Model):
+    """Материализованная строка списка покупок пользователя."""
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name='shopping_list',
+        verbose_name='Владелец списка покупок')
+    ingredient = models.ForeignKey(
+        Ingredient, on_delete=models.CASCADE, related_name='shopping_list',
+        verbose_name='Ингредиент')
+    total_amount = models.PositiveIntegerField(
+        verbose_name='Общее количество')
+
+    objects = ShoppingListLineManager()
+
+    class Meta:
+        verbose_name = 'Строка списка покупок'
+        verbose_name_plural = 'Строки списков покупок'
+        ordering = ['ingredient__name']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'ingredient'],
+                name='unique_shopping_list_line'),
+        ]
+
+    def __str__(self):
+        return (f'{self.ingredient} - {self.total_amount}, '
+                f'в списке покупок у {self.user}')
+
+
+class ImageJob(models.Model):
+    """Задача фоновой обработки картинки рецепта."""
+    PENDING = 'pending'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUSES = (
+        (PENDING, 'В очереди'),
+        (DONE, 'Выполнена'),
+        (FAILED, 'Ошибка'),
+    )
+
+    recipe = models.ForeignKey(
+        Recipe, on_delete=models.CASCADE, related_name='image_jobs',
+        verbose_name='Рецепт')
+    source = models.CharField('Исходный файл', max_length=255)
+    status = models.CharField(
+        'Статус', max_length=16, choices=STATUSES, default=PENDING)
+    attempts = models.PositiveSmallIntegerField('Попыток', default=0)
+    next_attempt_at = models.DateTimeField(
+        'Следующая попытка', default=timezone.now)
+    error = models.TextField('Последняя ошибка', blank=True)
+    created = models.DateTimeField('Создана', auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Обработка картинки'
+        verbose_name_plural = 'Обработка картинок'
+        ordering = ['-created']
+        indexes = [
+            models.Index(
+                fields=['status', 'next_attempt_at'],
+                name='imagejob_status_next_idx'),
+        ]
+
+    def __str__(self):
+        return f'Картинка рецепта {self.recipe_id}: {self.status}'
+
+
+def reconcile_recipe_counters(recipe_ids=None):
+    """Пересчитывает favorites_count и carts_count по связанным таблицам.
+
+    recipe_ids ограничивает пересчёт указанными рецептами. Возвращает
+    количество исправленных рецептов.
+    """
+    favorites = Favorite.objects.filter(recipe=models.OuterRef('pk')).values(
+        'recipe').annotate(total=models.Count('id')).values('total')
+    carts = Cart.objects.filter(recipe=models.OuterRef('pk')).values(
+        'recipe').annotate(total=models.Count('id')).values('total')
+    actual = Recipe.objects.annotate(
+        actual_favorites=Coalesce(models.Subquery(favorites), 0),
+        actual_carts=Coalesce(models.Subquery(carts), 0))
+    if recipe_ids is not None:
+        actual = actual.filter(pk__in=recipe_ids)
+    drifted = actual.exclude(
+        favorites_count=models.F('actual_favorites'),
+        carts_count=models.F('actual_carts'))
+    fixed = []
+    for recipe in drifted.only('id', 'favorites_count', 'carts_count'):
+        recipe.favorites_count = recipe.actual_favorites
+        recipe.carts_count = recipe.actual_carts
+        fixed.append(recipe)
+    Recipe.objects.bulk_update(fixed, ['favorites_count', 'carts_count'])
+    return len(fixed)
+
+
+def user_recipe_ids(user):
+    return set(Favorite.objects.filter(user=user).values_list(
+        'recipe_id', flat=True)) | set(Cart.objects.filter(
+            user=user).values_list('recipe_id', flat=True))
+
+
+@receiver(pre_delete, sender=User)
+def remember_user_recipes(sender, instance, **kwargs):
+    instance._counter_recipe_ids = user_recipe_ids(instance)
+
+
+@receiver(post_delete, sender=User)
+def reconcile_user_recipes(sender, instance, **kwargs):
+    """Избранное и корзина удаляются каскадом, минуя счётчики рецептов."""
+    recipe_ids = getattr(instance, '_counter_recipe_ids', None)
+    if recipe_ids:
+        reconcile_recipe_counters(recipe_ids)
@@ -0,0 +1,354 @@
+"""Синтетические данные для нагрузочного тестирования.
+
+Генератор создаёт пользователей, рецепты с ингредиентами и тегами,
+избранное, корзины и подписки. Популярность рецептов, авторов,
+ингредиентов и тегов распределена по закону Ципфа. Каждый этап берёт
+случайные числа из своего random.Random, засеянного от seed, а первичные
+ключи назначаются явно после текущего максимума, поэтому один seed на
+одинаковой исходной базе даёт один и тот же корпус. В PostgreSQL строки
+загружаются через COPY, в остальных базах — bulk_create пачками.
+"""
+import csv
+import io
+import random
+from bisect import bisect
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from itertools import accumulate
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max
+from PIL import Image
+
+from users.models import Subscription, User
+from . import images
+from .catalog import catalog
+from .documents import build_document
+from .importers import chunks, import_ingredients, read_ingredients
+from .models import (
+    Cart, Favorite, Ingredient, IngredientAmount, Recipe, RecipeTag,
+    ShoppingListLine, Tag)
+
+DEFAULT_TAGS = (
+    ('Завтрак', '#E26C2D', 'breakfast'),
+    ('Обед', '#49B64E', 'lunch'),
+    ('Ужин', '#8775D2', 'dinner'),
+    ('Десерт', '#F2C94C', 'dessert'),
+    ('Выпечка', '#C0793B', 'baking'),
+    ('Постное', '#2D9CDB', 'lenten'),
+)
+FIRST_NAMES = (
+    'Анна', 'Иван', 'Мария', 'Пётр', 'Елена', 'Алексей', 'Ольга',
+    'Дмитрий', 'Наталья', 'Сергей', 'Ирина', 'Андрей')
+LAST_NAMES = (
+    'Иванов', 'Смирнов', 'Кузнецов', 'Попов', 'Васильев', 'Петров',
+    'Соколов', 'Михайлов', 'Новиков', 'Фёдоров', 'Морозов', 'Волков')
+DISHES = (
+    'Салат', 'Суп', 'Рагу', 'Запеканка', 'Пирог', 'Омлет', 'Каша',
+    'Паста', 'Соус', 'Котлеты', 'Пюре', 'Оладьи', 'Рулет', 'Жаркое')
+STEPS = (
+    'Подготовьте {first} и {second}.',
+    'Нарежьте {first} небольшими кусочками.',
+    'Смешайте {first} с {second} и оставьте на 10 минут.',
+    'Готовьте на среднем огне {time} минут, помешивая.',
+    'Добавьте {second} и доведите до вкуса.',
+    'Подавайте горячим, украсив {first}.',
+)
+COOKING_TIMES = (5, 10, 15, 20, 30, 40, 45, 60, 90, 120, 180)
+AMOUNTS = (1, 2, 3, 5, 10, 20, 50, 100, 150, 200, 250, 300, 500)
+# Даты отсчитываются от постоянного момента, а не от текущего времени,
+# чтобы корпус не зависел от дня генерации.
+LATEST_DATE = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+class Popularity:
+    """Выбор индексов 0..size-1 с вероятностями по закону Ципфа.
+
+    Ранги перемешаны, чтобы популярные объекты не были первыми по id.
+    """
+
+    def __init__(self, rng, size, exponent=1.0):
+        weights = [1 / (rank + 1) ** exponent for rank in range(size)]
+        rng.shuffle(weights)
+        self.size = size
+        self.cum_weights = list(accumulate(weights))
+
+    def choice(self, rng):
+        total = self.cum_weights[-1]
+        return min(bisect(self.cum_weights, rng.random() * total),
+                   self.size - 1)
+
+    def sample(self, rng, count, exclude=None):
+        """count разных индексов, кроме exclude."""
+        available = self.size - (exclude is not None)
+        count = min(count, available if available <= 10 else available // 2)
+        chosen = {}
+        while len(chosen) < count:
+            index = self.choice(rng)
+            if index != exclude:
+                chosen[index] = None
+        return list(chosen)
+
+
+def draw_count(rng, mean):
+    """Число объектов у пользователя: экспоненциальное с длинным хвостом."""
+    if mean <= 0:
+        return 0
+    return round(rng.expovariate(1 / mean))
+
+
+def next_id(model):
+    return (model.objects.aggregate(top=Max('id'))['top'] or 0) + 1
+
+
+def copy_value(value):
+    return r'\N' if value is None else value
+
+
+def copy_objects(model, objects):
+    """Загружает объекты одной командой COPY (только PostgreSQL)."""
+    fields = model._meta.concrete_fields
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for obj in objects:
+        writer.writerow([
+            copy_value(field.get_db_prep_save(
+                getattr(obj, field.attname), connection))
+            for field in fields])
+    buffer.seek(0)
+    quote = connection.ops.quote_name
+    columns = ', '.join(quote(field.column) for field in fields)
+    with connection.cursor() as cursor:
+        cursor.copy_expert(
+            f'COPY {quote(model._meta.db_table)} ({columns}) '
+            r"FROM STDIN WITH (FORMAT csv, NULL '\N')", buffer)
+
+
+@contextmanager
+def explicit_timestamps(model):
+    """Отключает auto_now и auto_now_add, чтобы bulk_create сохранил даты."""
+    fields = [
+        field for field in model._meta.concrete_fields
+        if getattr(field, 'auto_now', False)
+        or getattr(field, 'auto_now_add', False)]
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+def placeholder_image():
+    """Одна общая картинка для всех синтетических рецептов."""
+    output = io.BytesIO()
+    Image.new('RGB', (640, 480), (226, 108, 45)).save(output, 'PNG')
+    return images.store_variants(output.getvalue())
+
+
+class SyntheticData:
+    """Генератор корпуса.
+
+    users и recipes — сколько создать, favorites, carts и subscriptions —
+    в среднем на пользователя, ingredients — в среднем на рецепт, tags —
+    не больше стольких тегов у рецепта.
+    """
+
+    def __init__(self, users, recipes, favorites=20, carts=3,
+                 subscriptions=10, ingredients=8, tags=2, seed=0,
+                 chunk_size=10000, days=365, password='synthetic',
+                 progress=None):
+        self.users = users
+        self.recipes = recipes
+        self.favorites = favorites
+        self.carts = carts
+        self.subscriptions = subscriptions
+        self.ingredients = ingredients
+        self.tags = tags
+        self.seed = seed
+        self.chunk_size = chunk_size
+        self.days = days
+        self.password = password
+        self.progress = progress
+        self.created = {}
+
+    def rng(self, stage):
+        return random.Random(f'{self.seed}:{stage}')
+
+    def write(self, model, objects):
+        label = model._meta.verbose_name_plural
+        with explicit_timestamps(model):
+            for chunk in chunks(objects, self.chunk_size):
+                if connection.vendor == 'postgresql':
+                    copy_objects(model, chunk)
+                else:
+                    model.objects.bulk_create(chunk)
+                self.created[label] = self.created.get(label, 0) + len(chunk)
+                if self.progress is not None:
+                    self.progress(label, self.created[label])
+
+    def generate(self):
+        """Создаёт корпус в одной транзакции и возвращает число строк."""
+        with transaction.atomic():
+            self.prepare_catalog()
+            self.prepare()
+            self.write(User, self.generate_users())
+            for chunk in chunks(self.generate_recipes(), self.chunk_size):
+                self.write(Recipe, [recipe for recipe, _, _ in chunk])
+                self.write(IngredientAmount, [
+                    amount for _, amounts, _ in chunk for amount in amounts])
+                self.write(RecipeTag, [
+                    tag for _, _, tags in chunk for tag in tags])
+            self.write(Favorite, self.generate_links(Favorite, 'favorites'))
+            self.write(Cart, self.generate_links(Cart, 'carts'))
+            self.write(Subscription, self.generate_subscriptions())
+            self.build_shopping_lists()
+            self.reset_sequences()
+        catalog.invalidate()
+        return self.created
+
+    def prepare_catalog(self):
+        if not Ingredient.objects.exists():
+            import_ingredients(read_ingredients(
+                f'{settings.BASE_DIR}/data/ingredients.json'))
+        if not Tag.objects.exists():
+            Tag.objects.bulk_create(
+                Tag(name=name, color=color, slug=slug)
+                for name, color, slug in DEFAULT_TAGS)
+        self.ingredient_rows = list(
+            Ingredient.objects.order_by('id').values_list('id', 'name'))
+        self.tag_ids = list(
+            Tag.objects.order_by('id').values_list('id', flat=True))
+
+    def prepare(self):
+        rng = self.rng('popularity')
+        self.user_start = next_id(User)
+        self.recipe_start = next_id(Recipe)
+        self.authors = Popularity(rng, self.users, exponent=1.1)
+        self.recipe_popularity = Popularity(rng, self.recipes)
+        self.ingredient_popularity = Popularity(
+            rng, len(self.ingredient_rows), exponent=0.9)
+        self.tag_popularity = Popularity(rng, len(self.tag_ids), exponent=0.7)
+        self.image = placeholder_image()
+        self.favorites_count = self.count_links('favorites')
+        self.carts_count = self.count_links('carts')
+
+    def user_links(self, stage):
+        """Пары (индекс пользователя, индекс рецепта) этапа stage."""
+        rng = self.rng(stage)
+        mean = getattr(self, stage)
+        for user in range(self.users):
+            for recipe in self.recipe_popularity.sample(
+                    rng, draw_count(rng, mean)):
+                yield user, recipe
+
+    def count_links(self, stage):
+        counts = [0] * self.recipes
+        for _, recipe in self.user_links(stage):
+            counts[recipe] += 1
+        return counts
+
+    def generate_users(self):
+        rng = self.rng('users')
+        password = make_password(self.password, salt=f'synthetic{self.seed}')
+        for index in range(self.users):
+            user_id = self.user_start + index
+            yield User(
+                id=user_id, username=f'synthetic{user_id}',
+                email=f'synthetic{user_id}@example.com',
+                first_name=rng.choice(FIRST_NAMES),
+                last_name=rng.choice(LAST_NAMES), password=password,
+                date_joined=LATEST_DATE - timedelta(
+                    days=rng.random() * self.days))
+
+    def generate_recipes(self):
+        """Тройки (рецепт, его ингредиенты, его теги)."""
+        rng = self.rng('recipes')
+        amount_id = next_id(IngredientAmount)
+        recipe_tag_id = next_id(RecipeTag)
+        span = timedelta(days=self.days)
+        for index in range(self.recipes):
+            recipe_id = self.recipe_start + index
+            count = max(1, round(rng.gauss(
+                self.ingredients, self.ingredients / 3)))
+            ingredients = [
+                self.ingredient_rows[position]
+                for position in self.ingredient_popularity.sample(rng, count)]
+            names = [name for _, name in ingredients]
+            cooking_time = rng.choice(COOKING_TIMES)
+            name = f'{rng.choice(DISHES)}: {names[0]}'[:64]
+            text = ' '.join(
+                step.format(first=names[0], second=names[-1],
+                            time=cooking_time)
+                for step in rng.sample(STEPS, rng.randint(2, 4)))
+            pub_date = LATEST_DATE - span * (1 - index / self.recipes)
+            amounts = []
+            for ingredient_id, _ in ingredients:
+                amounts.append(IngredientAmount(
+                    id=amount_id, recipe_id=recipe_id,
+                    ingredient_id=ingredient_id, amount=rng.choice(AMOUNTS)))
+                amount_id += 1
+            tags = []
+            for position in self.tag_popularity.sample(
+                    rng, rng.randint(1, max(1, self.tags))):
+                tags.append(RecipeTag(
+                    id=recipe_tag_id, recipe_id=recipe_id,
+                    tag_id=self.tag_ids[position]))
+                recipe_tag_id += 1
+            recipe = Recipe(
+                id=recipe_id,
+                author_id=self.user_start + self.authors.choice(rng),
+                name=name, text=text, cooking_time=cooking_time,
+                pub_date=pub_date, updated_at=pub_date, image=self.image,
+                image_ready=True,
+                favorites_count=self.favorites_count[index],
+                carts_count=self.carts_count[index],
+                search_document=build_document(name, text, names))
+            yield recipe, amounts, tags
+
+    def generate_links(self, model, stage):
+        link_id = next_id(model)
+        for user, recipe in self.user_links(stage):
+            yield model(id=link_id, user_id=self.user_start + user,
+                        recipe_id=self.recipe_start + recipe)
+            link_id += 1
+
+    def generate_subscriptions(self):
+        rng = self.rng('subscriptions')
+        subscription_id = next_id(Subscription)
+        for user in range(self.users):
+            for author in self.authors.sample(
+                    rng, draw_count(rng, self.subscriptions), exclude=user):
+                yield Subscription(
+                    id=subscription_id, user_id=self.user_start + user,
+                    author_id=self.user_start + author)
+                subscription_id += 1
+
+    def build_shopping_lists(self):
+        """Списки покупок новых пользователей одним INSERT ... SELECT."""
+        quote = connection.ops.quote_name
+        lines = quote(ShoppingListLine._meta.db_table)
+        carts = quote(Cart._meta.db_table)
+        amounts = quote(IngredientAmount._meta.db_table)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {lines} (user_id, ingredient_id, total_amount) '
+                f'SELECT c.user_id, a.ingredient_id, SUM(a.amount) '
+                f'FROM {carts} c JOIN {amounts} a '
+                f'ON a.recipe_id = c.recipe_id WHERE c.user_id >= %s '
+                f'GROUP BY c.user_id, a.ingredient_id', [self.user_start])
+            self.created[ShoppingListLine._meta.verbose_name_plural] = (
+                cursor.rowcount)
+
+    def reset_sequences(self):
+        statements = connection.ops.sequence_reset_sql(no_style(), [
+            User, Recipe, IngredientAmount, RecipeTag, Favorite, Cart,
+            Subscription, ShoppingListLine])
+        with connection.cursor() as cursor:
+            for statement in statements:
+                cursor.execute(statement)
@@ -0,0 +1,218 @@
+from io import StringIO
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from .models import (
+    Cart, Favorite, Ingredient, IngredientAmount, Recipe, ShoppingListLine,
+    Tag, reconcile_recipe_counters)
+
+User = get_user_model()
+
+
+class AdminDataMixin:
+    """Администратор, два покупателя и два рецепта в их корзинах."""
+
+    def setUp(self):
+        self.admin = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='pass')
+        self.client.force_login(self.admin)
+        self.buyers = [
+            User.objects.create_user(
+                username=f'buyer{index}', email=f'buyer{index}@example.com',
+                password='pass')
+            for index in range(2)]
+        self.tag = Tag.objects.create(name='Тег', color='#000000', slug='tag')
+        self.ingredients = [
+            Ingredient.objects.create(
+                name=f'Ингредиент {index}', measurement_unit='г')
+            for index in range(2)]
+        self.recipes = []
+        for index in range(2):
+            recipe = Recipe.objects.create(
+                author=self.admin, name=f'Рецепт {index}', text='Описание',
+                cooking_time=10, image='recipes/test.jpg')
+            IngredientAmount.objects.create(
+                recipe=recipe, ingredient=self.ingredients[index], amount=10)
+            for buyer in self.buyers:
+                Cart.objects.create(user=buyer, recipe=recipe)
+            self.recipes.append(recipe)
+        ShoppingListLine.objects.rebuild()
+
+
+class AdminShoppingListTest(AdminDataMixin, TestCase):
+    """Правки в админке пересчитывают списки покупок."""
+
+    def assert_consistent(self):
+        self.assertEqual(ShoppingListLine.objects.inconsistencies(), {})
+
+    def test_change_ingredient_amount(self):
+        amount = IngredientAmount.objects.get(recipe=self.recipes[0])
+        response = self.client.post(
+            f'/admin/recipes/ingredientamount/{amount.id}/change/', {
+                'recipe': self.recipes[0].id,
+                'ingredient': self.ingredients[1].id, 'amount': 25})
+        self.assertEqual(response.status_code, 302)
+        self.assert_consistent()
+        self.assertEqual(ShoppingListLine.objects.get(
+            user=self.buyers[0], ingredient=self.ingredients[1]
+        ).total_amount, 35)
+
+    def test_delete_recipe(self):
+        response = self.client.post(
+            f'/admin/recipes/recipe/{self.recipes[0].id}/delete/',
+            {'post': 'yes'})
+        self.assertEqual(response.status_code, 302)
+        self.assert_consistent()
+        self.assertFalse(ShoppingListLine.objects.filter(
+            ingredient=self.ingredients[0]).exists())
+
+    def test_cart_add_change_and_bulk_delete(self):
+        cart = Cart.objects.get(user=self.buyers[0], recipe=self.recipes[0])
+        self.client.post(f'/admin/recipes/cart/{cart.id}/delete/',
+                         {'post': 'yes'})
+        self.assert_consistent()
+        self.client.post('/admin/recipes/cart/add/', {
+            'user': self.buyers[0].id, 'recipe': self.recipes[0].id})
+        self.assert_consistent()
+        self.client.post('/admin/recipes/cart/', {
+            'action': 'delete_selected', 'post': 'yes',
+            '_selected_action': list(Cart.objects.filter(
+                user=self.buyers[1]).values_list('id', flat=True))})
+        self.assert_consistent()
+        self.assertFalse(
+            ShoppingListLine.objects.filter(user=self.buyers[1]).exists())
+
+
+class AdminIngredientAmountTest(AdminDataMixin, TestCase):
+    """Правка ингредиентов в админке меняет updated_at и ETag рецепта."""
+
+    def get_etag(self, recipe):
+        client = APIClient()
+        client.force_authenticate(self.buyers[0])
+        return client.get(f'/api/recipes/{recipe.id}/')['ETag']
+
+    def updated_at(self, recipe):
+        return Recipe.objects.get(pk=recipe.pk).updated_at
+
+    def test_change_touches_old_and_new_recipe(self):
+        amount = IngredientAmount.objects.get(recipe=self.recipes[0])
+        etag = self.get_etag(self.recipes[0])
+        before = [self.updated_at(recipe) for recipe in self.recipes]
+        self.client.post(
+            f'/admin/recipes/ingredientamount/{amount.id}/change/', {
+                'recipe': self.recipes[1].id,
+                'ingredient': self.ingredients[0].id, 'amount': 25})
+        self.assertNotEqual(self.get_etag(self.recipes[0]), etag)
+        for recipe, updated_at in zip(self.recipes, before):
+            self.assertGreater(self.updated_at(recipe), updated_at)
+
+    def test_delete_and_bulk_delete_touch_recipe(self):
+        for recipe in self.recipes:
+            IngredientAmount.objects.create(
+                recipe=recipe, ingredient=self.ingredients[
+                    1 - self.recipes.index(recipe)], amount=5)
+        amount = IngredientAmount.objects.filter(
+            recipe=self.recipes[0]).first()
+        before = self.updated_at(self.recipes[0])
+        self.client.post(
+            f'/admin/recipes/ingredientamount/{amount.id}/delete/',
+            {'post': 'yes'})
+        self.assertGreater(self.updated_at(self.recipes[0]), before)
+
+        etag = self.get_etag(self.recipes[1])
+        self.client.post('/admin/recipes/ingredientamount/', {
+            'action': 'delete_selected', 'post': 'yes',
+            '_selected_action': list(IngredientAmount.objects.filter(
+                recipe=self.recipes[1]).values_list('id', flat=True)[:1])})
+        self.assertNotEqual(self.get_etag(self.recipes[1]), etag)
+
+
+class ShoppingListDeltaTest(TestCase):
+    """Строка, вставленная параллельным запросом, обновляется повтором."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='buyer', email='buyer@example.com', password='pass')
+        self.ingredient = Ingredient.objects.create(
+            name='Соль', measurement_unit='г')
+
+    def test_concurrent_first_insert_retries_as_update(self):
+        manager = ShoppingListLine.objects
+        locked_lines = manager.locked_lines
+        calls = []
+
+        def stale_then_real(user_ids, ingredient_ids):
+            # Первое чтение не видит строку, вставленную параллельно.
+            calls.append(True)
+            if len(calls) == 1:
+                return {}
+            return locked_lines(user_ids, ingredient_ids)
+
+        ShoppingListLine.objects.create(
+            user=self.user, ingredient=self.ingredient, total_amount=10)
+        with patch.object(manager, 'locked_lines', stale_then_real):
+            manager.apply_delta([self.user.id], {self.ingredient.id: 5})
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(ShoppingListLine.objects.get(
+            user=self.user).total_amount, 15)
+
+
+class RecipeCountersTest(TestCase):
+    """Счётчики рецептов не расходятся при правках в обход API."""
+
+    def setUp(self):
+        self.admin = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='pass')
+        self.client.force_login(self.admin)
+        self.fan = User.objects.create_user(
+            username='fan', email='fan@example.com', password='pass')
+        self.recipes = [
+            Recipe.objects.create(
+                author=self.admin, name=f'Рецепт {index}', text='Описание',
+                cooking_time=10, image='recipes/test.jpg')
+            for index in range(2)]
+
+    def assert_counters(self, *expected):
+        self.assertEqual(reconcile_recipe_counters(), 0)
+        self.assertEqual(
+            list(Recipe.objects.order_by('id').values_list(
+                'favorites_count', 'carts_count')),
+            list(expected))
+
+    def test_admin_favorite_and_cart(self):
+        self.client.post('/admin/recipes/favorite/add/', {
+            'user': self.fan.id, 'recipe': self.recipes[0].id})
+        self.client.post('/admin/recipes/cart/add/', {
+            'user': self.fan.id, 'recipe': self.recipes[0].id})
+        self.assert_counters((1, 1), (0, 0))
+        favorite = Favorite.objects.get()
+        self.client.post(
+            f'/admin/recipes/favorite/{favorite.id}/change/', {
+                'user': self.fan.id, 'recipe': self.recipes[1].id})
+        self.assert_counters((0, 1), (1, 0))
+        self.client.post('/admin/recipes/cart/', {
+            'action': 'delete_selected', 'post': 'yes',
+            '_selected_action': [Cart.objects.get().id]})
+        self.assert_counters((0, 0), (1, 0))
+
+    def test_user_deletion(self):
+        for recipe in self.recipes:
+            Favorite.objects.create(user=self.fan, recipe=recipe)
+            Cart.objects.create(user=self.fan, recipe=recipe)
+        reconcile_recipe_counters()
+        self.assert_counters((1, 1), (1, 1))
+        self.fan.delete()
+        self.assert_counters((0, 0), (0, 0))
+
+
+class ProcessImageJobsTest(TestCase):
+    """Воркер картинок не запускается с кешем в памяти процесса."""
+
+    def test_requires_shared_cache(self):
+        with self.assertRaises(CommandError):
+            call_command('process_image_jobs', '--once')
+        call_command('process_image_jobs', '--stats', stdout=StringIO())
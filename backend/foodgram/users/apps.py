@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class UsersConfig(AppConfig):
     name = 'users'
     verbose_name = 'Пользователи'
+
+    def ready(self):
+        from . import authentication, checks  # noqa: F401
@@ -0,0 +1,213 @@
+"""Аутентификация по токену с кешем проверенных токенов.
+
+Первый уровень — LRU в памяти воркера на TOKEN_CACHE_SIZE токенов, запись
+живёт TOKEN_CACHE_TTL секунд. Второй, необязательный, — общий кеш Django
+(TOKEN_SHARED_CACHE), который переживает перезапуск воркеров. В обоих
+хранится только пара (id, is_active) пользователя, без хеша пароля. Удаление
+токена при выходе и любое сохранение пользователя, в том числе смена
+пароля, сбрасывают записи в общем кеше и в памяти текущего воркера;
+другие воркеры забывают запись не позже чем через TOKEN_CACHE_TTL.
+
+В режиме JWT (AUTH_MODE) пользователь собирается из claims подписанного
+access-токена, и база не нужна вовсе. Отозванные при выходе токены и
+момент, раньше которого токены пользователя недействительны (смена
+пароля, блокировка, удаление), хранятся в кеше Django не дольше, чем
+живут сами токены.
+"""
+import hashlib
+from collections import OrderedDict
+from threading import Lock
+from time import monotonic
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.authtoken.models import Token
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+from rest_framework_simplejwt.utils import aware_utcnow, datetime_to_epoch
+
+User = get_user_model()
+
+SHARED_KEY = 'auth:token:{}'
+REVOKED_KEY = 'auth:jwt:revoked:{}'
+NOT_BEFORE_KEY = 'auth:jwt:not-before:{}'
+JWT_CLAIMS = ('username', 'email', 'first_name', 'last_name')
+
+
+class TokenCache:
+    """Ограниченный по размеру и времени жизни LRU-кеш токенов.
+
+    Значение записи — пара (id пользователя, is_active).
+    """
+
+    def __init__(self):
+        self._entries = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if monotonic() > entry[1]:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (
+                value, monotonic() + settings.TOKEN_CACHE_TTL)
+            self._entries.move_to_end(key)
+            while len(self._entries) > settings.TOKEN_CACHE_SIZE:
+                self._entries.popitem(last=False)
+
+    def discard(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def discard_user(self, user_id):
+        with self._lock:
+            for key in [key for key, (value, _) in self._entries.items()
+                        if value[0] == user_id]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+token_cache = TokenCache()
+
+
+def shared_key(key):
+    return SHARED_KEY.format(hashlib.sha256(key.encode()).hexdigest())
+
+
+def invalidate_token(key):
+    token_cache.discard(key)
+    if settings.TOKEN_SHARED_CACHE:
+        cache.delete(shared_key(key))
+
+
+def invalidate_user(user_id):
+    token_cache.discard_user(user_id)
+    if settings.TOKEN_SHARED_CACHE:
+        cache.delete_many([
+            shared_key(key) for key in Token.objects.filter(
+                user_id=user_id).values_list('key', flat=True)])
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """TokenAuthentication, которая не ходит в базу за известным токеном."""
+
+    def authenticate_credentials(self, key):
+        entry = token_cache.get(key)
+        if entry is None and settings.TOKEN_SHARED_CACHE:
+            entry = cache.get(shared_key(key))
+            if entry is not None:
+                token_cache.set(key, entry)
+        if entry is None:
+            user, _ = super().authenticate_credentials(key)
+            entry = (user.id, user.is_active)
+            token_cache.set(key, entry)
+            if settings.TOKEN_SHARED_CACHE:
+                cache.set(shared_key(key), entry,
+                          settings.TOKEN_SHARED_CACHE_TTL)
+        user_id, is_active = entry
+        if not is_active:
+            raise AuthenticationFailed('Пользователь неактивен или удалён.')
+        # Представления используют только id пользователя, как и в JWT.
+        user = User(id=user_id, is_active=is_active)
+        user._state.adding = False
+        return user, Token(key=key, user=user)
+
+
+def add_claims(token, user):
+    token['iat'] = datetime_to_epoch(token.current_time)
+    for claim in JWT_CLAIMS:
+        token[claim] = getattr(user, claim)
+    return token
+
+
+def issue_tokens(user):
+    """Выпускает пару refresh/access с данными пользователя в claims."""
+    refresh = add_claims(RefreshToken.for_user(user), user)
+    return {'refresh': str(refresh), 'access': str(refresh.access_token)}
+
+
+def issue_access_token(user):
+    return str(add_claims(AccessToken.for_user(user), user))
+
+
+def revoke_token(token):
+    """Отзывает токен до истечения его срока действия."""
+    timeout = token['exp'] - datetime_to_epoch(aware_utcnow())
+    if timeout > 0:
+        cache.set(REVOKED_KEY.format(token[api_settings.JTI_CLAIM]), True,
+                  timeout)
+
+
+def revoke_user(user_id):
+    """Отзывает все выпущенные до этого момента токены пользователя."""
+    # iat в токене — целые секунды, поэтому и граница хранится так же:
+    # повторный вход в ту же секунду, что и смена пароля, не отвергается.
+    cache.set(NOT_BEFORE_KEY.format(user_id),
+              datetime_to_epoch(aware_utcnow()),
+              int(api_settings.REFRESH_TOKEN_LIFETIME.total_seconds()))
+
+
+def is_revoked(token):
+    revoked_key = REVOKED_KEY.format(token[api_settings.JTI_CLAIM])
+    not_before_key = NOT_BEFORE_KEY.format(
+        token.get(api_settings.USER_ID_CLAIM))
+    found = cache.get_many([revoked_key, not_before_key])
+    if revoked_key in found:
+        return True
+    return token.get('iat', 0) < int(found.get(not_before_key, 0))
+
+
+class StatelessJWTAuthentication(JWTAuthentication):
+    """JWT-аутентификация без запросов к базе."""
+
+    def get_validated_token(self, raw_token):
+        token = super().get_validated_token(raw_token)
+        if is_revoked(token):
+            raise InvalidToken('Токен отозван.')
+        return token
+
+    def get_user(self, validated_token):
+        try:
+            user = User(
+                id=validated_token[api_settings.USER_ID_CLAIM],
+                **{claim: validated_token[claim] for claim in JWT_CLAIMS})
+        except KeyError:
+            raise InvalidToken('В токене нет данных пользователя.')
+        user._state.adding = False
+        return user
+
+
+@receiver(post_delete, sender=Token)
+def invalidate_deleted_token(sender, instance, **kwargs):
+    key = instance.key
+    transaction.on_commit(lambda: invalidate_token(key))
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_user_tokens(sender, instance, **kwargs):
+    user_id = instance.id
+    transaction.on_commit(lambda: invalidate_user(user_id))
+    # _password заполнен, пока сохраняется пароль из set_password.
+    if (kwargs['signal'] is post_delete or not instance.is_active
+            or instance._password is not None):
+        transaction.on_commit(lambda: revoke_user(user_id))
@@ -0,0 +1,19 @@
+"""Проверки настроек аутентификации."""
+from django.conf import settings
+from django.core.checks import Error, Tags, register
+
+from api.cache import is_shared_cache
+
+
+@register(Tags.caches, Tags.security)
+def check_jwt_cache(app_configs, **kwargs):
+    """Отзыв JWT должен быть виден всем воркерам."""
+    if settings.AUTH_MODE not in ('jwt', 'both') or is_shared_cache():
+        return []
+    return [Error(
+        'С AUTH_MODE=jwt или both нужен общий кеш.',
+        hint='Задайте CACHE_BACKEND, например '
+             'django.core.cache.backends.db.DatabaseCache: с кешем в памяти '
+             'процесса отозванный при выходе или смене пароля токен '
+             'принимают другие воркеры.',
+        id='users.E001')]
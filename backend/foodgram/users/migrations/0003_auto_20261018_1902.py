@@ -0,0 +1,33 @@
+# Generated by Django 2.2.16 on 2026-10-18 19:02
+
+from django.db import migrations, models
+
+
+def remove_duplicates(apps, schema_editor):
+    Subscription = apps.get_model('users', 'Subscription')  # noqa: N806
+    groups = Subscription.objects.values('user', 'author').annotate(
+        keep_id=models.Min('id'), total=models.Count('id')).filter(
+        total__gt=1).order_by()
+    for group in groups:
+        Subscription.objects.filter(
+            user=group['user'], author=group['author']).exclude(
+            id=group['keep_id']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_auto_20230321_1732'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicates, migrations.RunPython.noop),
+        migrations.AlterModelOptions(
+            name='subscription',
+            options={'verbose_name': 'Подписка', 'verbose_name_plural': 'Подписки'},
+        ),
+        migrations.AddConstraint(
+            model_name='subscription',
+            constraint=models.UniqueConstraint(fields=('user', 'author'), name='unique_subscription'),
+        ),
+    ]
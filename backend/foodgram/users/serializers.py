@@ -1,8 +1,13 @@
 from django.contrib.auth import get_user_model
-from djoser.serializers import UserCreateSerializer, UserSerializer
+from djoser.serializers import (
+    TokenCreateSerializer, UserCreateSerializer, UserSerializer)
 from rest_framework import serializers
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
 
 from .models import Subscription
+from .authentication import issue_access_token, issue_tokens, is_revoked
 from api.serializers import RecipeSubscSerializer
 
 User = get_user_model()
@@ -51,6 +56,8 @@ class SubscriptionSerializer(serializers.ModelSerializer):
                   'last_name', 'is_subscribed', 'recipes_count', 'recipes')
 
     def get_is_subscribed(self, obj):
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         user_id = obj.id if isinstance(obj, User) else obj.author.id
         request_user = self.context.get('request').user.id
         return Subscription.objects.filter(author=user_id,
@@ -58,6 +65,10 @@ class SubscriptionSerializer(serializers.ModelSerializer):
 
     def get_recipes(self, obj):
         request = self.context.get('request')
+        if hasattr(obj, 'limited_recipes'):
+            return RecipeSubscSerializer(
+                obj.limited_recipes, many=True,
+                context={'request': request}).data
         recipes = obj.recipes.all()
         limit = request.GET.get('recipes_limit')
         if limit:
@@ -67,4 +78,35 @@ class SubscriptionSerializer(serializers.ModelSerializer):
         return serializer.data
 
     def get_recipes_count(self, obj):
+        if hasattr(obj, 'recipes_count'):
+            return obj.recipes_count
         return obj.recipes.count()
+
+
+class JWTCreateSerializer(TokenCreateSerializer):
+    """Выдаёт пару JWT по почте и паролю, как token/login."""
+
+    def validate(self, attrs):
+        super().validate(attrs)
+        return issue_tokens(self.user)
+
+
+class JWTRefreshSerializer(serializers.Serializer):
+    """Выдаёт новый access-токен по refresh-токену.
+
+    Данные пользователя перечитываются из базы, чтобы в claims
+    попали изменения профиля.
+    """
+    refresh = serializers.CharField()
+
+    def validate(self, attrs):
+        try:
+            refresh = RefreshToken(attrs['refresh'])
+        except TokenError as error:
+            raise InvalidToken(error.args[0])
+        user = User.objects.filter(
+            id=refresh.get(api_settings.USER_ID_CLAIM),
+            is_active=True).first()
+        if user is None or is_revoked(refresh):
+            raise InvalidToken('Токен отозван.')
+        return {'access': issue_access_token(user)}
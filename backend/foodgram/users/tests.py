@@ -0,0 +1,228 @@
+from datetime import timedelta
+from importlib import reload
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import transaction
+from django.test import TestCase, override_settings
+from django.urls import clear_url_caches
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.state import token_backend
+from rest_framework_simplejwt.utils import aware_utcnow
+
+from .authentication import (
+    StatelessJWTAuthentication, issue_tokens, shared_key, token_cache)
+from .checks import check_jwt_cache
+from .models import Subscription
+from .views import CustomUserViewSet
+from recipes.models import Recipe
+
+User = get_user_model()
+
+
+def reload_urls():
+    from foodgram import urls as root_urls
+    from users import urls as users_urls
+    reload(users_urls)
+    reload(root_urls)
+    clear_url_caches()
+
+
+class JWTTestCase(TestCase):
+    """Ключ подписи JWT, которого нет в окружении тестов."""
+
+    def setUp(self):
+        cache.clear()
+        for key in ('signing_key', 'verifying_key'):
+            patcher = patch.object(token_backend, key, 'test-signing-key')
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+
+class MeJWTTest(JWTTestCase):
+    """ETag профиля в режиме JWT следует за базой, а не за claims."""
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(
+            username='reader', email='reader@example.com', password='pass',
+            first_name='Старое')
+        self.client = APIClient()
+        self.client.credentials(
+            HTTP_AUTHORIZATION=f'Bearer {issue_tokens(self.user)["access"]}')
+
+    @patch.object(CustomUserViewSet, 'authentication_classes',
+                  (StatelessJWTAuthentication,))
+    def test_profile_edit_changes_etag(self):
+        response = self.client.get('/api/users/me/')
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        self.assertEqual(self.client.get(
+            '/api/users/me/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        User.objects.filter(pk=self.user.pk).update(first_name='Новое')
+        response = self.client.get('/api/users/me/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['first_name'], 'Новое')
+        self.assertNotEqual(response['ETag'], etag)
+
+
+@override_settings(AUTH_MODE='jwt')
+@patch.object(CustomUserViewSet, 'authentication_classes',
+              (StatelessJWTAuthentication,))
+class JWTAuthTest(JWTTestCase):
+    """Выдача, обновление и отзыв JWT."""
+
+    def setUp(self):
+        super().setUp()
+        reload_urls()
+        self.addCleanup(reload_urls)
+        self.user = User.objects.create_user(
+            username='reader', email='reader@example.com', password='pass')
+        self.client = APIClient()
+
+    def login(self, password='pass'):
+        return self.client.post('/api/auth/jwt/create/', {
+            'email': 'reader@example.com', 'password': password})
+
+    def get_me(self, access):
+        # Ответ с ошибкой DRF помечает для отката текущую транзакцию,
+        # а в TestCase это транзакция всего теста.
+        with transaction.atomic():
+            return self.client.get(
+                '/api/users/me/',
+                HTTP_AUTHORIZATION=f'Bearer {access}').status_code
+
+    def test_create_refresh_logout(self):
+        response = self.login()
+        self.assertEqual(response.status_code, 200)
+        access, refresh = response.data['access'], response.data['refresh']
+        self.assertEqual(self.get_me(access), 200)
+
+        response = self.client.post(
+            '/api/auth/jwt/refresh/', {'refresh': refresh})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.get_me(response.data['access']), 200)
+
+        response = self.client.post(
+            '/api/auth/jwt/logout/', {'refresh': refresh},
+            HTTP_AUTHORIZATION=f'Bearer {access}')
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(self.get_me(access), 401)
+        response = self.client.post(
+            '/api/auth/jwt/refresh/', {'refresh': refresh})
+        self.assertEqual(response.status_code, 401)
+
+    def test_wrong_password(self):
+        self.assertEqual(self.login('wrong').status_code, 400)
+
+    def test_password_change_revokes_older_tokens(self):
+        issued = aware_utcnow() - timedelta(seconds=10)
+        with patch('rest_framework_simplejwt.tokens.aware_utcnow',
+                   return_value=issued):
+            old = issue_tokens(self.user)
+        self.assertEqual(self.get_me(old['access']), 200)
+
+        self.user.set_password('new')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.save()
+        self.assertEqual(self.get_me(old['access']), 401)
+        response = self.client.post(
+            '/api/auth/jwt/refresh/', {'refresh': old['refresh']})
+        self.assertEqual(response.status_code, 401)
+        # Вход в ту же секунду, что и смена пароля, действителен.
+        response = self.login('new')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.get_me(response.data['access']), 200)
+
+
+class JWTCacheCheckTest(TestCase):
+    """JWT без общего кеша — ошибка конфигурации."""
+
+    def test_jwt_requires_shared_cache(self):
+        with override_settings(AUTH_MODE='jwt'):
+            self.assertEqual(
+                [error.id for error in check_jwt_cache(None)], ['users.E001'])
+        self.assertEqual(check_jwt_cache(None), [])
+
+
+class SubscriptionsQueriesTest(TestCase):
+    """Число запросов ленты подписок не зависит от числа рецептов."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='reader', email='reader@example.com', password='pass')
+        for index in range(6):
+            author = User.objects.create_user(
+                username=f'author{index}', email=f'author{index}@example.com',
+                password='pass')
+            Subscription.objects.create(user=self.user, author=author)
+            Recipe.objects.bulk_create(
+                Recipe(author=author, name=f'Рецепт {number}',
+                       text='Описание', cooking_time=10,
+                       image='recipes/test.jpg')
+                for number in range(100))
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def get_subscriptions(self, params):
+        # count, авторы с числом рецептов, рецепты авторов
+        with self.assertNumQueries(3):
+            response = self.client.get('/api/users/subscriptions/', params)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), 6)
+        for author in response.data['results']:
+            self.assertTrue(author['is_subscribed'])
+            self.assertEqual(author['recipes_count'], 100)
+        return response.data['results']
+
+    def test_without_recipes_limit(self):
+        for author in self.get_subscriptions({}):
+            self.assertEqual(len(author['recipes']), 100)
+
+    def test_with_recipes_limit(self):
+        for author in self.get_subscriptions({'recipes_limit': 3}):
+            self.assertEqual(len(author['recipes']), 3)
+
+
+@override_settings(TOKEN_SHARED_CACHE=True)
+class CachedTokenTest(TestCase):
+    """Кеш токенов забывает токен при выходе и блокировке пользователя."""
+
+    def setUp(self):
+        cache.clear()
+        token_cache.clear()
+        self.user = User.objects.create_user(
+            username='reader', email='reader@example.com', password='pass')
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def get_me(self):
+        return self.client.get('/api/users/me/').status_code
+
+    def test_shared_cache_keeps_only_id(self):
+        self.assertEqual(self.get_me(), 200)
+        self.assertEqual(
+            cache.get(shared_key(self.token.key)), (self.user.id, True))
+        token_cache.clear()
+        # Токен берётся из общего кеша; запросы — профиль и подписка /me.
+        with self.assertNumQueries(2):
+            self.assertEqual(self.get_me(), 200)
+
+    def test_logout(self):
+        self.assertEqual(self.get_me(), 200)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/auth/token/logout/')
+        self.assertEqual(response.status_code, 204)
+        self.assertIsNone(cache.get(shared_key(self.token.key)))
+        self.assertEqual(self.get_me(), 401)
+
+    def test_deactivation(self):
+        self.assertEqual(self.get_me(), 200)
+        self.user.is_active = False
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.save()
+        self.assertEqual(self.get_me(), 401)
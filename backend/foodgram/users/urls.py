@@ -1,18 +1,28 @@
+from django.conf import settings
 from django.urls import include, path
 from djoser.views import TokenCreateView, TokenDestroyView
 from rest_framework import routers
 
-from users.views import CustomUserViewSet
+from users.views import (
+    CustomUserViewSet, JWTCreateView, JWTLogoutView, JWTRefreshView)
 
 app_name = 'users'
 
 router = routers.DefaultRouter()
 router.register(r'users', CustomUserViewSet, basename='users')
 
-auth_urls = [
-    path(r'token/login/', TokenCreateView.as_view()),
-    path(r'token/logout/', TokenDestroyView.as_view()),
-]
+auth_urls = []
+if settings.AUTH_MODE in ('token', 'both'):
+    auth_urls += [
+        path(r'token/login/', TokenCreateView.as_view()),
+        path(r'token/logout/', TokenDestroyView.as_view()),
+    ]
+if settings.AUTH_MODE in ('jwt', 'both'):
+    auth_urls += [
+        path(r'jwt/create/', JWTCreateView.as_view()),
+        path(r'jwt/refresh/', JWTRefreshView.as_view()),
+        path(r'jwt/logout/', JWTLogoutView.as_view()),
+    ]
 
 urlpatterns = [
     path('', include(router.urls)),
@@ -1,20 +1,33 @@
 from django.contrib.auth import get_user_model
+from django.db.models import (
+    BooleanField, Count, OuterRef, Prefetch, Subquery, Value)
 from django.shortcuts import get_object_or_404
 
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
+from rest_framework.views import APIView
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.views import TokenViewBase
 
+from .authentication import StatelessJWTAuthentication, revoke_token
 from .models import Subscription
+from api.cache import conditional_response, make_etag
+from api.db import AtomicWritesMixin, ReplicaReadsMixin
+from api.instrumentation import SerializerTimingMixin, timed
+from recipes.models import Recipe
 from users.serializers import (
     ChangePasswordSerializer, CustomUserCreateSerializer, CustomUserSerializer,
-    SubscriptionSerializer)
+    JWTCreateSerializer, JWTRefreshSerializer, SubscriptionSerializer)
 
 User = get_user_model()
 
 
-class CustomUserViewSet(viewsets.ModelViewSet):
+class CustomUserViewSet(AtomicWritesMixin, ReplicaReadsMixin,
+                        SerializerTimingMixin, viewsets.ModelViewSet):
     """ViewSet для кастомной модели User."""
     permission_classes = (AllowAny,)
     queryset = User.objects.all()
@@ -26,7 +39,16 @@ class CustomUserViewSet(viewsets.ModelViewSet):
 
     @action(detail=False, permission_classes=[IsAuthenticated])
     def me(self, request, *args, **kwargs):
-        self.object = get_object_or_404(User, pk=request.user.id)
+        # В режиме JWT request.user собран из claims и может отставать от
+        # базы, поэтому валидатор строится по загруженной строке.
+        self.object = user = get_object_or_404(User, pk=request.user.id)
+        return conditional_response(
+            request,
+            make_etag([user.id, user.username, user.email, user.first_name,
+                       user.last_name, request.accepted_renderer.format]),
+            self.get_me)
+
+    def get_me(self, request, *args, **kwargs):
         serializer = self.get_serializer(self.object)
         return Response(serializer.data)
 
@@ -52,9 +74,22 @@ class CustomUserViewSet(viewsets.ModelViewSet):
     @action(detail=False, permission_classes=[IsAuthenticated])
     def subscriptions(self, request, context={}, *args, **kwargs):
         context['request'] = self.request
-        queryset = User.objects.filter(subscribers__user=request.user)
+        queryset = User.objects.filter(
+            subscribers__user=request.user).annotate(
+            recipes_count=Count('recipes', distinct=True),
+            is_subscribed=Value(True, output_field=BooleanField())).order_by(
+            *User._meta.ordering)
+        recipes = Recipe.objects.all()
+        limit = request.GET.get('recipes_limit')
+        if limit and limit.isdigit():
+            recipes = recipes.filter(id__in=Subquery(
+                Recipe.objects.filter(author=OuterRef('author')).order_by(
+                    '-pub_date').values('id')[:int(limit)]))
+        queryset = queryset.prefetch_related(
+            Prefetch('recipes', queryset=recipes, to_attr='limited_recipes'))
         page = self.paginate_queryset(queryset)
-        serializer = SubscriptionSerializer(page, context=context, many=True)
+        serializer = timed(SubscriptionSerializer(
+            page, context=context, many=True))
         return self.get_paginated_response(serializer.data)
 
     @action(detail=True, methods=['post', 'delete'],
@@ -76,10 +111,38 @@ class CustomUserViewSet(viewsets.ModelViewSet):
                     status=status.HTTP_400_BAD_REQUEST)
 
             Subscription.objects.create(author=author, user=user)
-            serializer = CustomUserSerializer(
-                User.objects.get(id=author.id), context=context)
+            serializer = timed(CustomUserSerializer(
+                User.objects.get(id=author.id), context=context))
             return Response(serializer.data, status.HTTP_201_CREATED)
 
         get_object_or_404(Subscription, author=author,
                           user=user).delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class JWTCreateView(TokenViewBase):
+    """Вход по почте и паролю с выдачей пары JWT."""
+    serializer_class = JWTCreateSerializer
+
+
+class JWTRefreshView(TokenViewBase):
+    """Обновление access-токена по refresh-токену."""
+    serializer_class = JWTRefreshSerializer
+
+
+class JWTLogoutView(APIView):
+    """Выход: отзывает текущий access-токен и переданный refresh-токен."""
+    authentication_classes = (StatelessJWTAuthentication,)
+    permission_classes = (IsAuthenticated,)
+
+    def post(self, request):
+        revoke_token(request.auth)
+        if request.data.get('refresh'):
+            try:
+                refresh = RefreshToken(request.data['refresh'])
+            except TokenError:
+                pass
+            else:
+                if refresh.get(api_settings.USER_ID_CLAIM) == request.user.id:
+                    revoke_token(refresh)
+        return Response(status=status.HTTP_204_NO_CONTENT)